@@ -0,0 +1,237 @@
+"""Recorder load of Simple Thermostat A over a simulated day.
+
+Runs N thermostats in an in-process Home Assistant instance with stub heaters
+and drives their sensors through a day of readings (a slow drift plus noise, a
+new reading every --reading-interval seconds of simulated time), compressed
+by --speed. Every state_changed event of a thermostat is what the recorder
+would store; for each configuration the benchmark reports:
+
+- states rows (one per state_changed event),
+- state_attributes rows and bytes: the recorder stores each distinct JSON of
+  the recorded attributes once, so rows are distinct JSON documents and bytes
+  their total size,
+- the same counts with every attribute recorded, as if the thermostat did not
+  declare any unrecorded attribute.
+
+The configurations compared are without and with --write-interval (seconds of
+simulated time, scaled like the readings):
+
+    python benchmarks/bench_recorder.py --thermostats 50 --speed 1440 \\
+        --write-interval 300 --option runtime_stats=true --output recorder.json
+
+Needs homeassistant installed (the version of hacs.json or newer). The
+recorder itself is not loaded: the attributes are encoded the way it does.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPONENT = os.path.join(ROOT, "custom_components", "simple_thermostat_a")
+
+HEATER_DOMAIN = "switch"
+DAY = 24 * 3600
+
+# Attributes the recorder never stores, whatever the entity
+# (recorder.const.ALL_DOMAIN_EXCLUDE_ATTRS)
+ALL_DOMAIN_EXCLUDE_ATTRS = {"attribution", "restored", "supported_features"}
+
+sys.path.insert(0, ROOT)
+
+
+def thermostat_config(count, **options):
+    return {
+        "platform": "simple_thermostat_a",
+        "target_temp": 20,
+        "initial_hvac_mode": "heat",
+        **options,
+        "thermostats": [
+            {
+                "name": f"bench {index}",
+                "unique_id": f"bench_{index}",
+                "heater": f"{HEATER_DOMAIN}.bench_{index}",
+                "target_sensor": f"sensor.bench_{index}",
+            }
+            for index in range(count)
+        ],
+    }
+
+
+class RecorderCounter:
+    """States and attribute rows the recorder would write."""
+
+    def __init__(self, json_bytes, all_attributes=False):
+        self._json_bytes = json_bytes
+        self._all_attributes = all_attributes
+        self.states = 0
+        self.attributes = set()
+        self.attribute_bytes = 0
+
+    def add(self, state):
+        exclude = set(ALL_DOMAIN_EXCLUDE_ATTRS)
+        if state.state_info and not self._all_attributes:
+            exclude.update(state.state_info["unrecorded_attributes"])
+        shared = self._json_bytes(
+            {
+                key: value
+                for key, value in state.attributes.items()
+                if key not in exclude
+            }
+        )
+        self.states += 1
+        if shared not in self.attributes:
+            self.attributes.add(shared)
+            self.attribute_bytes += len(shared)
+
+    def as_dict(self):
+        return {
+            "states_rows": self.states,
+            "attributes_rows": len(self.attributes),
+            "attributes_bytes": self.attribute_bytes,
+        }
+
+
+async def run_day(count, speed, reading_interval, write_interval, options):
+    """Run one simulated day and return what the recorder would write."""
+    # pylint: disable=import-outside-toplevel
+    from homeassistant import bootstrap, loader
+    from homeassistant.const import ATTR_ENTITY_ID
+    from homeassistant.core import DOMAIN as HA_DOMAIN, HomeAssistant
+    from homeassistant.helpers.json import json_bytes
+    from homeassistant.setup import async_setup_component
+
+    if write_interval:
+        options = {**options, "state_write_interval": write_interval / speed}
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        os.makedirs(os.path.join(config_dir, "custom_components"))
+        os.symlink(
+            COMPONENT,
+            os.path.join(config_dir, "custom_components", "simple_thermostat_a"),
+        )
+
+        hass = HomeAssistant(config_dir)
+        hass.config.skip_pip = True
+        loader.async_setup(hass)
+
+        async def _async_switch(call):
+            state = "on" if call.service == "turn_on" else "off"
+            for entity_id in call.data[ATTR_ENTITY_ID]:
+                hass.states.async_set(entity_id, state)
+
+        await bootstrap.async_from_config_dict({"homeassistant": {}}, hass)
+        for service in ("turn_on", "turn_off"):
+            hass.services.async_register(HA_DOMAIN, service, _async_switch)
+        for index in range(count):
+            hass.states.async_set(f"{HEATER_DOMAIN}.bench_{index}", "off")
+            hass.states.async_set(f"sensor.bench_{index}", "20.0")
+
+        await async_setup_component(
+            hass, "climate", {"climate": [thermostat_config(count, **options)]}
+        )
+        await hass.async_start()
+        await hass.async_block_till_done()
+
+        recorded = RecorderCounter(json_bytes)
+        everything = RecorderCounter(json_bytes, all_attributes=True)
+
+        def _record(event):
+            if event.data["entity_id"].startswith("climate.bench_"):
+                recorded.add(event.data["new_state"])
+                everything.add(event.data["new_state"])
+
+        hass.bus.async_listen("state_changed", _record)
+
+        # Each thermostat drifts around the target with its own phase, plus
+        # sensor noise at the resolution of a typical sensor (0.01)
+        rng = random.Random(0)
+        phases = [rng.uniform(0, 2 * math.pi) for _ in range(count)]
+        readings = int(DAY / reading_interval)
+        step = reading_interval / speed
+        started = time.perf_counter()
+        for number in range(readings):
+            deadline = started + number * step
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            angle = 2 * math.pi * number * reading_interval / 3600
+            for index in range(count):
+                temp = 20 + 0.6 * math.sin(angle + phases[index]) + rng.gauss(0, 0.05)
+                hass.states.async_set(f"sensor.bench_{index}", f"{temp:.2f}")
+        await hass.async_block_till_done()
+        await hass.async_stop()
+
+    return {
+        "thermostats": count,
+        "write_interval": write_interval,
+        "sensor_readings": readings * count,
+        "recorded": recorded.as_dict(),
+        "all_attributes": everything.as_dict(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--thermostats", type=int, default=20)
+    parser.add_argument(
+        "--speed", type=float, default=1440.0, help="simulated seconds per second"
+    )
+    parser.add_argument(
+        "--reading-interval",
+        type=float,
+        default=30.0,
+        help="seconds between two readings of a sensor",
+    )
+    parser.add_argument(
+        "--write-interval",
+        type=float,
+        default=300.0,
+        help="state_write_interval of the second run, in seconds",
+    )
+    parser.add_argument(
+        "--option",
+        action="append",
+        default=[],
+        metavar="KEY=JSON",
+        help="platform option shared by the thermostats, e.g. runtime_stats=true",
+    )
+    parser.add_argument("--output", help="JSON file, stdout if omitted")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.CRITICAL)
+    options = {}
+    for option in args.option:
+        key, _, value = option.partition("=")
+        options[key] = json.loads(value)
+
+    results = [
+        asyncio.run(
+            run_day(
+                args.thermostats,
+                args.speed,
+                args.reading_interval,
+                write_interval,
+                options,
+            )
+        )
+        for write_interval in (None, args.write_interval)
+    ]
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
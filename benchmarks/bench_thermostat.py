@@ -0,0 +1,385 @@
+"""Load test and benchmarks of Simple Thermostat A.
+
+Runs N thermostats in an in-process Home Assistant instance (no network, no
+configuration.yaml) with stub heaters, and drives their sensors on a fixed,
+seeded schedule: event n is due at n / rate seconds, with a random sensor and
+temperature. The clock of the run is frozen and only moved from one event to
+the next, so the timers of Home Assistant and of the thermostats fire at the
+same simulated times on every run: two runs send the same events and make the
+same control passes, switch calls and state writes. It reports:
+
+- CPU time of the setup of the platform (in a running instance, as on a
+  reload), the thermostats given as one `thermostats` list, or as one
+  platform entry each with --separate-entries,
+- sensor to switch latency (p50 / p99), in simulated seconds, from the sensor
+  state write to the stub switch service receiving the command,
+- sensor events handled per CPU second and CPU time to handle one event
+  (p50 / p99), which is where slow control passes show up,
+- control passes and their CPU time (p50 / p99); a pass never waits, the
+  thermostat has no lock,
+- climate state writes per sensor event and switch service calls,
+- memory per thermostat (the climate integration loaded by the run is
+  included, so read it at large N),
+- import time and cost of one decision of the decision core, and of one
+  preheat prediction (run every minute for each scheduled preset).
+
+The results are written as JSON so runs can be compared:
+
+    python benchmarks/bench_thermostat.py --thermostats 1,100,1000 \\
+        --rate 200 --duration 10 --switch-latency 0.05 --output bench.json
+
+Needs the packages of requirements_test.txt (homeassistant and its test
+harness, which freezes the clock).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPONENT = os.path.join(ROOT, "custom_components", "simple_thermostat_a")
+
+HEATER_DOMAIN = "switch"
+# Simulated time of the start of a run
+START = "2024-01-01 00:00:00"
+# Simulated seconds given to the commands still in flight after the last event
+DRAIN = 60
+
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def thermostat_configs(count, separate_entries=False, **options):
+    """Return the climate platform entries of count thermostats."""
+    shared = {
+        "platform": "simple_thermostat_a",
+        "target_temp": 20,
+        "initial_hvac_mode": "heat",
+        **options,
+    }
+    thermostats = [
+        {
+            "name": f"bench {index}",
+            "unique_id": f"bench_{index}",
+            "heater": f"{HEATER_DOMAIN}.bench_{index}",
+            "target_sensor": f"sensor.bench_{index}",
+        }
+        for index in range(count)
+    ]
+    if separate_entries:
+        return [{**shared, **thermostat} for thermostat in thermostats]
+    return [{**shared, "thermostats": thermostats}]
+
+
+def _advance(hass, clock, seconds):
+    """Move the frozen clock forward and fire the timers due by then."""
+    # pylint: disable=import-outside-toplevel
+    from pytest_homeassistant_custom_component.common import (
+        async_fire_time_changed_exact,
+    )
+    import homeassistant.util.dt as dt_util
+
+    clock.tick(timedelta(seconds=seconds))
+    async_fire_time_changed_exact(hass, dt_util.utcnow())
+
+
+async def _async_drain(hass, clock, step):
+    """Move the frozen clock on by step until no task is left, for DRAIN seconds at most.
+
+    The timers fire in order (batch window before confirmation timeout), as
+    they would in real time.
+    """
+    for _ in range(int(DRAIN / step)):
+        await _async_settle(hass)
+        if not hass._tasks:  # pylint: disable=protected-access
+            break
+        _advance(hass, clock, step)
+    await hass.async_block_till_done()
+
+
+async def _async_settle(hass):
+    """Run everything ready at the current simulated time, but no timer."""
+    await asyncio.sleep(0)
+    while hass.loop._ready:  # pylint: disable=protected-access
+        await asyncio.sleep(0)
+
+
+async def run_load(count, rate, duration, switch_latency, separate_entries, options):
+    """Run one load test and return its results."""
+    # pylint: disable=import-outside-toplevel
+    # Makes utcnow follow the frozen clock, before Home Assistant is loaded
+    from pytest_homeassistant_custom_component import patch_time  # noqa: F401
+    from freezegun import freeze_time
+
+    from homeassistant import bootstrap, loader
+    from homeassistant.const import ATTR_ENTITY_ID
+    from homeassistant.core import DOMAIN as HA_DOMAIN, HomeAssistant, callback
+    from homeassistant.helpers.event import async_call_later
+    from homeassistant.setup import async_setup_component
+
+    from custom_components.simple_thermostat_a.climate import SimpleThermostatA
+
+    # The keep-alive wheels pick their slots at random
+    random.seed(0)
+    with freeze_time(START) as clock, tempfile.TemporaryDirectory() as config_dir:
+        os.makedirs(os.path.join(config_dir, "custom_components"))
+        os.symlink(
+            COMPONENT,
+            os.path.join(config_dir, "custom_components", "simple_thermostat_a"),
+        )
+
+        hass = HomeAssistant(config_dir)
+        hass.config.skip_pip = True
+        loader.async_setup(hass)
+
+        sent = {}
+        latencies = []
+        switch_calls = 0
+
+        async def _async_switch(call):
+            # Stub heater: reports its new state after switch_latency
+            nonlocal switch_calls
+            switch_calls += 1
+            received = time.monotonic()
+            state = "on" if call.service == "turn_on" else "off"
+            for entity_id in call.data[ATTR_ENTITY_ID]:
+                sensor_id = entity_id.replace(f"{HEATER_DOMAIN}.", "sensor.")
+                if sensor_id in sent:
+                    # The frozen clock moves in whole microseconds
+                    latencies.append(round(received - sent.pop(sensor_id), 6))
+
+            @callback
+            def _async_report(_now=None):
+                for entity_id in call.data[ATTR_ENTITY_ID]:
+                    hass.states.async_set(entity_id, state)
+
+            if switch_latency:
+                async_call_later(hass, switch_latency, _async_report)
+            else:
+                _async_report()
+
+        await bootstrap.async_from_config_dict({"homeassistant": {}}, hass)
+        # The thermostats call homeassistant.turn_on / turn_off, answered by the stub
+        for service in ("turn_on", "turn_off"):
+            hass.services.async_register(HA_DOMAIN, service, _async_switch)
+        for index in range(count):
+            hass.states.async_set(f"{HEATER_DOMAIN}.bench_{index}", "off")
+            hass.states.async_set(f"sensor.bench_{index}", "20.0")
+
+        # Started first: the start waits for the commands of the thermostats,
+        # which may wait for a timer of the frozen clock
+        await hass.async_start()
+        await hass.async_block_till_done()
+
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        started = time.process_time()
+        await async_setup_component(
+            hass,
+            "climate",
+            {"climate": thermostat_configs(count, separate_entries, **options)},
+        )
+        # Startup commands waiting for the batch window
+        await _async_drain(hass, clock, 1 / rate)
+        startup = time.process_time() - started
+        memory_per_entity = (tracemalloc.get_traced_memory()[0] - memory_before) / count
+        tracemalloc.stop()
+
+        writes = 0
+
+        def _count_writes(event):
+            nonlocal writes
+            if event.data["entity_id"].startswith("climate.bench_"):
+                writes += 1
+
+        hass.bus.async_listen("state_changed", _count_writes)
+
+        passes = []
+        control_heating_pass = SimpleThermostatA._async_control_heating_pass
+
+        async def _async_control_heating_pass(entity, *args, **kwargs):
+            started = time.process_time()
+            await control_heating_pass(entity, *args, **kwargs)
+            passes.append(time.process_time() - started)
+
+        SimpleThermostatA._async_control_heating_pass = _async_control_heating_pass
+
+        # Each event moves one sensor across the hysteresis band or inside it.
+        # The clock only moves from one event to the next: the timers due in
+        # between (batch window, switch latency, keep-alive, retries) fire
+        # then, at the resolution of the event interval.
+        rng = random.Random(0)
+        interval = 1 / rate
+        events = int(rate * duration)
+        steps = []
+        started = time.process_time()
+        for _ in range(events):
+            step_started = time.process_time()
+            _advance(hass, clock, interval)
+            sensor_id = f"sensor.bench_{rng.randrange(count)}"
+            # The latest reading of a sensor is the one a switch command answers
+            sent[sensor_id] = time.monotonic()
+            hass.states.async_set(sensor_id, f"{rng.uniform(18.5, 21.5):.2f}")
+            await _async_settle(hass)
+            steps.append(time.process_time() - step_started)
+        elapsed = time.process_time() - started
+        # Let the commands still waiting for a timer go out
+        await _async_drain(hass, clock, interval)
+        SimpleThermostatA._async_control_heating_pass = control_heating_pass
+        await hass.async_stop()
+
+    return {
+        "thermostats": count,
+        "rate": rate,
+        "switch_latency": switch_latency,
+        "separate_entries": separate_entries,
+        "startup_cpu_seconds": startup,
+        "memory_per_thermostat_bytes": memory_per_entity,
+        "sensor_events": events,
+        "events_per_cpu_second": events / elapsed if elapsed else None,
+        "event_cpu_p50": percentile(steps, 0.5),
+        "event_cpu_p99": percentile(steps, 0.99),
+        "sensor_to_switch_p50": percentile(latencies, 0.5),
+        "sensor_to_switch_p99": percentile(latencies, 0.99),
+        "control_passes": len(passes),
+        "control_pass_p50": percentile(passes, 0.5),
+        "control_pass_p99": percentile(passes, 0.99),
+        "state_writes_per_event": writes / events if events else None,
+        "switch_service_calls": switch_calls,
+    }
+
+
+def bench_core():
+    """Import time and decision cost of the decision core, in a fresh interpreter."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        "from custom_components.simple_thermostat_a import core; "
+        "print(time.perf_counter() - start)"
+    )
+    import_seconds = float(
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    )
+
+    from custom_components.simple_thermostat_a.core import (  # pylint: disable=import-outside-toplevel
+        ThermostatState,
+        decide,
+    )
+
+    state = ThermostatState(min_cycle=300)
+    state.cur_temp = 19.5
+    state.target_temp = 20.0
+    state.hvac_off = False
+    state.heater_on = False
+    state.heater_last_changed = 0.0
+    number = 200_000
+    seconds = min(timeit.repeat(lambda: decide(state, 1000.0), number=number, repeat=5))
+
+    # pylint: disable-next=import-outside-toplevel
+    from custom_components.simple_thermostat_a.learning import RateModel
+
+    rates = RateModel()
+    for on, rate in ((1, 2.0), (0, -1.0)) * 5:
+        rates.update(on, rate)
+    prediction = min(
+        timeit.repeat(
+            lambda: rates.time_to_reach(17.0, 21.0, 1), number=number, repeat=5
+        )
+    )
+    return {
+        "import_seconds": import_seconds,
+        "decisions_per_second": number / seconds,
+        "predictions_per_second": number / prediction,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--thermostats", default="1,100,1000", help="comma separated counts"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=100.0,
+        help="sensor events per second, all thermostats",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10.0,
+        help="simulated seconds of load per count",
+    )
+    parser.add_argument(
+        "--switch-latency",
+        type=float,
+        default=0.0,
+        help="seconds taken by a switch to report its new state",
+    )
+    parser.add_argument(
+        "--separate-entries",
+        action="store_true",
+        help="one platform entry per thermostat instead of one thermostats list",
+    )
+    parser.add_argument(
+        "--option",
+        action="append",
+        default=[],
+        metavar="KEY=JSON",
+        help="platform option shared by the thermostats, e.g. min_cycle_duration=60",
+    )
+    parser.add_argument("--output", help="JSON file, stdout if omitted")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.CRITICAL)
+    options = {}
+    for option in args.option:
+        key, _, value = option.partition("=")
+        options[key] = json.loads(value)
+
+    results = {"core": bench_core(), "load": []}
+    for count in (int(value) for value in args.thermostats.split(",")):
+        results["load"].append(
+            asyncio.run(
+                run_load(
+                    count,
+                    args.rate,
+                    args.duration,
+                    args.switch_latency,
+                    args.separate_entries,
+                    options,
+                )
+            )
+        )
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,26 +8,43 @@
 import asyncio
 import logging
 import math
+import random
+import time
+from datetime import timedelta
+from typing import NamedTuple
 import voluptuous as vol
 
-from homeassistant.core import HomeAssistant
-from homeassistant.core import DOMAIN as HA_DOMAIN, CoreState, callback
-
-from homeassistant.exceptions import ConditionError
+from homeassistant.core import (
+    DOMAIN as HA_DOMAIN,
+    CoreState,
+    HassJob,
+    SupportsResponse,
+    callback,
+)
 
-from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
-from homeassistant.helpers import condition, entity_platform
+from homeassistant.helpers import entity_platform
+from homeassistant.helpers import entity_registry as er
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.event import (
-    async_track_state_change,
+    async_call_later,
+    async_track_point_in_utc_time,
     async_track_state_change_event,
     async_track_time_interval,
 )
 from homeassistant.helpers.reload import async_setup_reload_service
-from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.service import async_extract_entity_ids
+from homeassistant.helpers import restore_state
+from homeassistant.helpers.restore_state import RestoredExtraData, RestoreEntity
+from homeassistant.helpers.storage import Store
+import homeassistant.util.dt as dt_util
+from homeassistant.util import slugify
 
-from homeassistant.components.climate import PLATFORM_SCHEMA, ClimateEntity, ClimateEntityFeature
+from homeassistant.components.climate import (
+    DOMAIN as CLIMATE_DOMAIN,
+    PLATFORM_SCHEMA,
+    ClimateEntity,
+    ClimateEntityFeature,
+)
 from homeassistant.components.climate import (
     ATTR_PRESET_MODE,
     HVACMode,
@@ -42,23 +59,17 @@ from homeassistant.components.climate import (
     PRESET_ACTIVITY,
 )
 
-from homeassistant.components.number.const import (
-    ATTR_VALUE,
-    SERVICE_SET_VALUE,
-    DOMAIN as NUMBER_DOMAIN
-)
-
 from homeassistant.const import (
     ATTR_ENTITY_ID,
     ATTR_TEMPERATURE,
-    CONF_NAME,
-    CONF_UNIQUE_ID,
+    ENTITY_MATCH_ALL,
     EVENT_HOMEASSISTANT_START,
     PRECISION_HALVES,
     PRECISION_TENTHS,
     PRECISION_WHOLE,
     SERVICE_TURN_OFF,
     SERVICE_TURN_ON,
+    STATE_OFF,
     STATE_ON,
     STATE_UNAVAILABLE,
     STATE_UNKNOWN,
@@ -66,140 +77,1133 @@ from homeassistant.const import (
 
 from . import DOMAIN, PLATFORMS
 from . import const
+from .core import (
+    CONTROL_HYSTERESIS,
+    CONTROL_MODES,
+    CONTROL_TPI,
+    TURN_OFF,
+    TURN_ON,
+    ThermostatState,
+    decide,
+    select_preset,
+    tpi_on_time,
+)
+from .history import HistoryBuffer
+from .learning import RateModel, RateSampler
+from .metrics import ThermostatMetrics
+from .presets import PresetTable
+from .runtime import RuntimeCounter
+from .sensor_filter import FILTER_NONE, FILTERS, SensorFilter
+from .window import WindowDetector
 
 _LOGGER = logging.getLogger(__name__)
 
-PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
-    {
-        vol.Required(const.CONF_HEATER): cv.entity_id,
-        vol.Required(const.CONF_SENSOR): cv.entity_id,
-        vol.Optional(const.CONF_AC_MODE): cv.boolean,
-        vol.Optional(const.CONF_MAX_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_MIN_CYCLE_DURATION, default=const.DEFAULT_MIN_CYCLE_DURATION): vol.All(cv.time_period, cv.positive_timedelta),
-        vol.Optional(const.CONF_MIN_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_NAME, default=const.DEFAULT_NAME): cv.string,
-        vol.Optional(const.CONF_COLD_TOLERANCE, default=const.DEFAULT_TOLERANCE): vol.Coerce(float),
-        vol.Optional(const.CONF_HOT_TOLERANCE, default=const.DEFAULT_TOLERANCE): vol.Coerce(float),
-        vol.Optional(const.CONF_TARGET_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_KEEP_ALIVE): vol.All(cv.time_period, cv.positive_timedelta),
-        vol.Optional(const.CONF_AWAY_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_ECO_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_BOOST_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_COMFORT_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_HOME_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_SLEEP_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_ACTIVITY_TEMP): vol.Coerce(float),
-        vol.Optional(const.CONF_INITIAL_HVAC_MODE): vol.In(
-            [HVACMode.COOL, HVACMode.HEAT, HVACMode.OFF]
-        ),
-        vol.Optional(const.CONF_PRECISION): vol.In(
-            [PRECISION_TENTHS, PRECISION_HALVES, PRECISION_WHOLE]
-        ),
-        vol.Optional(const.CONF_UNIQUE_ID, default='none'): cv.string,
+# Presets in display order, each configured with a `<preset>_temp` option
+PRESETS = (
+    PRESET_AWAY,
+    PRESET_ECO,
+    PRESET_BOOST,
+    PRESET_COMFORT,
+    PRESET_HOME,
+    PRESET_SLEEP,
+    PRESET_ACTIVITY,
+)
+
+# Options of one thermostat
+THERMOSTAT_OPTIONS = {
+    vol.Required(const.CONF_HEATER): cv.entity_ids,
+    vol.Required(const.CONF_SENSOR): cv.entity_id,
+    vol.Optional(const.CONF_AC_MODE): cv.boolean,
+    vol.Optional(const.CONF_MAX_TEMP): vol.Coerce(float),
+    vol.Optional(
+        const.CONF_MIN_CYCLE_DURATION, default=const.DEFAULT_MIN_CYCLE_DURATION
+    ): vol.All(cv.time_period, cv.positive_timedelta),
+    vol.Optional(const.CONF_MIN_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_NAME, default=const.DEFAULT_NAME): cv.string,
+    vol.Optional(
+        const.CONF_COLD_TOLERANCE, default=const.DEFAULT_TOLERANCE
+    ): vol.Coerce(float),
+    vol.Optional(const.CONF_HOT_TOLERANCE, default=const.DEFAULT_TOLERANCE): vol.Coerce(
+        float
+    ),
+    vol.Optional(const.CONF_TARGET_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_KEEP_ALIVE): vol.All(cv.time_period, cv.positive_timedelta),
+    vol.Optional(const.CONF_AWAY_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_ECO_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_BOOST_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_COMFORT_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_HOME_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_SLEEP_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_ACTIVITY_TEMP): vol.Coerce(float),
+    vol.Optional(const.CONF_INITIAL_HVAC_MODE): vol.In(
+        [HVACMode.COOL, HVACMode.HEAT, HVACMode.OFF]
+    ),
+    vol.Optional(const.CONF_PRECISION): vol.In(
+        [PRECISION_TENTHS, PRECISION_HALVES, PRECISION_WHOLE]
+    ),
+    vol.Optional(const.CONF_UNIQUE_ID): cv.string,
+    vol.Optional(const.CONF_SENSOR_FILTER, default=FILTER_NONE): vol.In(FILTERS),
+    vol.Optional(
+        const.CONF_SENSOR_EMA_ALPHA, default=const.DEFAULT_SENSOR_EMA_ALPHA
+    ): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False, max=1)),
+    vol.Optional(
+        const.CONF_SENSOR_MEDIAN_WINDOW, default=const.DEFAULT_SENSOR_MEDIAN_WINDOW
+    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional(const.CONF_SENSOR_MIN_INTERVAL): vol.All(
+        cv.time_period, cv.positive_timedelta
+    ),
+    vol.Optional(const.CONF_SENSOR_DEADBAND): vol.All(
+        vol.Coerce(float), vol.Range(min=0)
+    ),
+    vol.Optional(const.CONF_METRICS, default=False): cv.boolean,
+    vol.Optional(
+        const.CONF_HEATER_CONFIRM_TIMEOUT, default=const.DEFAULT_HEATER_CONFIRM_TIMEOUT
+    ): vol.All(cv.time_period, cv.positive_timedelta),
+    vol.Optional(
+        const.CONF_HEATER_RETRIES, default=const.DEFAULT_HEATER_RETRIES
+    ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    vol.Optional(const.CONF_HEATER_STAGGER): vol.All(
+        cv.time_period, cv.positive_timedelta
+    ),
+    vol.Optional(const.CONF_HISTORY_SIZE, default=0): vol.All(
+        vol.Coerce(int), vol.Range(min=0)
+    ),
+    vol.Optional(const.CONF_HISTORY_RETENTION): vol.All(
+        cv.time_period, cv.positive_timedelta
+    ),
+    vol.Optional(const.CONF_RUNTIME_STATS, default=False): cv.boolean,
+    vol.Optional(
+        const.CONF_RUNTIME_STATS_INTERVAL, default=const.DEFAULT_RUNTIME_STATS_INTERVAL
+    ): vol.All(cv.time_period, cv.positive_timedelta),
+    vol.Optional(const.CONF_STATE_WRITE_INTERVAL): vol.All(
+        cv.time_period, cv.positive_timedelta
+    ),
+    vol.Optional(const.CONF_WINDOW_DROP): vol.All(
+        vol.Coerce(float), vol.Range(min=0, min_included=False)
+    ),
+    vol.Optional(
+        const.CONF_WINDOW_SLOPE_PERIOD, default=const.DEFAULT_WINDOW_SLOPE_PERIOD
+    ): vol.All(cv.time_period, cv.positive_timedelta),
+    vol.Optional(const.CONF_WINDOW_PRESET): vol.In(PRESETS),
+    vol.Optional(
+        const.CONF_WINDOW_TIMEOUT, default=const.DEFAULT_WINDOW_TIMEOUT
+    ): vol.All(cv.time_period, cv.positive_timedelta),
+    vol.Optional(const.CONF_CONTROL_MODE, default=CONTROL_HYSTERESIS): vol.In(
+        CONTROL_MODES
+    ),
+    vol.Optional(const.CONF_TPI_CYCLE, default=const.DEFAULT_TPI_CYCLE): vol.All(
+        cv.time_period, cv.positive_timedelta
+    ),
+    vol.Optional(const.CONF_TPI_COEF_INT, default=const.DEFAULT_TPI_COEF_INT): vol.All(
+        vol.Coerce(float), vol.Range(min=0)
+    ),
+    vol.Optional(const.CONF_TPI_COEF_EXT, default=const.DEFAULT_TPI_COEF_EXT): vol.All(
+        vol.Coerce(float), vol.Range(min=0)
+    ),
+    vol.Optional(const.CONF_OUTDOOR_SENSOR): cv.entity_id,
+    vol.Optional(const.CONF_PREHEAT, default=False): cv.boolean,
+}
+
+
+def _check_window_preset(config):
+    """Reject a window_preset whose temperature is not configured."""
+    preset = config.get(const.CONF_WINDOW_PRESET)
+    if preset is not None and config.get(preset + "_temp") is None:
+        raise vol.Invalid(
+            f"window_preset needs a temperature, set {preset}_temp",
+            path=[const.CONF_WINDOW_PRESET],
+        )
+    return config
+
+
+THERMOSTAT_SCHEMA = vol.All(vol.Schema(THERMOSTAT_OPTIONS), _check_window_preset)
+
+# The same options, all optional and without defaults, as found in the
+# shared part and in the entries of the multi-thermostat form
+_THERMOSTAT_OVERRIDES = {
+    vol.Optional(str(key)): validator for key, validator in THERMOSTAT_OPTIONS.items()
+}
+
+# Options that are never shared between the thermostats of a platform entry
+_PER_THERMOSTAT_KEYS = (const.CONF_NAME, const.CONF_UNIQUE_ID)
+
+
+def _expand_thermostats(config):
+    """Validate every thermostat of a platform entry with the shared options applied."""
+    config = dict(config)
+    entries = config.get(const.CONF_THERMOSTATS)
+    shared = {
+        key: value
+        for key, value in config.items()
+        if key in _THERMOSTAT_OVERRIDES
+        and (entries is None or key not in _PER_THERMOSTAT_KEYS)
     }
+    if entries is None:
+        # Single thermostat entries always had a unique id, keep it stable
+        shared.setdefault(const.CONF_UNIQUE_ID, const.DEFAULT_UNIQUE_ID)
+        config[const.CONF_THERMOSTATS] = [THERMOSTAT_SCHEMA(shared)]
+    else:
+        thermostats = []
+        for index, entry in enumerate(entries):
+            try:
+                thermostats.append(THERMOSTAT_SCHEMA({**shared, **entry}))
+            except vol.Invalid as ex:
+                ex.prepend([const.CONF_THERMOSTATS, index])
+                raise
+        config[const.CONF_THERMOSTATS] = thermostats
+    return config
+
+
+PLATFORM_SCHEMA = vol.All(
+    PLATFORM_SCHEMA.extend(
+        {
+            **_THERMOSTAT_OVERRIDES,
+            vol.Optional(const.CONF_THERMOSTATS): vol.All(
+                cv.ensure_list, [vol.Schema(_THERMOSTAT_OVERRIDES)]
+            ),
+            vol.Optional(
+                const.CONF_SWITCH_BATCH_WINDOW,
+                default=const.DEFAULT_SWITCH_BATCH_WINDOW,
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        }
+    ),
+    _expand_thermostats,
 )
 
+SET_PRESET_TEMP_SCHEMA = {
+    vol.Optional("away_temp"): vol.Coerce(float),
+    vol.Optional("eco_temp"): vol.Coerce(float),
+    vol.Optional("boost_temp"): vol.Coerce(float),
+    vol.Optional("comfort_temp"): vol.Coerce(float),
+    vol.Optional("home_temp"): vol.Coerce(float),
+    vol.Optional("sleep_temp"): vol.Coerce(float),
+    vol.Optional("activity_temp"): vol.Coerce(float),
+}
+
+BULK_SET_PRESETS_SCHEMA = vol.All(
+    cv.make_entity_service_schema(
+        {
+            vol.Optional(ATTR_PRESET_MODE): cv.string,
+            **SET_PRESET_TEMP_SCHEMA,
+        }
+    ),
+    cv.has_at_least_one_key(ATTR_PRESET_MODE, *SET_PRESET_TEMP_SCHEMA),
+)
+
+SET_METRICS_SCHEMA = {
+    vol.Required("enabled"): cv.boolean,
+}
+
+QUERY_HISTORY_SCHEMA = {
+    vol.Optional("duration", default=timedelta(hours=1)): vol.All(
+        cv.time_period, cv.positive_timedelta
+    ),
+    vol.Optional("end"): cv.datetime,
+    vol.Optional("buckets", default=60): vol.All(
+        vol.Coerce(int), vol.Range(min=1, max=1000)
+    ),
+}
+
+SET_PRESET_AT_SCHEMA = {
+    vol.Required("preset_mode"): cv.string,
+    vol.Required("at"): cv.datetime,
+}
+
+DUMP_METRICS_SCHEMA = {
+    vol.Optional("reset", default=False): cv.boolean,
+}
+
+
+class SwitchCoordinator:
+    """Batch the heater switch service calls of every thermostat of a hass instance.
+
+    Commands are batched per service and per context, so each call keeps the
+    context of the service call or event that caused it.
+    """
+
+    def __init__(self, hass):
+        self.hass = hass
+        # Windows of the thermostats added, by window
+        self._windows = {}
+        # (service, context id): (context, {entity_id: [waiters]})
+        self._pending = {}
+        self._flush_handle = None
+
+    @property
+    def window(self):
+        """Seconds to wait for more commands, 0 means the current loop iteration.
+
+        Several platform entries share one coordinator: the widest window of
+        the thermostats added is honoured.
+        """
+        return max(self._windows, default=0)
+
+    @callback
+    def async_add_window(self, window):
+        """Honour window while a thermostat is added. Return the callback removing it."""
+        self._windows[window] = self._windows.get(window, 0) + 1
+
+        @callback
+        def _async_remove():
+            self._windows[window] -= 1
+            if not self._windows[window]:
+                del self._windows[window]
+
+        return _async_remove
+
+    async def async_call(self, service, entity_id, context=None):
+        """Queue a turn_on / turn_off for entity_id and wait for the batched call."""
+        waiters = []
+        for (queued, _), (_, entities) in self._pending.items():
+            for waiter in entities.pop(entity_id, ()):
+                if queued == service:
+                    # Sent with the latest context
+                    waiters.append(waiter)
+                elif not waiter.done():
+                    # The latest decision for an entity wins over a queued opposite command
+                    waiter.set_result(None)
+
+        waiter = self.hass.loop.create_future()
+        waiters.append(waiter)
+        key = (service, context.id if context is not None else None)
+        if key not in self._pending:
+            self._pending[key] = (context, {})
+        self._pending[key][1][entity_id] = waiters
+        if self._flush_handle is None:
+            if self.window:
+                self._flush_handle = self.hass.loop.call_later(
+                    self.window, self._async_flush
+                )
+            else:
+                self._flush_handle = self.hass.loop.call_soon(self._async_flush)
+        await waiter
+
+    @callback
+    def _async_flush(self):
+        """Send one service call per service and context for everything queued so far."""
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for (service, _), (context, waiters) in pending.items():
+            if waiters:
+                self.hass.async_create_task(self._async_send(service, waiters, context))
+
+    async def _async_send(self, service, waiters, context):
+        data = {ATTR_ENTITY_ID: list(waiters)}
+        try:
+            await self.hass.services.async_call(
+                HA_DOMAIN, service, data, context=context
+            )
+        except Exception as ex:  # pylint: disable=broad-except
+            for entity_waiters in waiters.values():
+                for waiter in entity_waiters:
+                    if not waiter.done():
+                        waiter.set_exception(ex)
+            return
+        for entity_waiters in waiters.values():
+            for waiter in entity_waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+
+@callback
+def async_get_switch_coordinator(hass):
+    """Return the switch coordinator shared by all thermostats, creating it if needed."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    coordinator = domain_data.get(const.DATA_SWITCH_COORDINATOR)
+    if coordinator is None:
+        coordinator = domain_data[const.DATA_SWITCH_COORDINATOR] = SwitchCoordinator(
+            hass
+        )
+    return coordinator
+
+
+class HeaterPipeline:
+    """Deliver the turn_on / turn_off commands of one heater without blocking the control loop.
+
+    A request identical to the command in flight, or to the state the switch
+    already reports, is dropped. A command is confirmed when the switch reports
+    the matching state; until then it is sent again each time the confirmation
+    timeout, doubled at each attempt, expires, up to `retries` times.
+    A keep-alive resend is dropped too while a command is in flight, or while
+    the command that brought the switch to its state was confirmed less than
+    `keep_alive` seconds ago.
+    """
+
+    def __init__(
+        self, hass, entity_id, timeout, retries, on_confirmed=None, keep_alive=None
+    ):
+        self.hass = hass
+        self.entity_id = entity_id
+        # Seconds to wait for the first confirmation
+        self.timeout = timeout
+        self.retries = retries
+        # Called with the seconds between the request and its confirmation
+        self._on_confirmed = on_confirmed
+        self.keep_alive = keep_alive
+        self.intended = None
+        self._in_flight = None
+        self._context = None
+        self._attempt = 0
+        self._requested_at = None
+        # Last command that changed the switch, and when it was confirmed
+        self._applied = None
+        self._applied_at = None
+        # The switch already showed the command in flight when it was sent
+        self._shown = False
+        self._timer = None
+        self.stats = {
+            "sent": 0,
+            "deduplicated": 0,
+            "confirmed": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "failures": 0,
+        }
+
+    @callback
+    def async_request(self, service, resend=False, context=None):
+        """Ask for service. resend also sends it if the switch already has that state.
+
+        context is the context of the command and of its retries.
+        """
+        if service == self._in_flight or (resend and self._in_flight is not None):
+            # A keep-alive does not supersede a command waiting for its confirmation
+            self.stats["deduplicated"] += 1
+            return
+        self.intended = service
+        shown = self._is_confirmed(service, self.hass.states.get(self.entity_id))
+        if (
+            shown
+            and self._in_flight is None
+            and (not resend or self._is_recent(service))
+        ):
+            self.stats["deduplicated"] += 1
+            return
+        # Supersedes an opposite command still in flight
+        self._async_cancel_timer()
+        self._in_flight = service
+        self._shown = shown
+        self._context = context
+        self._attempt = 0
+        self._requested_at = time.monotonic()
+        self._async_send()
+
+    @callback
+    def async_confirm(self, state):
+        """Check the new state of the switch against the command in flight."""
+        if self._applied is not None and not self._is_confirmed(self._applied, state):
+            # Switched by something else since
+            self._applied = None
+        if self._in_flight is None or not self._is_confirmed(self._in_flight, state):
+            return
+        self._async_cancel_timer()
+        if not self._shown:
+            # The switch changed to the command
+            self._applied = self._in_flight
+            self._applied_at = time.monotonic()
+        self._in_flight = None
+        self.stats["confirmed"] += 1
+        if self._on_confirmed is not None:
+            self._on_confirmed(time.monotonic() - self._requested_at)
+
+    @callback
+    def async_stop(self):
+        self._async_cancel_timer()
+        self._in_flight = None
+
+    def _is_recent(self, service):
+        """True if service changed the switch less than keep_alive seconds ago."""
+        return (
+            self.keep_alive is not None
+            and self._applied == service
+            and time.monotonic() - self._applied_at < self.keep_alive
+        )
+
+    @staticmethod
+    def _is_confirmed(service, state):
+        expected = STATE_ON if service == SERVICE_TURN_ON else STATE_OFF
+        return state is not None and state.state == expected
+
+    @callback
+    def _async_send(self):
+        self.stats["sent"] += 1
+        self._timer = async_call_later(
+            self.hass, self.timeout * 2**self._attempt, self._async_timeout
+        )
+        self.hass.async_create_task(self._async_call(self._in_flight, self._context))
+
+    async def _async_call(self, service, context):
+        try:
+            await async_get_switch_coordinator(self.hass).async_call(
+                service, self.entity_id, context
+            )
+        except Exception as ex:  # pylint: disable=broad-except
+            # Retried when the confirmation times out
+            _LOGGER.warning("Unable to %s heater %s: %s", service, self.entity_id, ex)
+            return
+        # A switch already in the requested state sends no state change
+        self.async_confirm(self.hass.states.get(self.entity_id))
+
+    @callback
+    def _async_timeout(self, _now):
+        self._timer = None
+        self.stats["timeouts"] += 1
+        if self._attempt >= self.retries:
+            self.stats["failures"] += 1
+            _LOGGER.warning(
+                "Heater %s did not confirm %s after %s attempts",
+                self.entity_id,
+                self._in_flight,
+                self._attempt + 1,
+            )
+            # The next control pass decides again from the reported state
+            self._in_flight = None
+            return
+        self._attempt += 1
+        self.stats["retries"] += 1
+        self._async_send()
+
+    @callback
+    def _async_cancel_timer(self):
+        if self._timer is not None:
+            self._timer()
+            self._timer = None
+
+
+class KeepAliveScheduler:
+    """Run the keep-alive of every thermostat of a hass instance from timer wheels.
+
+    There is one wheel per keep-alive interval. Its thermostats are spread
+    over the slots of the wheel and each tick handles one slot in a batch,
+    so the work is even across the interval instead of arriving in waves.
+    """
+
+    # Upper bound on the number of slots, and shortest tick, of a wheel
+    MAX_SLOTS = 60
+    MIN_TICK = 1
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._wheels = {}
+
+    @callback
+    def async_add(self, entity, interval):
+        """Register the keep-alive of entity and return a callback to remove it."""
+        wheel = self._wheels.get(interval)
+        if wheel is None:
+            wheel = self._wheels[interval] = _KeepAliveWheel(self.hass, interval)
+        wheel.async_add(entity)
+
+        @callback
+        def _async_remove():
+            wheel.async_remove(entity)
+            if wheel.is_empty and self._wheels.get(interval) is wheel:
+                wheel.async_stop()
+                del self._wheels[interval]
+
+        return _async_remove
+
+
+class _KeepAliveWheel:
+    """Timer wheel of the thermostats sharing a keep-alive interval."""
+
+    def __init__(self, hass, interval):
+        self.hass = hass
+        seconds = interval.total_seconds()
+        count = int(
+            max(
+                1,
+                min(
+                    KeepAliveScheduler.MAX_SLOTS, seconds // KeepAliveScheduler.MIN_TICK
+                ),
+            )
+        )
+        self._slots = [set() for _ in range(count)]
+        self._slot_of = {}
+        self._cursor = 0
+        # Shared by the thermostats, it does not go away with one of them
+        self._unsub = async_track_time_interval(
+            hass,
+            self._async_tick,
+            timedelta(seconds=seconds / count),
+            cancel_on_shutdown=True,
+        )
+
+    @property
+    def is_empty(self):
+        return not self._slot_of
+
+    @callback
+    def async_add(self, entity):
+        # Least loaded slot, searched from a random phase to jitter the ties
+        count = len(self._slots)
+        start = random.randrange(count)
+        index = min(
+            ((start + offset) % count for offset in range(count)),
+            key=lambda slot: len(self._slots[slot]),
+        )
+        self._slots[index].add(entity)
+        self._slot_of[entity] = index
+
+    @callback
+    def async_remove(self, entity):
+        index = self._slot_of.pop(entity, None)
+        if index is not None:
+            self._slots[index].discard(entity)
+
+    @callback
+    def async_stop(self):
+        self._unsub()
+
+    async def _async_tick(self, now):
+        due = self._slots[self._cursor]
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        if due:
+            # Switch commands of the batch are merged by the SwitchCoordinator
+            await asyncio.gather(
+                *(entity._async_control_heating(now) for entity in list(due))
+            )
+
+
+@callback
+def async_get_keep_alive_scheduler(hass):
+    """Return the keep-alive scheduler shared by all thermostats, creating it if needed."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    scheduler = domain_data.get(const.DATA_KEEP_ALIVE_SCHEDULER)
+    if scheduler is None:
+        scheduler = domain_data[const.DATA_KEEP_ALIVE_SCHEDULER] = KeepAliveScheduler(
+            hass
+        )
+    return scheduler
+
+
+class PreheatScheduler:
+    """Start the scheduled presets of every thermostat of a hass instance.
+
+    One timer for the whole fleet: every minute, each thermostat with a
+    scheduled preset predicts from its learned rates how long it needs to
+    reach the target, an O(1) step, and switches once that time has come.
+    """
+
+    INTERVAL = timedelta(minutes=1)
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._entities = set()
+        self._unsub = None
+
+    @callback
+    def async_add(self, entity):
+        self._entities.add(entity)
+        if self._unsub is None:
+            self._unsub = async_track_time_interval(
+                self.hass, self._async_tick, self.INTERVAL, cancel_on_shutdown=True
+            )
+
+    @callback
+    def async_remove(self, entity):
+        self._entities.discard(entity)
+        if not self._entities and self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    async def _async_tick(self, now):
+        now = now.timestamp()
+        due = [entity for entity in self._entities if entity._preheat_due(now)]
+        if due:
+            # Switch commands of the batch are merged by the SwitchCoordinator
+            await asyncio.gather(
+                *(entity._async_run_scheduled_preset() for entity in due)
+            )
+
+
+@callback
+def async_get_preheat_scheduler(hass):
+    """Return the preheat scheduler shared by all thermostats, creating it if needed."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    scheduler = domain_data.get(const.DATA_PREHEAT_SCHEDULER)
+    if scheduler is None:
+        scheduler = domain_data[const.DATA_PREHEAT_SCHEDULER] = PreheatScheduler(hass)
+    return scheduler
+
+
+class PresetStore:
+    """Preset temperatures and saved "none" target of every thermostat, in one Store.
+
+    Loaded once for all the platform entries. Changes are written together
+    PRESET_SAVE_DELAY seconds after the first one, so a scheduler changing
+    many thermostats at once costs a single write. A thermostat is stored
+    under its unique_id, or its name without one, so that renaming its
+    entity keeps its presets.
+    """
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._store = Store(
+            hass, const.PRESET_STORAGE_VERSION, const.PRESET_STORAGE_KEY
+        )
+        self._data = {}
+        self._load_task = None
+
+    async def async_load(self):
+        """Load the stored data, once."""
+        if self._load_task is None:
+            self._load_task = self.hass.async_create_task(self._async_load())
+        await self._load_task
+
+    async def _async_load(self):
+        self._data = await self._store.async_load() or {}
+
+    @callback
+    def async_get(self, key):
+        """Return the stored presets of the thermostat key, or None."""
+        return self._data.get(key)
+
+    @callback
+    def async_save(self, key, presets, saved_target_temp):
+        """Store the presets of the thermostat key with the next write."""
+        self._data[key] = {
+            "temps": dict(presets.temps),
+            "saved_target_temp": saved_target_temp,
+        }
+        self._store.async_delay_save(self._data_to_save, const.PRESET_SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self):
+        return self._data
+
+
+async def async_get_preset_store(hass):
+    """Return the loaded preset store shared by all thermostats, creating it if needed."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    store = domain_data.get(const.DATA_PRESET_STORE)
+    if store is None:
+        store = domain_data[const.DATA_PRESET_STORE] = PresetStore(hass)
+    await store.async_load()
+    return store
+
+
+class StartupHydrator:
+    """Hydrate the thermostats of a platform entry.
+
+    The restore data and stored presets of the whole entry are read in one
+    pass before the thermostats are added, so adding one only applies them.
+    The sensor readings are applied in one pass when Home Assistant starts.
+    """
+
+    def __init__(self, hass, preset_store):
+        self.hass = hass
+        self.preset_store = preset_store
+        # Per thermostat: entity_id expected, (old state, stored presets, extra data)
+        self._prepared = {}
+        # Thermostats waiting for the start of Home Assistant
+        self._waiting_start = []
+        self._unsub_start = None
+
+    @callback
+    def async_prepare(self, entities):
+        """Read the restore data of entities, before they are added."""
+        last_states = restore_state.async_get(self.hass).last_states
+        registry = er.async_get(self.hass)
+        for entity in entities:
+            entity_id = None
+            if entity.unique_id is not None:
+                entity_id = registry.async_get_entity_id(
+                    CLIMATE_DOMAIN, DOMAIN, entity.unique_id
+                )
+            if entity_id is None:
+                entity_id = f"{CLIMATE_DOMAIN}.{slugify(entity.name)}"
+            self._prepared[entity] = (
+                entity_id,
+                self._async_read(last_states, entity_id, entity.preset_key),
+            )
+
+    @callback
+    def _async_read(self, last_states, entity_id, preset_key):
+        stored = last_states.get(entity_id)
+        return (
+            stored.state if stored else None,
+            self.preset_store.async_get(preset_key),
+            stored.extra_data.as_dict() if stored and stored.extra_data else None,
+        )
+
+    @callback
+    def async_hydrate(self, entity):
+        """Restore entity before its first state write."""
+        entity_id, restored = self._prepared.pop(entity, (None, None))
+        if entity_id != entity.entity_id:
+            # Not prepared, or given another entity_id (name taken)
+            restored = self._async_read(
+                restore_state.async_get(self.hass).last_states,
+                entity.entity_id,
+                entity.preset_key,
+            )
+        entity._async_update_heater(
+            [self.hass.states.get(entity_id) for entity_id in entity.heater_entity_ids]
+        )
+        entity._async_restore(*restored)
+        if self.hass.state == CoreState.running:
+            entity._async_startup(self.hass.states.get(entity.sensor_entity_id))
+            return
+        self._waiting_start.append(entity)
+        if self._unsub_start is None:
+            self._unsub_start = self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_START, self._async_startup
+            )
+
+    @callback
+    def async_remove(self, entity):
+        """Forget entity, removed before Home Assistant started."""
+        self._prepared.pop(entity, None)
+        if entity not in self._waiting_start:
+            return
+        self._waiting_start.remove(entity)
+        if not self._waiting_start and self._unsub_start is not None:
+            self._unsub_start()
+            self._unsub_start = None
+
+    @callback
+    def _async_startup(self, _event):
+        """Apply the sensor readings of every thermostat on startup."""
+        self._unsub_start = None
+        entities, self._waiting_start = self._waiting_start, []
+        states = {}
+        for entity in entities:
+            if entity.sensor_entity_id not in states:
+                states[entity.sensor_entity_id] = self.hass.states.get(
+                    entity.sensor_entity_id
+                )
+            if entity._async_startup(states[entity.sensor_entity_id]):
+                entity.async_write_ha_state()
+
+
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     # Set up the simple thermostat thermostat platform.
-    
-    await async_setup_reload_service(hass, DOMAIN, PLATFORMS)
+    # A platform entry holds one thermostat, or a list of them under `thermostats`.
 
     platform = entity_platform.current_platform.get()
     assert platform
-    
-    parameters = {
-      'name' : config.get(const.CONF_NAME),
-      'unique_id' : config.get(const.CONF_UNIQUE_ID),
-      'heater_entity_id' : config.get(const.CONF_HEATER),
-      'sensor_entity_id' : config.get(const.CONF_SENSOR),
-      'min_temp' : config.get(const.CONF_MIN_TEMP),
-      'max_temp' : config.get(const.CONF_MAX_TEMP),
-      'target_temp' : config.get(const.CONF_TARGET_TEMP),
-      'ac_mode' : config.get(const.CONF_AC_MODE),
-      'min_cycle_duration' : config.get(const.CONF_MIN_CYCLE_DURATION),
-      'cold_tolerance' : config.get(const.CONF_COLD_TOLERANCE),
-      'hot_tolerance' : config.get(const.CONF_HOT_TOLERANCE),
-      'keep_alive' : config.get(const.CONF_KEEP_ALIVE),
-      'initial_hvac_mode' : config.get(const.CONF_INITIAL_HVAC_MODE),
-      'away_temp': config.get(const.CONF_AWAY_TEMP),
-      'eco_temp': config.get(const.CONF_ECO_TEMP),
-      'boost_temp': config.get(const.CONF_BOOST_TEMP),
-      'comfort_temp': config.get(const.CONF_COMFORT_TEMP),
-      'home_temp': config.get(const.CONF_HOME_TEMP),
-      'sleep_temp': config.get(const.CONF_SLEEP_TEMP),
-      'activity_temp': config.get(const.CONF_ACTIVITY_TEMP),
-      'precision' : config.get(const.CONF_PRECISION),
-      'unit' : hass.config.units.temperature_unit,
+
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if not domain_data.get(const.DATA_SERVICES_REGISTERED):
+        # Entity services are shared by all the entries of the platform
+        await async_setup_reload_service(hass, DOMAIN, PLATFORMS)
+        platform.async_register_entity_service(  # type: ignore
+            const.SERVICE_SET_PRESET_TEMP,
+            SET_PRESET_TEMP_SCHEMA,
+            "async_set_preset_temp",
+        )
+        platform.async_register_entity_service(  # type: ignore
+            const.SERVICE_SET_METRICS,
+            SET_METRICS_SCHEMA,
+            "async_set_metrics",
+        )
+        platform.async_register_entity_service(  # type: ignore
+            const.SERVICE_DUMP_METRICS,
+            DUMP_METRICS_SCHEMA,
+            "async_dump_metrics",
+            supports_response=SupportsResponse.ONLY,
+        )
+        platform.async_register_entity_service(  # type: ignore
+            const.SERVICE_SET_PRESET_AT,
+            SET_PRESET_AT_SCHEMA,
+            "async_set_preset_at",
+        )
+        platform.async_register_entity_service(  # type: ignore
+            const.SERVICE_QUERY_HISTORY,
+            QUERY_HISTORY_SCHEMA,
+            "async_query_history",
+            supports_response=SupportsResponse.ONLY,
+        )
+
+        async def _async_bulk_set_presets(call):
+            await async_bulk_set_presets(hass, call)
+
+        hass.services.async_register(
+            DOMAIN,
+            const.SERVICE_BULK_SET_PRESETS,
+            _async_bulk_set_presets,
+            schema=BULK_SET_PRESETS_SCHEMA,
+        )
+        domain_data[const.DATA_SERVICES_REGISTERED] = True
+
+    unit = hass.config.units.temperature_unit
+    # Loaded in bulk, before the thermostats are restored
+    preset_store = await async_get_preset_store(hass)
+    hydrator = StartupHydrator(hass, preset_store)
+    entities = [
+        SimpleThermostatA(
+            unit=unit,
+            hydrator=hydrator,
+            preset_store=preset_store,
+            switch_batch_window=config[const.CONF_SWITCH_BATCH_WINDOW],
+            **thermostat,
+        )
+        for thermostat in config[const.CONF_THERMOSTATS]
+    ]
+    hydrator.async_prepare(entities)
+    async_add_entities(entities)
+
+
+async def async_bulk_set_presets(hass, call):
+    """Apply preset temperatures and / or a preset mode to many thermostats at once.
+
+    The targets are resolved and the data validated once. The control passes
+    of the changed thermostats run together, so their switch commands are
+    batched by the SwitchCoordinator. Like an entity service, each target
+    takes the context of the call for its switch commands and state write.
+    """
+    thermostats = hass.data.get(DOMAIN, {}).get(const.DATA_ENTITIES, {})
+    temps = {
+        mode: call.data[mode + "_temp"]
+        for mode in PRESETS
+        if mode + "_temp" in call.data
     }
-    async_add_entities([SimpleThermostatA(**parameters)])
+    preset_mode = call.data.get(ATTR_PRESET_MODE)
+    if call.data.get(ATTR_ENTITY_ID) == ENTITY_MATCH_ALL:
+        entity_ids = list(thermostats)
+    else:
+        entity_ids = await async_extract_entity_ids(hass, call)
+    changed = []
+    for entity_id in entity_ids:
+        entity = thermostats.get(entity_id)
+        if entity is None:
+            continue
+        entity.async_set_context(call.context)
+        target_changed = entity._async_apply_preset_temps(temps)
+        if preset_mode is not None:
+            target_changed = (
+                entity._async_apply_preset_mode(preset_mode) or target_changed
+            )
+        if target_changed:
+            changed.append(entity)
+    await asyncio.gather(
+        *(entity._async_control_heating(force=True) for entity in changed)
+    )
+    for entity in changed:
+        entity.async_write_ha_state()
 
-    platform.async_register_entity_service(  # type: ignore
-        "set_preset_temp",
-        {
-            vol.Optional("away_temp"): vol.Coerce(float),
-            vol.Optional("eco_temp"): vol.Coerce(float),
-            vol.Optional("boost_temp"): vol.Coerce(float),
-            vol.Optional("comfort_temp"): vol.Coerce(float),
-            vol.Optional("home_temp"): vol.Coerce(float),
-            vol.Optional("sleep_temp"): vol.Coerce(float),
-            vol.Optional("activity_temp"): vol.Coerce(float),
-        },
-        "async_set_preset_temp",
+
+class StateFingerprint(NamedTuple):
+    """Compact summary of what a state write would show."""
+
+    # Written at once when they change
+    target_temp: float
+    hvac_mode: str
+    hvac_action: str
+    preset_mode: str
+    window_open: bool
+    # Written at most once per state_write_interval when only they change
+    cur_temp: int
+    runtime_attributes: dict
+    on_percent: int
+    rates: tuple
+
+    IMMEDIATE = (
+        "target_temp",
+        "hvac_mode",
+        "hvac_action",
+        "preset_mode",
+        "window_open",
     )
 
+    def same_immediate(self, other):
+        """True if none of the fields written at once differs from other."""
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.IMMEDIATE
+        )
+
+
 class SimpleThermostatA(ClimateEntity, RestoreEntity):
     # Representation of a Simple Thermostat device
 
+    # Change at nearly every write and are only useful live; the runtime
+    # counters, learned rates and scheduled preset are kept by the thermostat
+    # itself. The climate base already keeps hvac_modes, min/max temp, step
+    # and preset_modes out of the recorder, and current_temperature is
+    # rounded to the precision.
+    _unrecorded_attributes = frozenset(
+        {
+            "suppressed_writes",
+            "heater_runtime_hours",
+            "heater_cycles",
+            "duty_cycle_hour",
+            "duty_cycle_day",
+            "heating_rate",
+            "cooling_rate",
+            "scheduled_preset",
+            "scheduled_preset_at",
+        }
+    )
+
     def __init__(self, **kwargs):
         # Initialize the thermostat
-        self._name = kwargs.get('name')
-        self._unique_id = kwargs.get('unique_id')
-        self.heater_entity_id = kwargs.get('heater_entity_id')
-        self.sensor_entity_id = kwargs.get('sensor_entity_id')
-        self.ac_mode = kwargs.get('ac_mode', False)
-        self.min_cycle_duration = kwargs.get('min_cycle_duration')
-        self._cold_tolerance = kwargs.get('cold_tolerance')
-        self._hot_tolerance = kwargs.get('hot_tolerance')
-        self._keep_alive = kwargs.get('keep_alive')
-        self._hvac_mode = kwargs.get('initial_hvac_mode')
-        self._saved_target_temp = kwargs.get('target_temp')
-        self._temp_precision = kwargs.get('precision')
+        self._name = kwargs.get("name")
+        self._unique_id = kwargs.get("unique_id")
+        self._hydrator = kwargs.get("hydrator")
+        self._switch_batch_window = kwargs.get("switch_batch_window")
+        self._preset_store = kwargs.get("preset_store")
+        # Heaters of the zone, driven together by each control pass
+        self.heater_entity_ids = kwargs.get(const.CONF_HEATER)
+        self.sensor_entity_id = kwargs.get(const.CONF_SENSOR)
+        self.ac_mode = kwargs.get("ac_mode", False)
+        self.min_cycle_duration = kwargs.get("min_cycle_duration")
+        self._cold_tolerance = kwargs.get("cold_tolerance")
+        self._hot_tolerance = kwargs.get("hot_tolerance")
+        # Inputs of the decision core; the heater fields are kept up to date
+        # by _async_switch_changed, the others at each control pass
+        self._core = ThermostatState(
+            self.ac_mode,
+            self._cold_tolerance,
+            self._hot_tolerance,
+            self.min_cycle_duration.total_seconds() if self.min_cycle_duration else 0,
+        )
+        self._keep_alive = kwargs.get("keep_alive")
+        # Command pipeline of each heater, created once added to hass
+        self._heaters = {}
+        # Seconds between the starts of the heaters of the zone
+        heater_stagger = kwargs.get(const.CONF_HEATER_STAGGER)
+        self._heater_stagger = heater_stagger.total_seconds() if heater_stagger else 0
+        # Pending staggered starts, by heater
+        self._stagger_unsubs = {}
+        self._heater_confirm_timeout = kwargs.get(
+            const.CONF_HEATER_CONFIRM_TIMEOUT,
+            timedelta(seconds=const.DEFAULT_HEATER_CONFIRM_TIMEOUT),
+        )
+        self._heater_retries = kwargs.get(
+            const.CONF_HEATER_RETRIES, const.DEFAULT_HEATER_RETRIES
+        )
+        self._hvac_mode = kwargs.get("initial_hvac_mode")
+        self._saved_target_temp = kwargs.get("target_temp")
+        self._temp_precision = kwargs.get("precision")
+        self._sensor_filter = None
+        self._held_reading_unsub = None
+        sensor_filter = kwargs.get("sensor_filter") or FILTER_NONE
+        sensor_min_interval = kwargs.get("sensor_min_interval")
+        sensor_deadband = kwargs.get("sensor_deadband")
+        if sensor_filter != FILTER_NONE or sensor_min_interval or sensor_deadband:
+            self._sensor_filter = SensorFilter(
+                sensor_filter,
+                alpha=kwargs.get("sensor_ema_alpha", const.DEFAULT_SENSOR_EMA_ALPHA),
+                window=kwargs.get(
+                    "sensor_median_window", const.DEFAULT_SENSOR_MEDIAN_WINDOW
+                ),
+                min_interval=(
+                    sensor_min_interval.total_seconds() if sensor_min_interval else 0
+                ),
+                deadband=sensor_deadband or 0,
+            )
         if self.ac_mode:
             self._attr_hvac_list = [HVACMode.COOL, HVACMode.OFF]
         else:
             self._attr_hvac_list = [HVACMode.HEAT, HVACMode.OFF]
-        self._hvac_mode = kwargs.get('initial_hvac_mode', None)
+        self._hvac_mode = kwargs.get("initial_hvac_mode", None)
         self._active = False
-        self._current_temp = None
-        self._temp_lock = asyncio.Lock()
-        self._min_temp = kwargs.get('min_temp')
-        self._max_temp = kwargs.get('max_temp')
-        self._target_temp = kwargs.get('target_temp')
-        self._saved_target_temp = kwargs.get('target_temp', None) or kwargs.get('away_temp', None)
-        self._unit = kwargs.get('unit')
+        self._cur_temp = None
+        # Pending re-evaluation at the end of the minimum cycle
+        self._min_cycle_unsub = None
+        self._min_cycle_end = None
+        # Fingerprint of the last written state, see _async_write_ha_state_if_changed
+        self._last_fingerprint = None
+        self._suppressed_writes = 0
+        # Minimum seconds between two writes that only change the temperature
+        # or the runtime attributes, see _async_write_ha_state_if_changed
+        state_write_interval = kwargs.get(const.CONF_STATE_WRITE_INTERVAL)
+        self._state_write_interval = (
+            state_write_interval.total_seconds() if state_write_interval else 0
+        )
+        self._last_write = None
+        self._deferred_write_unsub = None
+        self._deferred_write_job = HassJob(
+            self._async_deferred_write, "deferred write", cancel_on_shutdown=True
+        )
+        # Recent states for query_history, None while disabled
+        history_size = kwargs.get(const.CONF_HISTORY_SIZE)
+        self._history = HistoryBuffer(history_size) if history_size else None
+        self._history_retention = kwargs.get(const.CONF_HISTORY_RETENTION)
+        # Heater runtime accounting, None while disabled. Its attributes are
+        # refreshed every runtime_stats_interval, which bounds the writes.
+        self._runtime = (
+            RuntimeCounter() if kwargs.get(const.CONF_RUNTIME_STATS) else None
+        )
+        self._runtime_stats_interval = kwargs.get(const.CONF_RUNTIME_STATS_INTERVAL)
+        self._runtime_attributes = {}
+        # Open window detection, None while disabled. While a window is open,
+        # heating is suspended, or window_preset is used if configured.
+        window_drop = kwargs.get(const.CONF_WINDOW_DROP)
+        self._window = None
+        if window_drop:
+            self._window = WindowDetector(
+                kwargs[const.CONF_WINDOW_SLOPE_PERIOD].total_seconds(), window_drop
+            )
+        self._window_preset = kwargs.get(const.CONF_WINDOW_PRESET)
+        self._window_timeout = kwargs.get(const.CONF_WINDOW_TIMEOUT)
+        self._window_hold_interval = kwargs.get(const.CONF_WINDOW_SLOPE_PERIOD) / 4
+        self._window_unsub = None
+        self._window_hold_unsub = None
+        # Preset to go back to when the window closes
+        self._window_saved_preset = None
+        # Time proportional control: each cycle turns the heater on for a share
+        # of tpi_cycle. None in the default hysteresis mode.
+        self._tpi_cycle = None
+        if kwargs.get(const.CONF_CONTROL_MODE) == CONTROL_TPI:
+            self._tpi_cycle = kwargs[const.CONF_TPI_CYCLE].total_seconds()
+        self._tpi_coef_int = kwargs.get(
+            const.CONF_TPI_COEF_INT, const.DEFAULT_TPI_COEF_INT
+        )
+        self._tpi_coef_ext = kwargs.get(
+            const.CONF_TPI_COEF_EXT, const.DEFAULT_TPI_COEF_EXT
+        )
+        self.outdoor_sensor_entity_id = kwargs.get(const.CONF_OUTDOOR_SENSOR)
+        # Next cycle start and the end of the on part of the cycle, also
+        # cancelled when Home Assistant stops
+        self._tpi_cycle_unsub = None
+        self._tpi_off_unsub = None
+        self._tpi_cycle_job = HassJob(
+            self._async_tpi_cycle, "tpi cycle", cancel_on_shutdown=True
+        )
+        self._tpi_off_job = HassJob(
+            self._async_tpi_off, "tpi off", cancel_on_shutdown=True
+        )
+        self._tpi_on_percent = None
+        # Heating and cooling rates learned from the readings, None while
+        # preheat is disabled
+        self._rates = None
+        self._rate_sampler = None
+        if kwargs.get(const.CONF_PREHEAT):
+            self._rates = RateModel()
+            self._rate_sampler = RateSampler()
+        # (preset, POSIX time) of set_preset_at, None if nothing is scheduled
+        self._scheduled_preset = None
+        # Hot path instrumentation, None while disabled
+        self._metrics = ThermostatMetrics() if kwargs.get("metrics") else None
+        self._min_temp = kwargs.get("min_temp")
+        self._max_temp = kwargs.get("max_temp")
+        self._target_temp = kwargs.get("target_temp")
+        self._saved_target_temp = kwargs.get("target_temp", None) or kwargs.get(
+            "away_temp", None
+        )
+        self._unit = kwargs.get("unit")
         self._support_flags = ClimateEntityFeature.TARGET_TEMPERATURE
         self._support_flags |= ClimateEntityFeature.TURN_ON
         self._support_flags |= ClimateEntityFeature.TURN_OFF
-        self._enable_turn_on_off_backwards_compatibility = False  # To be removed after deprecation period
+        self._enable_turn_on_off_backwards_compatibility = (
+            False  # To be removed after deprecation period
+        )
         self._preset_mode = PRESET_NONE
-        self._attr_preset_mode = 'none'
-        self._away_temp = kwargs.get('away_temp')
-        self._eco_temp = kwargs.get('eco_temp')
-        self._boost_temp = kwargs.get('boost_temp')
-        self._comfort_temp = kwargs.get('comfort_temp')
-        self._home_temp = kwargs.get('home_temp')
-        self._sleep_temp = kwargs.get('sleep_temp')
-        self._activity_temp = kwargs.get('activity_temp')
-        if True in [temp is not None for temp in [self._away_temp,
-                                                  self._eco_temp,
-                                                  self._boost_temp,
-                                                  self._comfort_temp,
-                                                  self._home_temp,
-                                                  self._sleep_temp,
-                                                  self._activity_temp]]:
+        self._async_set_presets(
+            PresetTable(
+                PRESET_NONE,
+                {
+                    mode: kwargs.get(mode + "_temp")
+                    for mode in PRESETS
+                    if kwargs.get(mode + "_temp") is not None
+                },
+            )
+        )
+        if self._presets.temps:
             self._support_flags |= ClimateEntityFeature.PRESET_MODE
         self._attr_hvac_modes = [HVACMode.HEAT, HVACMode.OFF]
-        self._attributes = {}
 
     async def async_added_to_hass(self):
         """Run when entity about to be added."""
@@ -213,35 +1217,96 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
         )
         self.async_on_remove(
             async_track_state_change_event(
-                self.hass, self.heater_entity_id, self._async_switch_changed
+                self.hass, self.heater_entity_ids, self._async_switch_changed
             )
         )
+        self.async_on_remove(self._async_cancel_min_cycle_timer)
 
-        if self._keep_alive:
+        for heater_entity_id in self.heater_entity_ids:
+            heater = self._heaters[heater_entity_id] = HeaterPipeline(
+                self.hass,
+                heater_entity_id,
+                self._heater_confirm_timeout.total_seconds(),
+                self._heater_retries,
+                self._async_heater_confirmed,
+                self._keep_alive.total_seconds() if self._keep_alive else None,
+            )
+            self.async_on_remove(heater.async_stop)
+        self.async_on_remove(self._async_cancel_stagger)
+        self.async_on_remove(
+            async_get_switch_coordinator(self.hass).async_add_window(
+                self._switch_batch_window
+            )
+        )
+        self.async_on_remove(self._async_cancel_deferred_write)
+        self.async_on_remove(self._async_cancel_held_reading)
+        self.async_on_remove(self._async_cancel_window_timer)
+        self.async_on_remove(self._async_cancel_tpi)
+        self.async_on_remove(
+            lambda: async_get_preheat_scheduler(self.hass).async_remove(self)
+        )
+
+        if self._runtime is not None:
             self.async_on_remove(
                 async_track_time_interval(
-                    self.hass, self._async_control_heating, self._keep_alive
+                    self.hass,
+                    self._async_runtime_tick,
+                    self._runtime_stats_interval,
+                    cancel_on_shutdown=True,
                 )
             )
 
-        @callback
-        def _async_startup(*_):
-            """Init on startup."""
-            sensor_state = self.hass.states.get(self._sensor_entity_id)
-            if sensor_state and sensor_state.state not in (
-                STATE_UNAVAILABLE,
-                STATE_UNKNOWN,
-            ):
-                self._async_update_temp(sensor_state)
-                self.async_write_ha_state()
+        # Targets of the bulk_set_presets service
+        thermostats = self.hass.data.setdefault(DOMAIN, {}).setdefault(
+            const.DATA_ENTITIES, {}
+        )
+        thermostats[self.entity_id] = self
+        entity_id = self.entity_id
+        self.async_on_remove(lambda: thermostats.pop(entity_id, None))
 
-        if self.hass.state == CoreState.running:
-            _async_startup()
-        else:
-            self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START, _async_startup)
+        if self._keep_alive:
+            self.async_on_remove(
+                async_get_keep_alive_scheduler(self.hass).async_add(
+                    self, self._keep_alive
+                )
+            )
+
+        # Restore data read for the whole platform entry, before the first state write
+        self._hydrator.async_hydrate(self)
+        self.async_on_remove(lambda: self._hydrator.async_remove(self))
+
+        # Prevent the device from keep running if HVACMode.OFF
+        if self._hvac_mode == HVACMode.OFF and self._is_device_active:
+            await self._async_heater_turn_off()
+            _LOGGER.warning(
+                "The climate mode is OFF, but the switch device is ON. Turning off device %s",
+                ", ".join(self.heater_entity_ids),
+            )
+
+    @callback
+    def _async_restore(self, old_state, stored_presets=None, extra_data=None):
+        """Restore the thermostat from its state of the previous run.
 
-        # Check If we have an old state
-        old_state = await self.async_get_last_state()
+        stored_presets is the entry of the thermostat in the PresetStore,
+        extra_data the extra_restore_state_data of the previous run.
+        """
+        if self._runtime is not None:
+            if extra_data and extra_data.get("runtime"):
+                self._runtime.restore(extra_data["runtime"])
+            # The heater snapshot was taken just before
+            self._runtime.update(time.time(), self._core.heater_on)
+            self._async_update_runtime_attributes()
+        if extra_data:
+            if self._rates is not None and extra_data.get("rates"):
+                self._rates.restore(extra_data["rates"])
+            if extra_data.get("scheduled_preset"):
+                preset_mode, at = extra_data["scheduled_preset"]
+                # Past due ones are applied at the first tick
+                self._async_schedule_preset(preset_mode, at)
+        if stored_presets is not None:
+            self._async_set_presets(self._presets.replace(stored_presets["temps"]))
+            if stored_presets.get("saved_target_temp") is not None:
+                self._saved_target_temp = stored_presets["saved_target_temp"]
         if old_state is not None:
             # If we have no initial temperature, restore
             if self._target_temp is None:
@@ -257,13 +1322,25 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
                     )
                 else:
                     self._target_temp = float(old_state.attributes[ATTR_TEMPERATURE])
-            if old_state.attributes.get(ATTR_PRESET_MODE) is not None:
-                self._attr_preset_mode = old_state.attributes.get(ATTR_PRESET_MODE)
+            if old_state.attributes.get(ATTR_PRESET_MODE) in self._presets:
+                self._preset_mode = old_state.attributes[ATTR_PRESET_MODE]
             if not self._hvac_mode and old_state.state:
                 self._hvac_mode = old_state.state
-            for x in self.preset_modes:
-                if old_state.attributes.get(x + "_temp") is not None:
-                     self._attributes[x + "_temp"] = old_state.attributes.get(x + "_temp")
+            if stored_presets is None:
+                # Preset temperatures used to be kept in the state attributes
+                presets = self._presets.replace(
+                    {
+                        mode: float(old_state.attributes[mode + "_temp"])
+                        for mode in self._presets.temps
+                        if old_state.attributes.get(mode + "_temp") is not None
+                    }
+                )
+                if presets is not self._presets:
+                    self._async_set_presets(presets)
+                    self._async_save_presets()
+            if self._preset_mode != PRESET_NONE:
+                # The restored preset decides the target
+                self._target_temp = self._presets.temps[self._preset_mode]
         else:
             # No previous state, try and restore defaults
             if self._target_temp is None:
@@ -279,13 +1356,18 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
         if not self._hvac_mode:
             self._hvac_mode = HVACMode.OFF
 
-        # Prevent the device from keep running if HVACMode.OFF
-        if self._hvac_mode == HVACMode.OFF and self._is_device_active:
-            await self._async_heater_turn_off()
-            _LOGGER.warning(
-                "The climate mode is OFF, but the switch device is ON. Turning off device %s",
-                self.heater_entity_id,
-            )
+    @callback
+    def _async_startup(self, sensor_state):
+        """Init on startup with the current state of the sensor.
+
+        Return True if the temperature was updated.
+        """
+        if sensor_state and sensor_state.state not in (
+            STATE_UNAVAILABLE,
+            STATE_UNKNOWN,
+        ):
+            return self._async_update_temp(sensor_state)
+        return False
 
     @property
     def should_poll(self):
@@ -300,13 +1382,152 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
     @property
     def extra_state_attributes(self):
         """Return the state attributes."""
-        return self._attributes
+        attributes = {
+            "suppressed_writes": self._suppressed_writes,
+            **self._runtime_attributes,
+        }
+        if self._window is not None:
+            attributes["window_open"] = self._window.is_open
+        if self._tpi_cycle is not None:
+            attributes["on_percent"] = self._tpi_on_percent
+        if self._rates is not None:
+            attributes["heating_rate"], attributes["cooling_rate"] = (
+                self._rounded_rates()
+            )
+        if self._scheduled_preset is not None:
+            preset_mode, at = self._scheduled_preset
+            attributes["scheduled_preset"] = preset_mode
+            attributes["scheduled_preset_at"] = dt_util.utc_from_timestamp(
+                at
+            ).isoformat()
+        return attributes
+
+    def _rounded_rates(self):
+        """Return the learned heating and cooling rates as shown, None while unknown."""
+        return tuple(
+            None if rate is None else round(rate, 2)
+            for rate in (self._rates.heating_rate, self._rates.cooling_rate)
+        )
+
+    @property
+    def extra_restore_state_data(self):
+        """Return the counters, learned rates and scheduled preset to keep across restarts."""
+        data = {}
+        if self._runtime is not None:
+            self._runtime.update(time.time())
+            data["runtime"] = self._runtime.as_dict()
+        if self._rates is not None:
+            data["rates"] = self._rates.as_dict()
+        if self._scheduled_preset is not None:
+            data["scheduled_preset"] = list(self._scheduled_preset)
+        return RestoredExtraData(data) if data else None
+
+    @callback
+    def _async_update_runtime_attributes(self):
+        total_on, cycles, hour_duty, day_duty = self._runtime.snapshot(time.time())
+        self._runtime_attributes = {
+            "heater_runtime_hours": round(total_on / 3600, 2),
+            "heater_cycles": cycles,
+            "duty_cycle_hour": round(hour_duty * 100, 1),
+            "duty_cycle_day": round(day_duty * 100, 1),
+        }
+
+    @callback
+    def _async_runtime_tick(self, _now):
+        self._async_update_runtime_attributes()
+        self._async_write_ha_state_if_changed()
+
+    @callback
+    def async_write_ha_state(self):
+        """Write the state to the state machine and remember what was written."""
+        self._last_fingerprint = self._state_fingerprint()
+        self._last_write = time.monotonic()
+        self._async_cancel_deferred_write()
+        self._async_record_history()
+        super().async_write_ha_state()
+
+    @callback
+    def _async_write_ha_state_if_changed(self):
+        """Write the state only if something observable changed.
+
+        With state_write_interval, a change of the temperature, of the
+        runtime attributes, of the TPI on_percent or of the learned rates alone
+        is written at most once per interval (the latest value, at the end of
+        the interval). Changes of the target, mode, action, preset or open
+        window are always written at once, see StateFingerprint.
+        """
+        fingerprint = self._state_fingerprint()
+        if fingerprint == self._last_fingerprint:
+            self._suppressed_writes += 1
+            # Not observable in the state, but still a sample of the history
+            self._async_record_history()
+            return
+        if (
+            self._state_write_interval
+            and self._last_fingerprint is not None
+            and fingerprint.same_immediate(self._last_fingerprint)
+        ):
+            delay = self._last_write + self._state_write_interval - time.monotonic()
+            if delay > 0:
+                self._suppressed_writes += 1
+                self._async_record_history()
+                if self._deferred_write_unsub is None:
+                    self._deferred_write_unsub = async_call_later(
+                        self.hass, delay, self._deferred_write_job
+                    )
+                return
+        self.async_write_ha_state()
+
+    @callback
+    def _async_deferred_write(self, _now):
+        self._deferred_write_unsub = None
+        if self._state_fingerprint() != self._last_fingerprint:
+            self.async_write_ha_state()
+
+    @callback
+    def _async_cancel_deferred_write(self):
+        if self._deferred_write_unsub is not None:
+            self._deferred_write_unsub()
+            self._deferred_write_unsub = None
+
+    @callback
+    def _async_record_history(self):
+        if self._history is not None:
+            self._history.add(
+                time.time(),
+                self._cur_temp,
+                self._target_temp,
+                bool(self._core.heater_on) and self._hvac_mode != HVACMode.OFF,
+            )
+
+    def _state_fingerprint(self):
+        """Return a StateFingerprint of what a state write would show."""
+        cur_temp = self._cur_temp
+        if cur_temp is not None:
+            # Changes below the displayed precision are not observable
+            cur_temp = round(cur_temp / self.precision)
+        return StateFingerprint(
+            target_temp=self._target_temp,
+            hvac_mode=self._hvac_mode,
+            hvac_action=self.hvac_action,
+            preset_mode=self._preset_mode,
+            window_open=self._window is not None and self._window.is_open,
+            cur_temp=cur_temp,
+            runtime_attributes=self._runtime_attributes,
+            on_percent=self._tpi_on_percent,
+            rates=self._rounded_rates() if self._rates is not None else None,
+        )
 
     @property
     def unique_id(self):
         """Return the unique id of this thermostat."""
         return self._unique_id
 
+    @property
+    def preset_key(self):
+        """Return the key of the thermostat in the PresetStore, stable across renames."""
+        return self._unique_id if self._unique_id is not None else self._name
+
     @property
     def precision(self):
         """Return the precision of the system."""
@@ -329,7 +1550,7 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
     @property
     def current_temperature(self):
         """Return the sensor temperature."""
-        return self._current_temp
+        return self._cur_temp
 
     @property
     def hvac_mode(self):
@@ -360,44 +1581,29 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
 
     @property
     def preset_mode(self):
-        return self._attr_preset_mode
+        return self._preset_mode
 
     @property
     def preset_modes(self):
-        preset_modes = [PRESET_NONE]
-        for mode, preset_mode_temp in self._preset_modes_temp.items():
-            if preset_mode_temp is not None:
-                preset_modes.append(mode)
-        return preset_modes
+        return self._preset_modes
+
+    @callback
+    def _async_set_presets(self, presets):
+        """Use a new preset table."""
+        self._presets = presets
+        # Read on every state write, so built once per table
+        self._preset_modes = list(presets.modes)
+
+    @callback
+    def _async_save_presets(self):
+        """Persist the preset table and the saved target with the next store write."""
+        self._preset_store.async_save(
+            self.preset_key, self._presets, self._saved_target_temp
+        )
 
-    @property
-    def _preset_modes_temp(self):
-        """Return a list of preset modes and their temperatures"""
-        return {
-            PRESET_AWAY: self._away_temp,
-            PRESET_ECO: self._eco_temp,
-            PRESET_BOOST: self._boost_temp,
-            PRESET_COMFORT: self._comfort_temp,
-            PRESET_HOME: self._home_temp,
-            PRESET_SLEEP: self._sleep_temp,
-            PRESET_ACTIVITY: self._activity_temp,
-        }
-    
-    @property
-    def _preset_temp_modes(self):
-        """Return a list of preset temperature and their modes"""
-        return {
-            self._away_temp: PRESET_AWAY,
-            self._eco_temp: PRESET_ECO,
-            self._boost_temp: PRESET_BOOST,
-            self._comfort_temp: PRESET_COMFORT,
-            self._home_temp: PRESET_HOME,
-            self._sleep_temp: PRESET_SLEEP,
-            self._activity_temp: PRESET_ACTIVITY,
-        }
-        
     async def async_set_hvac_mode(self, hvac_mode):
         """Set hvac mode."""
+        self._async_cancel_min_cycle_timer()
         if hvac_mode == HVACMode.HEAT:
             self._hvac_mode = HVACMode.HEAT
             await self._async_control_heating(force=True)
@@ -406,6 +1612,7 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
             await self._async_control_heating(force=True)
         elif hvac_mode == HVACMode.OFF:
             self._hvac_mode = HVACMode.OFF
+            self._async_cancel_tpi()
             if self._is_device_active:
                 await self._async_heater_turn_off()
         else:
@@ -419,9 +1626,13 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
         temperature = kwargs.get(ATTR_TEMPERATURE)
         if temperature is None:
             return
+        self._async_cancel_min_cycle_timer()
         self._target_temp = temperature
         if self._preset_mode != PRESET_NONE:
-            self._attributes[self._preset_mode + "_temp"] = self._target_temp
+            presets = self._presets.replace({self._preset_mode: self._target_temp})
+            if presets is not self._presets:
+                self._async_set_presets(presets)
+                self._async_save_presets()
         await self._async_control_heating(force=True)
         self.async_write_ha_state()
 
@@ -449,135 +1660,619 @@ class SimpleThermostatA(ClimateEntity, RestoreEntity):
         if new_state is None or new_state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
             return
 
-        self._async_update_temp(new_state)
+        if not self._async_update_temp(new_state):
+            return
+        if self._tpi_cycle is not None and self._tpi_cycle_unsub is not None:
+            # The reading is the input of the next cycle
+            self._async_write_ha_state_if_changed()
+            return
+        if self._metrics is not None:
+            self._metrics.sensor_event()
         await self._async_control_heating()
-        self.async_write_ha_state()
+        self._async_write_ha_state_if_changed()
 
     @callback
     def _async_switch_changed(self, event):
         """Handle heater switch state changes."""
         new_state = event.data.get("new_state")
+        core = self._core
+        snapshot = (core.heater_on, core.heater_last_changed)
+        if len(self.heater_entity_ids) == 1:
+            self._async_update_heater([new_state])
+        else:
+            self._async_update_heater(
+                [
+                    self.hass.states.get(entity_id)
+                    for entity_id in self.heater_entity_ids
+                ]
+            )
+        if (core.heater_on, core.heater_last_changed) != snapshot:
+            # The minimum cycle restarts from this change. Attribute only
+            # updates (power readings of smart plugs) keep the pending timer.
+            self._async_cancel_min_cycle_timer()
         if new_state is None:
             return
-        self.async_write_ha_state()
+        self._heaters[event.data["entity_id"]].async_confirm(new_state)
+        self._async_write_ha_state_if_changed()
+
+    @callback
+    def _async_update_heater(self, states):
+        """Update the heater snapshot with the latest states of the switches.
+
+        The zone is on while any of its heaters is on. Missing heaters are
+        ignored; the last change is the latest one among the heaters.
+        """
+        states = [state for state in states if state is not None]
+        if not states:
+            self._core.heater_on = None
+            self._core.heater_last_changed = None
+            return
+        heater_on = any(state.state == STATE_ON for state in states)
+        if self._runtime is not None:
+            self._runtime.update(time.time(), heater_on)
+        if self._rate_sampler is not None:
+            self._rate_sampler.heater(time.monotonic(), heater_on)
+        self._core.heater_on = heater_on
+        changes = [
+            state.last_changed.timestamp()
+            for state in states
+            if state.state in (STATE_ON, STATE_OFF)
+        ]
+        self._core.heater_last_changed = max(changes) if changes else None
 
     @callback
     def _async_update_temp(self, state):
-        """Update thermostat with latest state from sensor."""
+        """Update thermostat with latest state from sensor.
+
+        Return False when the reading is invalid or filtered out.
+        """
         try:
             cur_temp = float(state.state)
             if math.isnan(cur_temp) or math.isinf(cur_temp):
                 raise ValueError(f"Sensor has illegal state {state.state}")
-            self._cur_temp = cur_temp
         except ValueError as ex:
             _LOGGER.error("Unable to update from sensor: %s", ex)
+            return False
+        if self._window is not None:
+            # Raw readings: the slope is the filter of the detector
+            self._async_window_sample(cur_temp)
+        if self._rate_sampler is not None:
+            if self._window is not None and self._window.is_open:
+                # Not the usual behaviour of the room
+                self._rate_sampler.reset()
+            else:
+                sample = self._rate_sampler.reading(time.monotonic(), cur_temp)
+                if sample is not None:
+                    self._rates.update(*sample)
+        if self._sensor_filter is not None:
+            now = time.monotonic()
+            cur_temp = self._sensor_filter.add(cur_temp, now)
+            if cur_temp is None:
+                if (
+                    self._sensor_filter.held is not None
+                    and self._held_reading_unsub is None
+                ):
+                    # Delivered once sensor_min_interval ends
+                    self._held_reading_unsub = async_call_later(
+                        self.hass,
+                        self._sensor_filter.wait(now),
+                        self._async_release_held_reading,
+                    )
+                return False
+        self._cur_temp = cur_temp
+        return True
+
+    async def _async_release_held_reading(self, _now):
+        """Apply the last reading held back by sensor_min_interval."""
+        self._held_reading_unsub = None
+        cur_temp = self._sensor_filter.release(time.monotonic())
+        if cur_temp is None:
+            return
+        self._cur_temp = cur_temp
+        await self._async_control_heating()
+        self._async_write_ha_state_if_changed()
+
+    @callback
+    def _async_cancel_held_reading(self):
+        if self._held_reading_unsub is not None:
+            self._held_reading_unsub()
+            self._held_reading_unsub = None
 
     async def _async_control_heating(self, time=None, force=False):
         """Check if we need to turn heating on or off."""
-        async with self._temp_lock:
-            if not self._active and None not in (
+        # A pass never suspends: the heater commands are handed to the
+        # pipelines, so passes cannot interleave and need no lock
+        if self._metrics is not None:
+            self._metrics.pass_started()
+        await self._async_control_heating_pass(time, force)
+
+    async def _async_control_heating_pass(self, time, force):
+        """Run one control pass."""
+        if not self._active and None not in (
+            self._cur_temp,
+            self._target_temp,
+            self._is_device_active,
+        ):
+            self._active = True
+            _LOGGER.info(
+                "Obtained current and target temperature. "
+                "Generic thermostat active. %s, %s",
                 self._cur_temp,
                 self._target_temp,
-                self._is_device_active,
-            ):
-                self._active = True
+            )
+
+        if not self._active:
+            return
+
+        core = self._core
+        if self._window_suspended:
+            # Heating is suspended while the window is open
+            if core.heater_on:
                 _LOGGER.info(
-                    "Obtained current and target temperature. "
-                    "Generic thermostat active. %s, %s",
-                    self._cur_temp,
-                    self._target_temp,
+                    "Window open - Turning off heater %s", self.heater_entity_ids
                 )
+                await self._async_heater_turn_off()
+            return
 
-            if not self._active or self._hvac_mode == HVACMode.OFF:
-                return
+        if self._tpi_cycle is not None:
+            await self._async_tpi_pass(time, force)
+            return
 
-            # If the `force` argument is True, we
-            # ignore `min_cycle_duration`.
-            # If the `time` argument is not none, we were invoked for
-            # keep-alive purposes, and `min_cycle_duration` is irrelevant.
-            if not force and time is None and self.min_cycle_duration:
-                if self._is_device_active:
-                    current_state = STATE_ON
-                else:
-                    current_state = HVACMode.OFF
-                try:
-                    long_enough = condition.state(
-                        self.hass,
-                        self.heater_entity_id,
-                        current_state,
-                        self.min_cycle_duration,
-                    )
-                except ConditionError:
-                    long_enough = False
+        core.cur_temp = self._cur_temp
+        core.target_temp = self._target_temp
+        core.hvac_off = self._hvac_mode == HVACMode.OFF
+        # If the `force` argument is True, we
+        # ignore `min_cycle_duration`.
+        # If the `time` argument is not none, we were invoked for
+        # keep-alive purposes, and `min_cycle_duration` is irrelevant.
+        decision = decide(
+            core, dt_util.utcnow().timestamp(), force=force, keep_alive=time is not None
+        )
+        metrics = self._metrics
+        if metrics is not None:
+            metrics.decided()
+            if decision.wake_at is not None:
+                metrics.min_cycle_skips += 1
+            elif (
+                time is not None
+                and decision.action is not None
+                and ((decision.action == TURN_ON) == core.heater_on)
+            ):
+                metrics.keep_alive_redundant += 1
 
-                if not long_enough:
-                    return
+        if decision.wake_at is not None:
+            # Come back exactly when the heater may switch again
+            self._async_schedule_min_cycle_timer(
+                dt_util.utc_from_timestamp(decision.wake_at)
+            )
+        elif decision.action == TURN_ON:
+            if core.heater_on:
+                _LOGGER.info(
+                    "Keep-alive - Turning on heater heater %s", self.heater_entity_ids
+                )
+            else:
+                _LOGGER.info("Turning on heater %s", self.heater_entity_ids)
+            await self._async_heater_turn_on(resend=core.heater_on)
+        elif decision.action == TURN_OFF:
+            if core.heater_on:
+                _LOGGER.info("Turning off heater %s", self.heater_entity_ids)
+            else:
+                _LOGGER.info(
+                    "Keep-alive - Turning off heater %s", self.heater_entity_ids
+                )
+            await self._async_heater_turn_off(resend=not core.heater_on)
 
-            too_cold = self._target_temp >= self._cur_temp + self._cold_tolerance
-            too_hot = self._cur_temp >= self._target_temp + self._hot_tolerance
-            if self._is_device_active:
-                if (self.ac_mode and too_cold) or (not self.ac_mode and too_hot):
-                    _LOGGER.info("Turning off heater %s", self.heater_entity_id)
-                    await self._async_heater_turn_off()
-                elif time is not None:
-                    # The time argument is passed only in keep-alive case
-                    _LOGGER.info(
-                        "Keep-alive - Turning on heater heater %s",
-                        self.heater_entity_id,
-                    )
-                    await self._async_heater_turn_on()
+    @property
+    def _window_suspended(self):
+        """True while an open window suspends the heating."""
+        return (
+            self._window is not None
+            and self._window.is_open
+            and self._window_preset is None
+        )
+
+    async def _async_tpi_pass(self, time, force):
+        """Control pass of the TPI mode.
+
+        Keep-alive re-sends the current command; a forced pass (new target,
+        preset or mode) starts a new cycle; other triggers only start the first
+        cycle, later ones are driven by the cycle timers. No cycle runs while
+        the thermostat is off.
+        """
+        if self._hvac_mode == HVACMode.OFF:
+            self._async_cancel_tpi()
+            return
+        if time is not None:
+            if self._core.heater_on:
+                await self._async_heater_turn_on(resend=True)
             else:
-                if (self.ac_mode and too_hot) or (not self.ac_mode and too_cold):
-                    _LOGGER.info("Turning on heater %s", self.heater_entity_id)
-                    await self._async_heater_turn_on()
-                elif time is not None:
-                    # The time argument is passed only in keep-alive case
-                    _LOGGER.info(
-                        "Keep-alive - Turning off heater %s", self.heater_entity_id
+                await self._async_heater_turn_off(resend=True)
+            return
+        if force or self._tpi_cycle_unsub is None:
+            self._async_cancel_tpi()
+            core = self._core
+            now = dt_util.utcnow().timestamp()
+            if core.min_cycle and core.heater_last_changed is not None:
+                delay = core.heater_last_changed + core.min_cycle - now
+                if delay > 0:
+                    # The new cycle could switch the heater before the minimum cycle ends
+                    self._tpi_cycle_unsub = async_call_later(
+                        self.hass, delay, self._tpi_cycle_job
                     )
-                    await self._async_heater_turn_off()
+                    return
+            await self._async_tpi_cycle()
+
+    async def _async_tpi_cycle(self, _now=None):
+        """Start a TPI cycle: turn the heater on now and off after its share of the cycle."""
+        self._async_cancel_tpi()
+        cycle = self._tpi_cycle
+        self._tpi_cycle_unsub = async_call_later(self.hass, cycle, self._tpi_cycle_job)
+        core = self._core
+        core.cur_temp = self._cur_temp
+        core.target_temp = self._target_temp
+        core.hvac_off = self._hvac_mode == HVACMode.OFF or self._window_suspended
+        fraction, on_time = tpi_on_time(
+            core, cycle, self._tpi_coef_int, self._tpi_coef_ext, self._outdoor_temp()
+        )
+        self._tpi_on_percent = round(fraction * 100)
+        if on_time > 0:
+            if on_time < cycle:
+                self._tpi_off_unsub = async_call_later(
+                    self.hass, on_time, self._tpi_off_job
+                )
+            if not core.heater_on:
+                _LOGGER.info(
+                    "Turning on heater %s for %d s", self.heater_entity_ids, on_time
+                )
+                await self._async_heater_turn_on()
+        elif core.heater_on:
+            _LOGGER.info("Turning off heater %s", self.heater_entity_ids)
+            await self._async_heater_turn_off()
+        self._async_write_ha_state_if_changed()
+
+    async def _async_tpi_off(self, _now):
+        self._tpi_off_unsub = None
+        if self._core.heater_on:
+            _LOGGER.info("Turning off heater %s", self.heater_entity_ids)
+            await self._async_heater_turn_off()
+
+    @callback
+    def _async_cancel_tpi(self):
+        if self._tpi_cycle_unsub is not None:
+            self._tpi_cycle_unsub()
+            self._tpi_cycle_unsub = None
+        if self._tpi_off_unsub is not None:
+            self._tpi_off_unsub()
+            self._tpi_off_unsub = None
+
+    def _outdoor_temp(self):
+        """Return the reading of the outdoor sensor, None if unknown."""
+        if self.outdoor_sensor_entity_id is None:
+            return None
+        state = self.hass.states.get(self.outdoor_sensor_entity_id)
+        if state is None:
+            return None
+        try:
+            temp = float(state.state)
+        except ValueError:
+            return None
+        return None if math.isnan(temp) or math.isinf(temp) else temp
+
+    @callback
+    def _async_window_sample(self, temp):
+        """Feed the open window detector, and open or close the window."""
+        if self._window.add(time.monotonic(), temp):
+            self._async_window_toggled()
+
+    @callback
+    def _async_window_hold(self, _now):
+        """Check the slope while the window is open, even without new readings."""
+        if self._window.hold(time.monotonic()):
+            self._async_window_toggled()
+
+    @callback
+    def _async_window_toggled(self):
+        if self._window.is_open:
+            _LOGGER.info(
+                "%s: window open, temperature falling %.1f/h",
+                self.entity_id,
+                -self._window.slope(),
+            )
+            self._async_window_open()
+        else:
+            _LOGGER.info("%s: window closed, temperature recovered", self.entity_id)
+            self._async_window_close()
+        self.hass.async_create_task(self._async_window_changed())
+
+    @callback
+    def _async_window_open(self):
+        self._async_cancel_window_timer()
+        self._window_unsub = async_call_later(
+            self.hass, self._window_timeout, self._async_window_timed_out
+        )
+        self._window_hold_unsub = async_track_time_interval(
+            self.hass, self._async_window_hold, self._window_hold_interval
+        )
+        if self._window_preset is not None and self._preset_mode != self._window_preset:
+            preset_mode = self._preset_mode
+            if self._async_apply_preset_mode(self._window_preset):
+                self._window_saved_preset = preset_mode
+
+    @callback
+    def _async_window_close(self):
+        self._async_cancel_window_timer()
+        # Unless the preset was changed in the meantime
+        if (
+            self._window_saved_preset is not None
+            and self._preset_mode == self._window_preset
+        ):
+            self._async_apply_preset_mode(self._window_saved_preset)
+        self._window_saved_preset = None
+
+    async def _async_window_changed(self):
+        await self._async_control_heating(force=True)
+        self._async_write_ha_state_if_changed()
+
+    async def _async_window_timed_out(self, _now):
+        """Resume after window_timeout, even if the temperature is still falling."""
+        self._window_unsub = None
+        _LOGGER.info("%s: window open for too long, resuming", self.entity_id)
+        self._window.reset()
+        self._async_window_close()
+        await self._async_window_changed()
+
+    @callback
+    def _async_cancel_window_timer(self):
+        if self._window_unsub is not None:
+            self._window_unsub()
+            self._window_unsub = None
+        if self._window_hold_unsub is not None:
+            self._window_hold_unsub()
+            self._window_hold_unsub = None
+
+    @callback
+    def _async_schedule_min_cycle_timer(self, when):
+        """Re-evaluate the thermostat once the minimum cycle ends."""
+        if self._min_cycle_unsub is not None:
+            if self._min_cycle_end == when:
+                return
+            self._min_cycle_unsub()
+        self._min_cycle_end = when
+        self._min_cycle_unsub = async_track_point_in_utc_time(
+            self.hass, self._async_min_cycle_elapsed, when
+        )
+
+    @callback
+    def _async_cancel_min_cycle_timer(self):
+        """Drop the pending end of minimum cycle re-evaluation, if any."""
+        if self._min_cycle_unsub is not None:
+            self._min_cycle_unsub()
+            self._min_cycle_unsub = None
+            self._min_cycle_end = None
+
+    async def _async_min_cycle_elapsed(self, now):
+        """Handle the end of the minimum cycle."""
+        self._min_cycle_unsub = None
+        self._min_cycle_end = None
+        await self._async_control_heating()
+        self._async_write_ha_state_if_changed()
 
     @property
     def _is_device_active(self):
         """If the toggleable device is currently active."""
-        if not self.hass.states.get(self.heater_entity_id):
-            return None
-
-        return self.hass.states.is_state(self.heater_entity_id, STATE_ON)
+        return self._core.heater_on
 
     @property
     def supported_features(self):
         """Return the list of supported features."""
         return self._support_flags
 
-    async def _async_heater_turn_on(self):
+    async def _async_heater_turn_on(self, resend=False):
         """Turn heater toggleable device on."""
-        data = {ATTR_ENTITY_ID: self.heater_entity_id}
-        await self.hass.services.async_call(
-            HA_DOMAIN, SERVICE_TURN_ON, data, context=self._context
-        )
+        # Delivered by the pipelines, the control pass does not wait for them.
+        # Requests of the same loop iteration are sent as one call by the
+        # SwitchCoordinator. resend is used by keep-alive, for devices that
+        # need to hear the command again even though their switch shows it;
+        # the pipelines skip it right after a confirmed switch.
+        delay = 0
+        for entity_id, heater in self._heaters.items():
+            if entity_id in self._stagger_unsubs:
+                continue
+            state = self.hass.states.get(entity_id)
+            if not self._heater_stagger or (
+                state is not None and state.state == STATE_ON
+            ):
+                heater.async_request(SERVICE_TURN_ON, resend, self._context)
+            elif not delay:
+                heater.async_request(SERVICE_TURN_ON, resend, self._context)
+                delay = self._heater_stagger
+            else:
+                # Start the next heaters one by one against inrush current
+                self._stagger_unsubs[entity_id] = async_call_later(
+                    self.hass,
+                    delay,
+                    self._async_staggered_start(entity_id, self._context),
+                )
+                delay += self._heater_stagger
 
-    async def _async_heater_turn_off(self):
+    async def _async_heater_turn_off(self, resend=False):
         # Turn heater toggleable device off
-        data = {ATTR_ENTITY_ID: self.heater_entity_id}
-        await self.hass.services.async_call(
-            HA_DOMAIN, SERVICE_TURN_OFF, data, context=self._context
-        )
+        self._async_cancel_stagger()
+        for heater in self._heaters.values():
+            heater.async_request(SERVICE_TURN_OFF, resend, self._context)
+
+    def _async_staggered_start(self, entity_id, context):
+        @callback
+        def _async_start(_now):
+            del self._stagger_unsubs[entity_id]
+            self._heaters[entity_id].async_request(SERVICE_TURN_ON, context=context)
+
+        return _async_start
+
+    @callback
+    def _async_cancel_stagger(self):
+        for unsub in self._stagger_unsubs.values():
+            unsub()
+        self._stagger_unsubs.clear()
+
+    @callback
+    def _async_heater_confirmed(self, elapsed):
+        if self._metrics is not None:
+            self._metrics.heater_confirm.add(elapsed)
 
     async def async_set_preset_mode(self, preset_mode: str):
         # Set new preset mode.
-        # Test if Preset mode is valid
-        if not preset_mode in self.preset_modes:
+        if not self._async_apply_preset_mode(preset_mode):
             return
-        # if old value is preset_none we store the temp
-        if self._preset_mode == PRESET_NONE:
-            self._saved_target_temp = self._target_temp
+        await self._async_control_heating(force=True)
+        self.async_write_ha_state()
+
+    async def async_set_preset_temp(self, **kwargs):
+        """Set the temperatures of the presets."""
+        temps = {
+            mode: kwargs[mode + "_temp"]
+            for mode in PRESETS
+            if kwargs.get(mode + "_temp") is not None
+        }
+        if self._async_apply_preset_temps(temps):
+            await self._async_control_heating(force=True)
+            self.async_write_ha_state()
+
+    @callback
+    def _async_apply_preset_mode(self, preset_mode):
+        """Switch to preset_mode. Return False if it is not a preset of this thermostat."""
+        temps = select_preset(
+            self._presets,
+            self._preset_mode,
+            preset_mode,
+            self._target_temp,
+            self._saved_target_temp,
+        )
+        if temps is None:
+            return False
+        self._async_cancel_min_cycle_timer()
         self._preset_mode = preset_mode
-        # let's deal with the new value
+        self._target_temp, saved_target_temp = temps
+        if saved_target_temp != self._saved_target_temp:
+            self._saved_target_temp = saved_target_temp
+            self._async_save_presets()
+        return True
+
+    @callback
+    def _async_apply_preset_temps(self, temps):
+        """Set the temperatures of the presets in temps. Return True if the target changed."""
+        presets = self._presets.replace(temps)
+        if presets is self._presets:
+            return False
+        self._async_set_presets(presets)
+        self._async_save_presets()
         if self._preset_mode == PRESET_NONE:
-            self._target_temp = self._saved_target_temp
+            return False
+        target_temp = presets.temps[self._preset_mode]
+        if target_temp == self._target_temp:
+            return False
+        self._async_cancel_min_cycle_timer()
+        self._target_temp = target_temp
+        return True
+
+    async def async_set_metrics(self, enabled):
+        """Enable or disable the hot path metrics, dropping those recorded."""
+        if not enabled:
+            self._metrics = None
+        elif self._metrics is None:
+            self._metrics = ThermostatMetrics()
+
+    async def async_dump_metrics(self, reset=False):
+        """Return the hot path metrics."""
+        heater_commands = {}
+        for heater in self._heaters.values():
+            for name, count in heater.stats.items():
+                heater_commands[name] = heater_commands.get(name, 0) + count
+        metrics = self._metrics
+        if metrics is None:
+            return {"enabled": False, "heater_commands": heater_commands}
+        if reset:
+            self._metrics = ThermostatMetrics()
+        return {
+            "enabled": True,
+            **metrics.as_dict(),
+            "heater_commands": heater_commands,
+        }
+
+    async def async_set_preset_at(self, preset_mode, at):
+        """Switch to preset_mode so that its target is reached at `at`.
+
+        With preheat, the switch happens as early as the learned rates say is
+        needed; otherwise, or until the rates are learned, at `at`.
+        """
+        if preset_mode not in self._presets:
+            _LOGGER.error("%s: unknown preset %s", self.entity_id, preset_mode)
+            return
+        self._async_schedule_preset(preset_mode, dt_util.as_utc(at).timestamp())
+        self.async_write_ha_state()
+
+    @callback
+    def _async_schedule_preset(self, preset_mode, at):
+        self._scheduled_preset = (preset_mode, at)
+        async_get_preheat_scheduler(self.hass).async_add(self)
+
+    def _preheat_due(self, now):
+        """Return True if the scheduled preset should be applied at `now`."""
+        preset_mode, at = self._scheduled_preset
+        if now >= at:
+            return True
+        if (
+            self._rates is None
+            or self._cur_temp is None
+            or self._hvac_mode == HVACMode.OFF
+            or preset_mode not in self._presets
+        ):
+            return False
+        if preset_mode == self._presets.modes[0]:
+            target = self._saved_target_temp
         else:
-            temp = self._attributes.get(self._preset_mode + "_temp", self._target_temp)
-            self._target_temp = float(temp)
-        await self._async_control_heating(force=True)
+            target = self._presets.temps[preset_mode]
+        if target is None:
+            return False
+        # The heater on towards the target, or off coasting to it
+        if self.ac_mode:
+            on = 1 if target < self._cur_temp else 0
+        else:
+            on = 1 if target > self._cur_temp else 0
+        lead = self._rates.time_to_reach(self._cur_temp, target, on)
+        if lead is None:
+            return False
+        return now >= at - min(lead, const.PREHEAT_MAX_LEAD)
+
+    async def _async_run_scheduled_preset(self):
+        preset_mode, _at = self._scheduled_preset
+        self._scheduled_preset = None
+        async_get_preheat_scheduler(self.hass).async_remove(self)
+        _LOGGER.info(
+            "%s: switching to the scheduled preset %s", self.entity_id, preset_mode
+        )
+        if preset_mode != self._preset_mode and self._async_apply_preset_mode(
+            preset_mode
+        ):
+            await self._async_control_heating(force=True)
         self.async_write_ha_state()
+
+    async def async_query_history(self, duration, buckets, end=None):
+        """Return the recent history, downsampled, without going through the recorder."""
+        if self._history is None:
+            return {"enabled": False}
+        now = time.time()
+        end = now if end is None else min(dt_util.as_utc(end).timestamp(), now)
+        start = end - duration.total_seconds()
+        if self._history_retention is not None:
+            start = max(start, now - self._history_retention.total_seconds())
+        if start >= end:
+            return {"enabled": True, "samples": len(self._history)}
+        return {
+            "enabled": True,
+            "samples": len(self._history),
+            "start": dt_util.utc_from_timestamp(start).isoformat(),
+            "end": dt_util.utc_from_timestamp(end).isoformat(),
+            "step": (end - start) / buckets,
+            **self._history.window(start, end, buckets),
+        }
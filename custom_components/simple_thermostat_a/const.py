@@ -7,7 +7,7 @@ CONF_AC_MODE = "ac_mode"
 CONF_MAX_TEMP = "max_temp"
 CONF_MIN_CYCLE_DURATION = "min_cycle_duration"
 CONF_MIN_TEMP = "min_temp"
-DEFAULT_MIN_CYCLE_DURATION = '00:00:00'
+DEFAULT_MIN_CYCLE_DURATION = "00:00:00"
 DEFAULT_NAME = "Simple Thermostat A"
 CONF_HOT_TOLERANCE = "hot_tolerance"
 DEFAULT_TOLERANCE = 0.3
@@ -24,3 +24,58 @@ CONF_COMFORT_TEMP = "comfort_temp"
 CONF_HOME_TEMP = "home_temp"
 CONF_SLEEP_TEMP = "sleep_temp"
 CONF_ACTIVITY_TEMP = "activity_temp"
+CONF_SWITCH_BATCH_WINDOW = "switch_batch_window"
+DEFAULT_SWITCH_BATCH_WINDOW = 0
+DATA_SWITCH_COORDINATOR = "switch_coordinator"
+CONF_SENSOR_FILTER = "sensor_filter"
+CONF_SENSOR_EMA_ALPHA = "sensor_ema_alpha"
+DEFAULT_SENSOR_EMA_ALPHA = 0.3
+CONF_SENSOR_MEDIAN_WINDOW = "sensor_median_window"
+DEFAULT_SENSOR_MEDIAN_WINDOW = 5
+CONF_SENSOR_MIN_INTERVAL = "sensor_min_interval"
+CONF_SENSOR_DEADBAND = "sensor_deadband"
+DATA_KEEP_ALIVE_SCHEDULER = "keep_alive_scheduler"
+CONF_THERMOSTATS = "thermostats"
+DATA_SERVICES_REGISTERED = "services_registered"
+SERVICE_SET_PRESET_TEMP = "set_preset_temp"
+DEFAULT_UNIQUE_ID = "none"
+CONF_METRICS = "metrics"
+SERVICE_SET_METRICS = "set_metrics"
+SERVICE_DUMP_METRICS = "dump_metrics"
+CONF_HEATER_CONFIRM_TIMEOUT = "heater_confirm_timeout"
+DEFAULT_HEATER_CONFIRM_TIMEOUT = 10
+CONF_HEATER_RETRIES = "heater_retries"
+DEFAULT_HEATER_RETRIES = 3
+DATA_PRESET_STORE = "preset_store"
+PRESET_STORAGE_KEY = f"{DOMAIN}.presets"
+PRESET_STORAGE_VERSION = 1
+PRESET_SAVE_DELAY = 5
+DATA_ENTITIES = "entities"
+SERVICE_BULK_SET_PRESETS = "bulk_set_presets"
+CONF_HISTORY_SIZE = "history_size"
+CONF_HISTORY_RETENTION = "history_retention"
+SERVICE_QUERY_HISTORY = "query_history"
+CONF_RUNTIME_STATS = "runtime_stats"
+CONF_RUNTIME_STATS_INTERVAL = "runtime_stats_interval"
+DEFAULT_RUNTIME_STATS_INTERVAL = "00:05:00"
+CONF_HEATER_STAGGER = "heater_stagger"
+CONF_STATE_WRITE_INTERVAL = "state_write_interval"
+CONF_WINDOW_DROP = "window_drop"
+CONF_WINDOW_SLOPE_PERIOD = "window_slope_period"
+DEFAULT_WINDOW_SLOPE_PERIOD = "00:10:00"
+CONF_WINDOW_PRESET = "window_preset"
+CONF_WINDOW_TIMEOUT = "window_timeout"
+DEFAULT_WINDOW_TIMEOUT = "00:30:00"
+CONF_CONTROL_MODE = "control_mode"
+CONF_TPI_CYCLE = "tpi_cycle"
+DEFAULT_TPI_CYCLE = "00:10:00"
+CONF_TPI_COEF_INT = "tpi_coef_int"
+DEFAULT_TPI_COEF_INT = 0.6
+CONF_TPI_COEF_EXT = "tpi_coef_ext"
+DEFAULT_TPI_COEF_EXT = 0.01
+CONF_OUTDOOR_SENSOR = "outdoor_sensor"
+CONF_PREHEAT = "preheat"
+SERVICE_SET_PRESET_AT = "set_preset_at"
+DATA_PREHEAT_SCHEDULER = "preheat_scheduler"
+# Earliest start of a scheduled preset, whatever the learned rates
+PREHEAT_MAX_LEAD = 6 * 3600
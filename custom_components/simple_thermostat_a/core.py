@@ -0,0 +1,136 @@
+# Decision core of Simple Thermostat A.
+# Plain Python without Home Assistant imports: the entity in climate.py is an
+# adapter around it, and offline tools can drive it directly.
+
+from typing import NamedTuple
+
+TURN_ON = "turn_on"
+TURN_OFF = "turn_off"
+
+CONTROL_HYSTERESIS = "hysteresis"
+CONTROL_TPI = "tpi"
+CONTROL_MODES = [CONTROL_HYSTERESIS, CONTROL_TPI]
+
+
+class ThermostatState:
+    """Inputs of a control decision.
+
+    Times are POSIX timestamps in seconds, durations are seconds.
+    """
+
+    __slots__ = (
+        "cur_temp",
+        "target_temp",
+        "hvac_off",
+        "ac_mode",
+        "cold_tolerance",
+        "hot_tolerance",
+        "min_cycle",
+        "heater_on",
+        "heater_last_changed",
+    )
+
+    def __init__(
+        self, ac_mode=False, cold_tolerance=0.3, hot_tolerance=0.3, min_cycle=0
+    ):
+        self.cur_temp = None
+        self.target_temp = None
+        self.hvac_off = True
+        self.ac_mode = ac_mode
+        self.cold_tolerance = cold_tolerance
+        self.hot_tolerance = hot_tolerance
+        self.min_cycle = min_cycle
+        # None while the heater does not exist
+        self.heater_on = None
+        # None unless the heater is plainly on or off
+        self.heater_last_changed = None
+
+
+class Decision(NamedTuple):
+    """What to do with the heater and when to evaluate again."""
+
+    # TURN_ON, TURN_OFF or None
+    action: str = None
+    # Timestamp of the end of a blocking minimum cycle, or None
+    wake_at: float = None
+
+
+NO_DECISION = Decision()
+
+
+def decide(state, now, force=False, keep_alive=False):
+    """Decide what to do with the heater at `now`.
+
+    `force` ignores min_cycle. `keep_alive` also ignores it and re-sends the
+    current command when no switch is needed.
+    """
+    if state.hvac_off or state.cur_temp is None or state.target_temp is None:
+        return NO_DECISION
+    heater_on = state.heater_on
+    too_cold = state.target_temp >= state.cur_temp + state.cold_tolerance
+    too_hot = state.cur_temp >= state.target_temp + state.hot_tolerance
+    if heater_on:
+        need_switch = too_cold if state.ac_mode else too_hot
+    else:
+        need_switch = too_hot if state.ac_mode else too_cold
+
+    if need_switch and not force and not keep_alive and state.min_cycle:
+        if state.heater_last_changed is None:
+            # The heater is neither on nor off, the cycle cannot be checked
+            return NO_DECISION
+        cycle_end = state.heater_last_changed + state.min_cycle
+        if now < cycle_end:
+            return Decision(None, cycle_end)
+
+    if heater_on:
+        if need_switch:
+            return Decision(TURN_OFF)
+        if keep_alive:
+            return Decision(TURN_ON)
+    else:
+        if need_switch:
+            return Decision(TURN_ON)
+        if keep_alive:
+            return Decision(TURN_OFF)
+    return NO_DECISION
+
+
+def tpi_on_time(state, cycle, coef_int, coef_ext=0.0, outdoor_temp=None):
+    """Return (on fraction, on seconds) of the heater for a TPI cycle of `cycle` seconds.
+
+    The fraction is coef_int per degree from the target, plus coef_ext per
+    degree between the target and outdoor_temp when known. Pulses shorter than
+    min_cycle, on or off, are rounded to none or to min_cycle.
+    """
+    if state.hvac_off or state.cur_temp is None or state.target_temp is None:
+        return 0.0, 0.0
+    sign = -1 if state.ac_mode else 1
+    fraction = coef_int * sign * (state.target_temp - state.cur_temp)
+    if outdoor_temp is not None:
+        fraction += coef_ext * sign * (state.target_temp - outdoor_temp)
+    fraction = min(1.0, max(0.0, fraction))
+    on_time = fraction * cycle
+    min_cycle = min(state.min_cycle, cycle)
+    if min_cycle:
+        if 0 < on_time < min_cycle:
+            on_time = 0.0 if on_time < min_cycle / 2 else min_cycle
+        off_time = cycle - on_time
+        if 0 < off_time < min_cycle:
+            on_time = cycle if off_time < min_cycle / 2 else cycle - min_cycle
+    return fraction, on_time
+
+
+def select_preset(presets, current_mode, new_mode, target_temp, saved_target_temp):
+    """Return the (target, saved target) after switching to the preset new_mode.
+
+    presets is a PresetTable. Return None if new_mode is not one of its presets.
+    The target of the "none" preset is saved while another preset is active.
+    """
+    if new_mode not in presets:
+        return None
+    none_mode = presets.modes[0]
+    if current_mode == none_mode:
+        saved_target_temp = target_temp
+    if new_mode == none_mode:
+        return saved_target_temp, saved_target_temp
+    return presets.temps[new_mode], saved_target_temp
@@ -0,0 +1,145 @@
+# In-memory history of Simple Thermostat A.
+# A fixed-size ring buffer of typed arrays per thermostat, with running sums
+# kept next to the samples, so the mean temperature and the heating duty of a
+# time window are read from two samples instead of summing the window.
+
+from array import array
+from math import isnan
+
+NAN = float("nan")
+
+
+class HistoryBuffer:
+    """Last `size` samples of a thermostat: time, temperature, target, heating."""
+
+    __slots__ = (
+        "size",
+        "_times",
+        "_temps",
+        "_targets",
+        "_heating",
+        "_temp_sums",
+        "_temp_counts",
+        "_on_seconds",
+        "_start",
+        "_count",
+        "_temp_sum",
+        "_temp_count",
+        "_on_total",
+    )
+
+    def __init__(self, size):
+        self.size = size
+        # Timestamps in seconds; temperatures as float32, NaN when unknown
+        self._times = array("d", bytes(8 * size))
+        self._temps = array("f", bytes(4 * size))
+        self._targets = array("f", bytes(4 * size))
+        self._heating = array("b", bytes(size))
+        # Running totals up to (excluding) each sample
+        self._temp_sums = array("d", bytes(8 * size))
+        self._temp_counts = array("l", bytes(array("l").itemsize * size))
+        self._on_seconds = array("d", bytes(8 * size))
+        self._start = 0
+        self._count = 0
+        self._temp_sum = 0.0
+        self._temp_count = 0
+        self._on_total = 0.0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, now, temp, target, heating):
+        """Record the state at `now` (seconds), overwriting the oldest sample when full."""
+        if self._count:
+            last = self._index(self._count - 1)
+            if self._heating[last]:
+                self._on_total += now - self._times[last]
+        if self._count == self.size:
+            index = self._start
+            self._start = (self._start + 1) % self.size
+        else:
+            index = self._index(self._count)
+            self._count += 1
+        self._times[index] = now
+        self._temps[index] = NAN if temp is None else temp
+        self._targets[index] = NAN if target is None else target
+        self._heating[index] = heating
+        self._temp_sums[index] = self._temp_sum
+        self._temp_counts[index] = self._temp_count
+        self._on_seconds[index] = self._on_total
+        if temp is not None:
+            self._temp_sum += temp
+            self._temp_count += 1
+
+    def window(self, start, end, buckets):
+        """Downsample [start, end) into `buckets` equal buckets.
+
+        Return a dict of lists, one value per bucket: mean temperature,
+        target at the end of the bucket and heating duty (0 to 1), None where
+        the buffer has no data. Every bucket costs two binary searches.
+        """
+        step = (end - start) / buckets
+        temperature = []
+        target = []
+        duty = []
+        low = self._search(start)
+        low_on = self._on_at(start, low)
+        for bucket in range(buckets):
+            bucket_end = start + (bucket + 1) * step
+            high = self._search(bucket_end)
+            high_on = self._on_at(bucket_end, high)
+            temperature.append(self._mean(low, high))
+            if high:
+                value = self._targets[self._index(high - 1)]
+                target.append(None if isnan(value) else round(value, 2))
+            else:
+                target.append(None)
+            # Time covered by the buffer within the bucket
+            covered = 0.0
+            if self._count:
+                first = self._times[self._start]
+                covered = bucket_end - max(bucket_end - step, first)
+            duty.append(round((high_on - low_on) / covered, 3) if covered > 0 else None)
+            low, low_on = high, high_on
+        return {"temperature": temperature, "target": target, "duty": duty}
+
+    def _index(self, position):
+        return (self._start + position) % self.size
+
+    def _search(self, when):
+        """Return the position of the first sample at or after `when`."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._times[self._index(middle)] < when:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _totals(self, position):
+        """Return the running temperature sum and count before the sample at position."""
+        if position == self._count:
+            return self._temp_sum, self._temp_count
+        index = self._index(position)
+        return self._temp_sums[index], self._temp_counts[index]
+
+    def _mean(self, low, high):
+        if high <= low:
+            return None
+        low_sum, low_count = self._totals(low)
+        high_sum, high_count = self._totals(high)
+        if high_count == low_count:
+            return None
+        return round((high_sum - low_sum) / (high_count - low_count), 2)
+
+    def _on_at(self, when, position):
+        """Return the heating seconds accumulated at `when`; position is _search(when)."""
+        if position == 0:
+            # Before the first sample, nothing is known
+            return self._on_seconds[self._start] if self._count else 0.0
+        index = self._index(position - 1)
+        on_seconds = self._on_seconds[index]
+        if self._heating[index]:
+            on_seconds += when - self._times[index]
+        return on_seconds
@@ -0,0 +1,163 @@
+# Heating and cooling rates of a room, learned online by Simple Thermostat A.
+# Readings and heater changes are turned into samples of the rate of change of
+# the temperature, fitted by a two parameter recursive least squares: each
+# sample and each prediction costs a fixed handful of multiplications.
+
+HOUR = 3600
+# Initial covariance: no confidence in the initial rates
+INITIAL_COVARIANCE = 100.0
+# Samples needed, with the heater mostly on and mostly off, before the rates are used
+MIN_SAMPLES = 3
+
+
+class RateModel:
+    """rate = heat * on + drift, in degrees per hour.
+
+    on is the fraction of the sample with the heater on. drift is the passive
+    rate (negative when the room cools down), heat the gain of the heater.
+    A forgetting factor lets the model follow the seasons.
+    """
+
+    __slots__ = ("forgetting", "heat", "drift", "_p", "on_samples", "off_samples")
+
+    def __init__(self, forgetting=0.98):
+        self.forgetting = forgetting
+        self.heat = 0.0
+        self.drift = 0.0
+        # Covariance, symmetric: p00, p01, p11
+        self._p = [INITIAL_COVARIANCE, 0.0, INITIAL_COVARIANCE]
+        self.on_samples = 0
+        self.off_samples = 0
+
+    def update(self, on, rate):
+        """Fit the sample (heater on fraction, rate in degrees per hour)."""
+        p00, p01, p11 = self._p
+        # P x with x = (on, 1)
+        px0 = p00 * on + p01
+        px1 = p01 * on + p11
+        denominator = self.forgetting + on * px0 + px1
+        k0 = px0 / denominator
+        k1 = px1 / denominator
+        error = rate - (self.heat * on + self.drift)
+        self.heat += k0 * error
+        self.drift += k1 * error
+        # P = (P - k (P x)^T) / forgetting
+        self._p = [
+            (p00 - k0 * px0) / self.forgetting,
+            (p01 - k0 * px1) / self.forgetting,
+            (p11 - k1 * px1) / self.forgetting,
+        ]
+        if on >= 0.5:
+            self.on_samples += 1
+        else:
+            self.off_samples += 1
+
+    @property
+    def ready(self):
+        return self.on_samples >= MIN_SAMPLES and self.off_samples >= MIN_SAMPLES
+
+    @property
+    def heating_rate(self):
+        """Degrees per hour with the heater on, None until learned."""
+        return self.heat + self.drift if self.ready else None
+
+    @property
+    def cooling_rate(self):
+        """Degrees per hour lost with the heater off, None until learned."""
+        return -self.drift if self.ready else None
+
+    def time_to_reach(self, temp, target, on):
+        """Return the seconds to go from temp to target, the heater on (1) or off (0).
+
+        0 if already there, None if unknown or never reached that way.
+        """
+        gap = target - temp
+        if gap == 0:
+            return 0.0
+        if not self.ready:
+            return None
+        rate = self.heat * on + self.drift
+        if rate == 0 or (rate > 0) != (gap > 0):
+            return None
+        return gap / rate * HOUR
+
+    def as_dict(self):
+        return {
+            "heat": self.heat,
+            "drift": self.drift,
+            "p": list(self._p),
+            "on_samples": self.on_samples,
+            "off_samples": self.off_samples,
+        }
+
+    def restore(self, data):
+        self.heat = float(data.get("heat", 0.0))
+        self.drift = float(data.get("drift", 0.0))
+        if len(data.get("p", ())) == 3:
+            self._p = [float(value) for value in data["p"]]
+        self.on_samples = int(data.get("on_samples", 0))
+        self.off_samples = int(data.get("off_samples", 0))
+
+
+class RateSampler:
+    """Turn readings and heater changes into (on fraction, rate) samples.
+
+    A sample spans at least min_interval seconds, so the resolution of the
+    sensor does not dominate it, and at most max_interval: longer gaps are
+    dropped. Times are in seconds.
+    """
+
+    __slots__ = (
+        "min_interval",
+        "max_interval",
+        "_time",
+        "_temp",
+        "_on",
+        "_on_since",
+        "_on_seconds",
+    )
+
+    def __init__(self, min_interval=600, max_interval=2 * HOUR):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._time = None
+        self._temp = None
+        self._on = False
+        self._on_since = None
+        self._on_seconds = 0.0
+
+    def heater(self, now, on):
+        """Account a change of the heater at `now`."""
+        self._account(now)
+        self._on = on
+
+    def reading(self, now, temp):
+        """Feed a reading, return a sample (on fraction, degrees per hour) or None."""
+        if self._time is None or now - self._time > self.max_interval:
+            self._start(now, temp)
+            return None
+        elapsed = now - self._time
+        if elapsed < self.min_interval:
+            return None
+        self._account(now)
+        sample = (
+            min(1.0, self._on_seconds / elapsed),
+            (temp - self._temp) / elapsed * HOUR,
+        )
+        self._start(now, temp)
+        return sample
+
+    def reset(self):
+        """Drop the sample in progress."""
+        self._time = None
+
+    def _start(self, now, temp):
+        self._time = now
+        self._temp = temp
+        self._on_since = now
+        self._on_seconds = 0.0
+
+    def _account(self, now):
+        if self._on and self._on_since is not None:
+            self._on_seconds += now - self._on_since
+        self._on_since = now
@@ -0,0 +1,113 @@
+# Hot path instrumentation of Simple Thermostat A.
+# Histograms have fixed buckets allocated once, so recording a sample does not
+# allocate. A thermostat only holds a ThermostatMetrics while metrics are
+# enabled, otherwise the hot path pays one `is None` check.
+
+from bisect import bisect_left
+from time import monotonic
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+# Upper bounds of the control passes per minute buckets
+PASSES_BUCKETS = (0, 1, 2, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    """Count of samples per bucket, plus their number, sum and maximum."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "maximum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One more bucket for the samples above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.maximum = None
+
+    def add(self, value, weight=1):
+        self.counts[bisect_left(self.bounds, value)] += weight
+        self.count += weight
+        self.total += value * weight
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def as_dict(self):
+        buckets = {
+            f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)
+        }
+        buckets["inf"] = self.counts[-1]
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum": self.total,
+            "max": self.maximum,
+        }
+
+
+class ThermostatMetrics:
+    """Latencies and counters of the control path of one thermostat.
+
+    Samples are taken with time.monotonic(), in seconds.
+    """
+
+    __slots__ = (
+        "sensor_to_decision",
+        "heater_confirm",
+        "passes_per_minute",
+        "passes",
+        "min_cycle_skips",
+        "keep_alive_redundant",
+        "_sensor_at",
+        "_minute",
+        "_minute_passes",
+    )
+
+    def __init__(self):
+        # From the oldest sensor reading not yet decided on, to the decision
+        self.sensor_to_decision = Histogram(LATENCY_BUCKETS)
+        # From a heater command to the switch reporting its state, retries included
+        self.heater_confirm = Histogram(LATENCY_BUCKETS)
+        self.passes_per_minute = Histogram(PASSES_BUCKETS)
+        self.passes = 0
+        self.min_cycle_skips = 0
+        # Keep-alive calls re-sending the state the heater already has
+        self.keep_alive_redundant = 0
+        self._sensor_at = None
+        self._minute = None
+        self._minute_passes = 0
+
+    def sensor_event(self):
+        now = monotonic()
+        if self._sensor_at is None:
+            self._sensor_at = now
+
+    def pass_started(self):
+        now = monotonic()
+        self.passes += 1
+        minute = int(now // 60)
+        if minute != self._minute:
+            if self._minute is not None:
+                self.passes_per_minute.add(self._minute_passes)
+                # Minutes without any pass in between
+                idle = minute - self._minute - 1
+                if idle:
+                    self.passes_per_minute.add(0, idle)
+            self._minute = minute
+            self._minute_passes = 0
+        self._minute_passes += 1
+
+    def decided(self):
+        if self._sensor_at is not None:
+            self.sensor_to_decision.add(monotonic() - self._sensor_at)
+            self._sensor_at = None
+
+    def as_dict(self):
+        return {
+            "sensor_to_decision": self.sensor_to_decision.as_dict(),
+            "heater_confirm": self.heater_confirm.as_dict(),
+            "passes_per_minute": self.passes_per_minute.as_dict(),
+            "passes": self.passes,
+            "min_cycle_skips": self.min_cycle_skips,
+            "keep_alive_redundant": self.keep_alive_redundant,
+        }
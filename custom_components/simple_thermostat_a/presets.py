@@ -0,0 +1,41 @@
+# Preset table of Simple Thermostat A.
+# The table is immutable: everything the entity reads on a state write is
+# computed once, and a new table is built only when a temperature changes.
+
+from types import MappingProxyType
+
+
+class PresetTable:
+    """Presets of a thermostat and their temperatures."""
+
+    __slots__ = ("modes", "temps")
+
+    def __init__(self, none_mode, temps):
+        # temps maps each configured preset, in display order, to its temperature
+        temps = dict(temps)
+        self.modes = (none_mode, *temps)
+        self.temps = MappingProxyType(temps)
+
+    def __contains__(self, mode):
+        return mode in self.temps or mode == self.modes[0]
+
+    def __eq__(self, other):
+        if not isinstance(other, PresetTable):
+            return NotImplemented
+        return self.modes == other.modes and self.temps == other.temps
+
+    def replace(self, changes):
+        """Return a table with the temperatures of changes applied.
+
+        Unknown presets are ignored. The table itself is returned when nothing
+        changes.
+        """
+        temps = dict(self.temps)
+        changed = False
+        for mode, temp in changes.items():
+            if mode in temps and temps[mode] != temp:
+                temps[mode] = temp
+                changed = True
+        if not changed:
+            return self
+        return PresetTable(self.modes[0], temps)
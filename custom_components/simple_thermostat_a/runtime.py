@@ -0,0 +1,121 @@
+# Runtime accounting of the heater of Simple Thermostat A.
+# Counters are updated on each heater transition and read on a timer; both
+# cost O(1) (bounded by the fixed number of buckets of a window).
+
+HOUR = 3600
+
+
+class DutyWindow:
+    """Heater on-time over a rolling window, in fixed-size buckets."""
+
+    __slots__ = ("width", "values", "current", "total")
+
+    def __init__(self, count, width):
+        # Seconds per bucket
+        self.width = width
+        self.values = [0.0] * count
+        # Absolute number (time // width) of the newest bucket
+        self.current = None
+        self.total = 0.0
+
+    @property
+    def length(self):
+        return self.width * len(self.values)
+
+    def advance(self, now):
+        """Drop the buckets that left the window at `now`."""
+        slot = int(now // self.width)
+        if self.current is None or slot <= self.current:
+            if self.current is None:
+                self.current = slot
+            return
+        count = len(self.values)
+        for offset in range(1, min(slot - self.current, count) + 1):
+            index = (self.current + offset) % count
+            self.total -= self.values[index]
+            self.values[index] = 0.0
+        self.current = slot
+        if self.total < 0:
+            # Rounding errors of the running total
+            self.total = 0.0
+
+    def add(self, start, end):
+        """Count the heater on between start and end."""
+        start = max(start, end - self.length)
+        while start < end:
+            slot = int(start // self.width)
+            self.advance(start)
+            part = min(end, (slot + 1) * self.width) - start
+            if slot >= self.current - len(self.values) + 1:
+                self.values[slot % len(self.values)] += part
+                self.total += part
+            start += part
+
+    def duty(self, now):
+        """Return the fraction of the window ending at `now` with the heater on."""
+        self.advance(now)
+        # The newest bucket is only partly elapsed
+        span = self.length - self.width + (now - self.current * self.width)
+        return min(1.0, self.total / span) if span > 0 else 0.0
+
+    def as_dict(self):
+        return {"current": self.current, "values": list(self.values)}
+
+    def restore(self, data):
+        if len(data["values"]) == len(self.values):
+            self.current = data["current"]
+            self.values = [float(value) for value in data["values"]]
+            self.total = sum(self.values)
+
+
+class RuntimeCounter:
+    """Total on-time, cycles and hourly / daily duty cycle of a heater.
+
+    Times are POSIX timestamps in seconds.
+    """
+
+    __slots__ = ("on", "since", "total_on", "cycles", "hour", "day")
+
+    def __init__(self):
+        # None until the state of the heater is known
+        self.on = None
+        self.since = None
+        self.total_on = 0.0
+        # Off to on transitions
+        self.cycles = 0
+        self.hour = DutyWindow(60, HOUR / 60)
+        self.day = DutyWindow(24, HOUR)
+
+    def update(self, now, on=None):
+        """Account the time up to `now`, then take the new heater state if given."""
+        if self.on and self.since is not None and now > self.since:
+            self.total_on += now - self.since
+            self.hour.add(self.since, now)
+            self.day.add(self.since, now)
+        self.since = now
+        if on is not None:
+            if on and self.on is False:
+                self.cycles += 1
+            self.on = on
+
+    def snapshot(self, now):
+        """Return (total on seconds, cycles, hourly duty, daily duty) at `now`."""
+        self.update(now)
+        return self.total_on, self.cycles, self.hour.duty(now), self.day.duty(now)
+
+    def as_dict(self):
+        return {
+            "total_on": self.total_on,
+            "cycles": self.cycles,
+            "hour": self.hour.as_dict(),
+            "day": self.day.as_dict(),
+        }
+
+    def restore(self, data):
+        """Restore the counters saved by as_dict(); the heater state is read again."""
+        self.total_on = float(data.get("total_on", 0.0))
+        self.cycles = int(data.get("cycles", 0))
+        if "hour" in data:
+            self.hour.restore(data["hour"])
+        if "day" in data:
+            self.day.restore(data["day"])
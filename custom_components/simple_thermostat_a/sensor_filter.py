@@ -0,0 +1,110 @@
+# Input conditioning for the temperature sensor of Simple Thermostat A.
+# Every stage has a constant cost and memory per sample, so it can sit on the
+# sensor event hot path of many thermostats.
+
+from bisect import bisect_left, insort
+
+FILTER_NONE = "none"
+FILTER_EMA = "ema"
+FILTER_MEDIAN = "median"
+FILTERS = [FILTER_NONE, FILTER_EMA, FILTER_MEDIAN]
+
+
+class SensorFilter:
+    """Smooth raw readings and decide which of them are worth a control pass."""
+
+    __slots__ = (
+        "_mode",
+        "_alpha",
+        "_min_interval",
+        "_deadband",
+        "_ema",
+        "_ring",
+        "_ring_index",
+        "_ring_count",
+        "_sorted",
+        "_last_value",
+        "_last_time",
+        "held",
+    )
+
+    def __init__(
+        self, mode=FILTER_NONE, alpha=0.3, window=5, min_interval=0, deadband=0
+    ):
+        self._mode = mode
+        self._alpha = alpha
+        # Seconds between two accepted readings
+        self._min_interval = min_interval
+        self._deadband = deadband
+        self._ema = None
+        # Rolling median: preallocated ring buffer plus its sorted view
+        self._ring = [0.0] * window
+        self._ring_index = 0
+        self._ring_count = 0
+        self._sorted = []
+        self._last_value = None
+        self._last_time = None
+        # Reading held back by min_interval, see release()
+        self.held = None
+
+    def add(self, value, now):
+        """Feed a reading taken at `now` (seconds).
+
+        Return the conditioned temperature, or None if this reading should not
+        trigger a control pass. A reading arriving within min_interval is kept
+        in `held` until release() is called at the end of the interval.
+        """
+        if self._mode == FILTER_EMA:
+            value = self._add_ema(value)
+        elif self._mode == FILTER_MEDIAN:
+            value = self._add_median(value)
+
+        if self._last_value is not None:
+            if abs(value - self._last_value) < self._deadband:
+                # Back near the last accepted reading, nothing left to deliver
+                self.held = None
+                return None
+            if now - self._last_time < self._min_interval:
+                self.held = value
+                return None
+        self.held = None
+        self._last_value = value
+        self._last_time = now
+        return value
+
+    def wait(self, now):
+        """Return the seconds until min_interval ends."""
+        if self._last_time is None:
+            return 0
+        return max(0, self._last_time + self._min_interval - now)
+
+    def release(self, now):
+        """Accept the held reading at `now` and return it, None if there is none."""
+        value, self.held = self.held, None
+        if value is not None:
+            self._last_value = value
+            self._last_time = now
+        return value
+
+    def _add_ema(self, value):
+        if self._ema is None:
+            self._ema = value
+        else:
+            self._ema += self._alpha * (value - self._ema)
+        return self._ema
+
+    def _add_median(self, value):
+        window = len(self._ring)
+        if self._ring_count == window:
+            # Drop the oldest sample from the sorted view
+            del self._sorted[bisect_left(self._sorted, self._ring[self._ring_index])]
+        else:
+            self._ring_count += 1
+        self._ring[self._ring_index] = value
+        self._ring_index = (self._ring_index + 1) % window
+        insort(self._sorted, value)
+
+        middle = self._ring_count // 2
+        if self._ring_count % 2:
+            return self._sorted[middle]
+        return (self._sorted[middle - 1] + self._sorted[middle]) / 2
@@ -0,0 +1,131 @@
+# Open window detection of Simple Thermostat A.
+# A least-squares slope of the temperature over a sliding time window, kept as
+# running sums: a reading is added and the expired ones removed in amortized
+# O(1), without re-reading the window.
+
+from collections import deque
+
+HOUR = 3600
+# Times are taken relative to an origin moved forward every REBASE windows, so
+# the sums stay small enough for the slope to be exact
+REBASE = 10
+
+
+class SlopeWindow:
+    """Least-squares slope of the readings of the last `length` seconds."""
+
+    __slots__ = ("length", "_samples", "_origin", "_st", "_sx", "_stt", "_stx")
+
+    def __init__(self, length):
+        self.length = length
+        self._samples = deque()
+        self._origin = None
+        self._st = self._sx = self._stt = self._stx = 0.0
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def span(self):
+        """Seconds between the oldest and the newest reading."""
+        if not self._samples:
+            return 0.0
+        return self._samples[-1][0] - self._samples[0][0]
+
+    @property
+    def newest(self):
+        """The newest reading, None if there is none."""
+        return self._samples[-1][1] if self._samples else None
+
+    def clear(self):
+        self._samples.clear()
+        self._origin = None
+        self._st = self._sx = self._stt = self._stx = 0.0
+
+    def add(self, now, value):
+        """Add the reading `value` taken at `now` (seconds)."""
+        if self._origin is None or now - self._origin > REBASE * self.length:
+            self._rebase(now)
+        samples = self._samples
+        samples.append((now, value))
+        self._sum(now - self._origin, value, 1)
+        while now - samples[0][0] > self.length:
+            old_time, old_value = samples.popleft()
+            self._sum(old_time - self._origin, old_value, -1)
+
+    def slope(self):
+        """Return the slope in units per second, None with less than two readings."""
+        count = len(self._samples)
+        if count < 2:
+            return None
+        denominator = count * self._stt - self._st * self._st
+        if denominator <= 0:
+            return None
+        return (count * self._stx - self._st * self._sx) / denominator
+
+    def _sum(self, t, value, sign):
+        self._st += sign * t
+        self._sx += sign * value
+        self._stt += sign * t * t
+        self._stx += sign * t * value
+
+    def _rebase(self, now):
+        self._origin = now
+        self._st = self._sx = self._stt = self._stx = 0.0
+        for sample_time, value in self._samples:
+            self._sum(sample_time - now, value, 1)
+
+
+class WindowDetector:
+    """Tell an open window from the temperature falling faster than `drop` per hour.
+
+    The window is open once the slope over `length` seconds is below -drop,
+    and closed again once it is back above -drop / 2. The slope is only
+    trusted when the readings cover half of `length` or more.
+    """
+
+    __slots__ = ("drop", "is_open", "_slope")
+
+    def __init__(self, length, drop):
+        # Degrees per second
+        self.drop = drop / HOUR
+        self.is_open = False
+        self._slope = SlopeWindow(length)
+
+    def add(self, now, temp):
+        """Feed a reading taken at `now` (seconds). Return True if is_open changed."""
+        self._slope.add(now, temp)
+        if self._slope.span < self._slope.length / 2:
+            return False
+        slope = self._slope.slope()
+        if slope is None:
+            return False
+        if self.is_open:
+            is_open = slope < -self.drop / 2
+        else:
+            is_open = slope <= -self.drop
+        if is_open == self.is_open:
+            return False
+        self.is_open = is_open
+        return True
+
+    def hold(self, now):
+        """Repeat the newest reading at `now`. Return True if is_open changed.
+
+        Sensors only report changes: without this, a temperature that stopped
+        falling would leave the window open.
+        """
+        newest = self._slope.newest
+        if newest is None:
+            return False
+        return self.add(now, newest)
+
+    def slope(self):
+        """Return the slope in degrees per hour, None while unknown."""
+        slope = self._slope.slope()
+        return None if slope is None else slope * HOUR
+
+    def reset(self):
+        """Close the window and forget the readings."""
+        self.is_open = False
+        self._slope.clear()
@@ -0,0 +1 @@
+"""Tests of Simple Thermostat A."""
@@ -0,0 +1,58 @@
+"""Fixtures of the Simple Thermostat A tests."""
+
+import pytest
+
+from homeassistant.setup import async_setup_component
+
+from custom_components.simple_thermostat_a import DOMAIN
+
+pytest_plugins = "pytest_homeassistant_custom_component"
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Load custom_components/simple_thermostat_a."""
+    yield
+
+
+@pytest.fixture
+def setup_thermostats(hass):
+    """Return a coroutine function setting up thermostats with input_boolean heaters.
+
+    Each thermostat config gets its heater and sensor created. It returns the
+    entities by entity_id.
+    """
+
+    async def _async_setup(*thermostats, sensor_temp="20.0"):
+        heaters = {}
+        for config in thermostats:
+            heater_ids = config["heater"]
+            for heater_id in (
+                [heater_ids] if isinstance(heater_ids, str) else heater_ids
+            ):
+                heaters[heater_id.split(".", 1)[1]] = {}
+            hass.states.async_set(config["target_sensor"], sensor_temp)
+        # homeassistant.turn_on / turn_off switch the heaters
+        assert await async_setup_component(hass, "homeassistant", {})
+        assert await async_setup_component(
+            hass, "input_boolean", {"input_boolean": heaters}
+        )
+        assert await async_setup_component(
+            hass,
+            "climate",
+            {
+                "climate": [
+                    {
+                        "platform": DOMAIN,
+                        "target_temp": 20,
+                        "initial_hvac_mode": "heat",
+                        **config,
+                    }
+                    for config in thermostats
+                ]
+            },
+        )
+        await hass.async_block_till_done()
+        return hass.data[DOMAIN]["entities"]
+
+    return _async_setup
@@ -0,0 +1,43 @@
+"""bulk_set_presets domain service."""
+
+from homeassistant.core import Context
+
+from custom_components.simple_thermostat_a import DOMAIN, const
+
+
+async def test_bulk_set_presets_keeps_the_context(hass, setup_thermostats):
+    """The heater calls and the states written carry the context of the call."""
+    await setup_thermostats(
+        *(
+            {
+                "name": name,
+                "unique_id": name,
+                "heater": f"input_boolean.{name}",
+                "target_sensor": f"sensor.{name}",
+                "away_temp": 16,
+            }
+            for name in ("first", "second")
+        )
+    )
+    context = Context()
+    await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_BULK_SET_PRESETS,
+        {
+            "entity_id": ["climate.first", "climate.second"],
+            "preset_mode": "away",
+            "away_temp": 22,
+        },
+        blocking=True,
+        context=context,
+    )
+    await hass.async_block_till_done()
+
+    for name in ("first", "second"):
+        heater = hass.states.get(f"input_boolean.{name}")
+        assert heater.state == "on"
+        assert heater.context.id == context.id
+        thermostat = hass.states.get(f"climate.{name}")
+        assert thermostat.attributes["preset_mode"] == "away"
+        assert thermostat.attributes["temperature"] == 22
+        assert thermostat.context.id == context.id
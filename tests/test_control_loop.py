@@ -0,0 +1,46 @@
+"""Control loop under an event storm."""
+
+import asyncio
+
+THERMOSTAT = {
+    "name": "storm",
+    "heater": "input_boolean.storm",
+    "target_sensor": "sensor.storm",
+}
+
+
+async def test_event_storm_passes_never_overlap(hass, setup_thermostats):
+    """Each reading of a burst runs one pass to its end; nothing waits behind it."""
+    entities = await setup_thermostats(THERMOSTAT)
+    entity = entities["climate.storm"]
+
+    passes = []
+    in_flight = 0
+    depths = []
+    control_pass = entity._async_control_heating_pass
+
+    async def _async_counted_pass(time, force):
+        nonlocal in_flight
+        in_flight += 1
+        depths.append(in_flight)
+        passes.append(entity._cur_temp)
+        try:
+            await control_pass(time, force)
+        finally:
+            in_flight -= 1
+
+    entity._async_control_heating_pass = _async_counted_pass
+
+    for step in range(200):
+        hass.states.async_set("sensor.storm", f"{18 + step / 100:.2f}")
+        # Let the listeners run, without waiting for the switch
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+    await hass.async_block_till_done()
+
+    # One pass per reading, never two at once, the last one on the newest reading
+    assert len(passes) == 200
+    assert max(depths) == 1
+    assert passes[-1] == 19.99
+    assert in_flight == 0
+    assert hass.states.get("input_boolean.storm").state == "on"
@@ -0,0 +1,82 @@
+"""Decision core, without Home Assistant."""
+
+import pytest
+
+from custom_components.simple_thermostat_a.core import (
+    NO_DECISION,
+    TURN_OFF,
+    TURN_ON,
+    Decision,
+    ThermostatState,
+    decide,
+    select_preset,
+)
+from custom_components.simple_thermostat_a.presets import PresetTable
+
+NOW = 1_000_000.0
+
+
+def _state(cur_temp, heater_on=False, ac_mode=False, min_cycle=0, changed=NOW):
+    state = ThermostatState(ac_mode, min_cycle=min_cycle)
+    state.hvac_off = False
+    state.cur_temp = cur_temp
+    state.target_temp = 20.0
+    state.heater_on = heater_on
+    state.heater_last_changed = changed
+    return state
+
+
+@pytest.mark.parametrize(
+    ("cur_temp", "heater_on", "action"),
+    [
+        (19.7, False, TURN_ON),
+        (19.8, False, None),
+        (20.3, True, TURN_OFF),
+        (20.2, True, None),
+    ],
+)
+def test_hysteresis(cur_temp, heater_on, action):
+    """The heater switches once the temperature crosses the tolerances."""
+    assert decide(_state(cur_temp, heater_on), NOW) == Decision(action)
+
+
+def test_ac_mode_switches_the_other_way():
+    assert decide(_state(20.3, ac_mode=True), NOW) == Decision(TURN_ON)
+    assert decide(_state(19.7, True, ac_mode=True), NOW) == Decision(TURN_OFF)
+
+
+def test_no_decision_without_inputs():
+    state = _state(15.0)
+    state.hvac_off = True
+    assert decide(state, NOW) is NO_DECISION
+    state = _state(None)
+    assert decide(state, NOW) is NO_DECISION
+
+
+def test_min_cycle_wakes_at_its_end():
+    state = _state(15.0, min_cycle=300, changed=NOW - 100)
+    assert decide(state, NOW) == Decision(None, NOW + 200)
+    assert decide(state, NOW + 200) == Decision(TURN_ON)
+    # force and keep-alive ignore the cycle
+    assert decide(state, NOW, force=True) == Decision(TURN_ON)
+    assert decide(state, NOW, keep_alive=True) == Decision(TURN_ON)
+    # Nothing to wait for without a switch
+    assert decide(_state(20.0, min_cycle=300), NOW) is NO_DECISION
+    # A heater neither on nor off cannot be checked
+    assert decide(_state(15.0, min_cycle=300, changed=None), NOW) is NO_DECISION
+
+
+def test_keep_alive_repeats_the_current_command():
+    assert decide(_state(20.0), NOW, keep_alive=True) == Decision(TURN_OFF)
+    assert decide(_state(20.0, True), NOW, keep_alive=True) == Decision(TURN_ON)
+
+
+def test_select_preset_saves_the_manual_target():
+    presets = PresetTable("none", {"away": 12, "eco": 17})
+    # From none, the manual target is saved
+    assert select_preset(presets, "none", "away", 21, None) == (12, 21)
+    # Between presets, the saved target is kept
+    assert select_preset(presets, "away", "eco", 12, 21) == (17, 21)
+    # Back to none, the saved target is restored
+    assert select_preset(presets, "eco", "none", 17, 21) == (21, 21)
+    assert select_preset(presets, "none", "boost", 21, None) is None
@@ -0,0 +1,75 @@
+"""Zone mode: one thermostat driving several heaters."""
+
+from datetime import timedelta
+
+from homeassistant.const import EVENT_CALL_SERVICE
+from homeassistant.core import DOMAIN as HA_DOMAIN
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import (
+    async_capture_events,
+    async_fire_time_changed,
+)
+
+HEATERS = ["input_boolean.zone_1", "input_boolean.zone_2", "input_boolean.zone_3"]
+ZONE = {
+    "name": "zone",
+    "heater": HEATERS,
+    "target_sensor": "sensor.zone",
+}
+
+
+def _heater_states(hass):
+    return [hass.states.get(entity_id).state for entity_id in HEATERS]
+
+
+async def _async_set_target(hass, temperature):
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.zone", "temperature": temperature},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+
+async def _async_run(hass, freezer, seconds):
+    freezer.tick(timedelta(seconds=seconds))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def test_heaters_switch_in_one_call(hass, setup_thermostats):
+    """All the heaters of a zone are switched by one service call."""
+    await setup_thermostats(ZONE, sensor_temp="18.0")
+    calls = async_capture_events(hass, EVENT_CALL_SERVICE)
+    await _async_set_target(hass, 21)
+    assert _heater_states(hass) == ["on", "on", "on"]
+    turn_on = [call for call in calls if call.data["domain"] == HA_DOMAIN]
+    assert len(turn_on) == 1
+    assert turn_on[0].data["service_data"]["entity_id"] == HEATERS
+    assert hass.states.get("climate.zone").attributes["hvac_action"] == "heating"
+
+    # The zone is heating while any heater is on
+    for entity_id in HEATERS[:2]:
+        hass.states.async_set(entity_id, "off")
+    await hass.async_block_till_done()
+    assert hass.states.get("climate.zone").attributes["hvac_action"] == "heating"
+
+    await _async_set_target(hass, 15)
+    assert _heater_states(hass) == ["off", "off", "off"]
+    assert hass.states.get("climate.zone").attributes["hvac_action"] == "idle"
+
+
+async def test_heaters_start_staggered(hass, setup_thermostats, freezer):
+    """heater_stagger spaces out the starts; turning off cancels the pending ones."""
+    await setup_thermostats({**ZONE, "heater_stagger": 30}, sensor_temp="18.0")
+    await _async_set_target(hass, 21)
+    assert _heater_states(hass) == ["on", "off", "off"]
+    await _async_run(hass, freezer, 30)
+    assert _heater_states(hass) == ["on", "on", "off"]
+
+    await _async_set_target(hass, 15)
+    assert _heater_states(hass) == ["off", "off", "off"]
+    await _async_run(hass, freezer, 60)
+    assert _heater_states(hass) == ["off", "off", "off"]
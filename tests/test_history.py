@@ -0,0 +1,122 @@
+"""In-memory history and the query_history service."""
+
+from datetime import timedelta
+
+from custom_components.simple_thermostat_a import DOMAIN, const
+from custom_components.simple_thermostat_a.history import HistoryBuffer
+
+
+def _filled(size, count):
+    """Samples every 10 s from 0: temperature 20 + t / 10, heating every other one."""
+    history = HistoryBuffer(size)
+    for index in range(count):
+        history.add(index * 10, 20 + index, 21, index % 2 == 0)
+    return history
+
+
+def test_window_of_an_empty_buffer():
+    history = HistoryBuffer(4)
+    assert len(history) == 0
+    assert history.window(0, 100, 4) == {
+        "temperature": [None] * 4,
+        "target": [None] * 4,
+        "duty": [None] * 4,
+    }
+
+
+def test_window_buckets():
+    """Mean temperature, last target and heating duty of each bucket."""
+    history = _filled(10, 3)
+    assert history.window(0, 30, 3) == {
+        "temperature": [20.0, 21.0, 22.0],
+        "target": [21.0, 21.0, 21.0],
+        "duty": [1.0, 0.0, 1.0],
+    }
+    # Two samples per bucket; heating goes on after the last sample
+    assert history.window(0, 40, 2) == {
+        "temperature": [20.5, 22.0],
+        "target": [21.0, 21.0],
+        "duty": [0.5, 1.0],
+    }
+
+
+def test_window_skips_unknown_temperatures():
+    history = HistoryBuffer(4)
+    history.add(0, None, None, False)
+    history.add(10, 20.0, 21.0, False)
+    assert history.window(0, 20, 2)["temperature"] == [None, 20.0]
+    assert history.window(0, 20, 2)["target"] == [None, 21.0]
+
+
+def test_window_after_wraparound():
+    """The oldest samples are overwritten and the running sums stay right."""
+    history = _filled(4, 6)
+    assert len(history) == 4
+    # Samples of 20 s to 50 s are left
+    assert history.window(0, 60, 6) == {
+        "temperature": [None, None, 22.0, 23.0, 24.0, 25.0],
+        "target": [None, None, 21.0, 21.0, 21.0, 21.0],
+        "duty": [None, None, 1.0, 0.0, 1.0, 0.0],
+    }
+    assert history.window(20, 60, 1)["temperature"] == [23.5]
+
+
+def test_window_larger_than_the_capacity():
+    """Only the time covered by the buffer counts in the duty."""
+    history = _filled(4, 6)
+    window = history.window(-1000, 60, 1)
+    assert window["temperature"] == [23.5]
+    assert window["target"] == [21.0]
+    # On from 20 s to 30 s and from 40 s to 50 s, out of 40 s
+    assert window["duty"] == [0.5]
+
+
+THERMOSTAT = {
+    "name": "history",
+    "heater": "input_boolean.history",
+    "target_sensor": "sensor.history",
+    "history_size": 100,
+}
+
+
+async def _async_query(hass, **data):
+    response = await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_QUERY_HISTORY,
+        {"entity_id": "climate.history", **data},
+        blocking=True,
+        return_response=True,
+    )
+    return response["climate.history"]
+
+
+async def test_query_history(hass, setup_thermostats, freezer):
+    """The samples of the last hour, downsampled into buckets."""
+    await setup_thermostats(THERMOSTAT, sensor_temp="18.0")
+    for temp in ("19.0", "20.0", "21.0"):
+        freezer.tick(timedelta(minutes=20))
+        hass.states.async_set("sensor.history", temp)
+        await hass.async_block_till_done()
+    freezer.tick(timedelta(minutes=20))
+
+    history = await _async_query(hass, duration=3600, buckets=3)
+    assert history["enabled"] is True
+    assert history["samples"] >= 4
+    assert history["step"] == 1200
+    assert history["temperature"] == [19.0, 20.0, 21.0]
+    assert history["target"] == [20.0, 20.0, 20.0]
+    # Heating until the room went past the hot tolerance
+    assert history["duty"] == [1.0, 1.0, 0.0]
+
+
+async def test_query_history_disabled(hass, setup_thermostats):
+    await setup_thermostats({**THERMOSTAT, "history_size": 0})
+    assert await _async_query(hass) == {"enabled": False}
+
+
+async def test_query_history_retention(hass, setup_thermostats, freezer):
+    """Nothing older than history_retention is returned."""
+    await setup_thermostats({**THERMOSTAT, "history_retention": 600})
+    freezer.tick(timedelta(minutes=30))
+    history = await _async_query(hass, duration=3600, buckets=2)
+    assert history["step"] == 300
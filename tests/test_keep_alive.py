@@ -0,0 +1,162 @@
+"""Keep-alive timer wheel."""
+
+from collections import Counter
+from datetime import timedelta
+
+from homeassistant.const import SERVICE_TURN_OFF, SERVICE_TURN_ON
+from homeassistant.setup import async_setup_component
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.simple_thermostat_a import DOMAIN
+
+COUNT = 120
+KEEP_ALIVE = 60
+
+
+async def test_keep_alive_work_is_flat(hass, freezer):
+    """Every tick of the wheel runs the same number of thermostats, each once per interval."""
+    hass.states.async_set("sensor.room", "20.0")
+    assert await async_setup_component(hass, "homeassistant", {})
+    assert await async_setup_component(
+        hass,
+        "input_boolean",
+        {"input_boolean": {f"heater_{index}": {} for index in range(COUNT)}},
+    )
+    assert await async_setup_component(
+        hass,
+        "climate",
+        {
+            "climate": {
+                "platform": DOMAIN,
+                "target_temp": 20,
+                "initial_hvac_mode": "heat",
+                "target_sensor": "sensor.room",
+                "keep_alive": KEEP_ALIVE,
+                "thermostats": [
+                    {
+                        "name": f"room {index}",
+                        "unique_id": f"room_{index}",
+                        "heater": f"input_boolean.heater_{index}",
+                    }
+                    for index in range(COUNT)
+                ],
+            }
+        },
+    )
+    await hass.async_block_till_done()
+    entities = hass.data[DOMAIN]["entities"]
+    assert len(entities) == COUNT
+
+    passes = Counter()
+    tick = []
+
+    def _count(entity):
+        control_heating = entity._async_control_heating
+
+        async def _async_counted(time=None, force=False):
+            passes[entity.entity_id] += 1
+            tick.append(entity.entity_id)
+            await control_heating(time, force)
+
+        return _async_counted
+
+    for entity in entities.values():
+        entity._async_control_heating = _count(entity)
+
+    per_tick = []
+    for _ in range(2 * KEEP_ALIVE):
+        freezer.tick(timedelta(seconds=1))
+        async_fire_time_changed(hass, dt_util.utcnow())
+        await hass.async_block_till_done()
+        per_tick.append(len(tick))
+        tick.clear()
+
+    # 120 thermostats over a 60 slot wheel: 2 per tick, never a wave
+    assert set(per_tick) == {COUNT // KEEP_ALIVE}
+    # Each thermostat once per interval
+    assert set(passes.values()) == {2}
+    assert len(passes) == COUNT
+
+
+async def test_keep_alive_skips_a_fresh_command(hass, freezer, setup_thermostats):
+    """Keep-alive does not re-send a command confirmed less than an interval ago."""
+    entities = await setup_thermostats(
+        {
+            "name": "fresh",
+            "unique_id": "fresh",
+            "heater": "input_boolean.fresh",
+            "target_sensor": "sensor.fresh",
+            "keep_alive": KEEP_ALIVE,
+        },
+    )
+    heater = entities["climate.fresh"]._heaters["input_boolean.fresh"]
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.fresh", "temperature": 22},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.fresh").state == "on"
+    assert heater.stats["sent"] == 1
+
+    async def _async_run(seconds):
+        for _ in range(seconds):
+            freezer.tick(timedelta(seconds=1))
+            async_fire_time_changed(hass, dt_util.utcnow())
+            await hass.async_block_till_done()
+
+    # The turn_on that switched the heater is still fresh
+    await _async_run(KEEP_ALIVE - 1)
+    assert heater.stats["sent"] == 1
+    assert heater.stats["deduplicated"] >= 1
+
+    # Then keep-alive re-sends it once per interval
+    await _async_run(2 * KEEP_ALIVE)
+    assert heater.stats["sent"] == 3
+
+
+async def test_keep_alive_with_an_opposite_command_in_flight(
+    hass, freezer, setup_thermostats
+):
+    """A resend does not supersede a command in flight, nor count as a switch."""
+    entities = await setup_thermostats(
+        {
+            "name": "flight",
+            "unique_id": "flight",
+            "heater": "input_boolean.flight",
+            "target_sensor": "sensor.flight",
+            "keep_alive": KEEP_ALIVE,
+        },
+    )
+    heater = entities["climate.flight"]._heaters["input_boolean.flight"]
+    await hass.services.async_call(
+        "input_boolean", "turn_on", {"entity_id": "input_boolean.flight"}, blocking=True
+    )
+    freezer.tick(timedelta(seconds=KEEP_ALIVE + 1))
+    sent = heater.stats["sent"]
+
+    # turn_off is in flight while the switch still shows on: keep-alive waits
+    heater.async_request(SERVICE_TURN_OFF)
+    heater.async_request(SERVICE_TURN_ON, resend=True)
+    assert heater.stats["sent"] == sent + 1
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.flight").state == "off"
+
+    await hass.services.async_call(
+        "input_boolean", "turn_on", {"entity_id": "input_boolean.flight"}, blocking=True
+    )
+    freezer.tick(timedelta(seconds=KEEP_ALIVE + 1))
+    sent = heater.stats["sent"]
+
+    # A turn_on superseding it is sent, but the switch never left on: no
+    # confirmed switch, so keep-alive still re-sends it
+    heater.async_request(SERVICE_TURN_OFF)
+    heater.async_request(SERVICE_TURN_ON)
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.flight").state == "on"
+    heater.async_request(SERVICE_TURN_ON, resend=True)
+    await hass.async_block_till_done()
+    assert heater.stats["sent"] == sent + 3
@@ -0,0 +1,107 @@
+"""Hot path metrics and the set_metrics / dump_metrics services."""
+
+from unittest.mock import patch
+
+from custom_components.simple_thermostat_a import DOMAIN, const
+from custom_components.simple_thermostat_a.metrics import Histogram, ThermostatMetrics
+
+
+def test_histogram_buckets():
+    histogram = Histogram((1, 5))
+    for value in (0.5, 1, 3, 7):
+        histogram.add(value)
+    histogram.add(2, weight=3)
+    assert histogram.as_dict() == {
+        "buckets": {"le_1": 2, "le_5": 4, "inf": 1},
+        "count": 7,
+        "sum": 17.5,
+        "max": 7,
+    }
+
+
+def test_passes_per_minute_counts_idle_minutes():
+    """Minutes without a pass are counted in the 0 bucket once a later pass runs."""
+    metrics = ThermostatMetrics()
+    with patch("custom_components.simple_thermostat_a.metrics.monotonic") as clock:
+        for now in (0, 10, 20, 200):
+            clock.return_value = now
+            metrics.pass_started()
+    passes = metrics.as_dict()["passes_per_minute"]
+    # 3 passes in minute 0, none in minutes 1 and 2; minute 3 is still open
+    assert passes["buckets"]["le_0"] == 2
+    assert passes["buckets"]["le_5"] == 1
+    assert metrics.passes == 4
+
+
+def test_sensor_to_decision_from_the_oldest_reading():
+    metrics = ThermostatMetrics()
+    with patch("custom_components.simple_thermostat_a.metrics.monotonic") as clock:
+        clock.return_value = 1.0
+        metrics.sensor_event()
+        clock.return_value = 1.002
+        # A newer reading does not restart the measure
+        metrics.sensor_event()
+        clock.return_value = 1.004
+        metrics.decided()
+        # Nothing pending: no sample
+        metrics.decided()
+    latency = metrics.as_dict()["sensor_to_decision"]
+    assert latency["count"] == 1
+    assert latency["buckets"]["le_0.005"] == 1
+
+
+THERMOSTAT = {
+    "name": "metrics",
+    "heater": "input_boolean.metrics",
+    "target_sensor": "sensor.metrics",
+}
+
+
+async def _async_dump(hass, reset=False):
+    response = await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_DUMP_METRICS,
+        {"entity_id": "climate.metrics", "reset": reset},
+        blocking=True,
+        return_response=True,
+    )
+    return response["climate.metrics"]
+
+
+async def test_set_and_dump_metrics(hass, setup_thermostats):
+    """Metrics are off by default, recorded once enabled and dropped on reset."""
+    await setup_thermostats(THERMOSTAT)
+    hass.states.async_set("sensor.metrics", "18.0")
+    await hass.async_block_till_done()
+    disabled = await _async_dump(hass)
+    assert disabled["enabled"] is False
+    # The heater command counters are always kept
+    assert disabled["heater_commands"]["sent"] == 1
+    assert disabled["heater_commands"]["confirmed"] == 1
+
+    await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_SET_METRICS,
+        {"entity_id": "climate.metrics", "enabled": True},
+        blocking=True,
+    )
+    hass.states.async_set("sensor.metrics", "21.0")
+    await hass.async_block_till_done()
+    metrics = await _async_dump(hass, reset=True)
+    assert metrics["enabled"] is True
+    assert metrics["passes"] == 1
+    assert metrics["sensor_to_decision"]["count"] == 1
+    assert metrics["heater_confirm"]["count"] == 1
+    assert metrics["heater_commands"]["sent"] == 2
+
+    metrics = await _async_dump(hass)
+    assert metrics["passes"] == 0
+    assert metrics["sensor_to_decision"]["count"] == 0
+
+    await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_SET_METRICS,
+        {"entity_id": "climate.metrics", "enabled": False},
+        blocking=True,
+    )
+    assert (await _async_dump(hass))["enabled"] is False
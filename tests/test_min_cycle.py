@@ -0,0 +1,40 @@
+"""Re-evaluation at the end of min_cycle_duration."""
+
+from datetime import timedelta
+
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+THERMOSTAT = {
+    "name": "cycle",
+    "heater": "input_boolean.cycle",
+    "target_sensor": "sensor.cycle",
+    "min_cycle_duration": 60,
+}
+
+
+async def test_min_cycle_timer_survives_attribute_updates(
+    hass, setup_thermostats, freezer
+):
+    """Power readings of the heater do not drop the pending end-of-cycle pass."""
+    await setup_thermostats(THERMOSTAT, sensor_temp="21.0")
+    freezer.tick(timedelta(seconds=120))
+
+    hass.states.async_set("sensor.cycle", "18.0")
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.cycle").state == "on"
+
+    # Too hot, but the heater has to stay on until the cycle ends
+    hass.states.async_set("sensor.cycle", "23.0")
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.cycle").state == "on"
+
+    # A smart plug pushing its power: same state, new attributes
+    hass.states.async_set("input_boolean.cycle", "on", {"power": 1200})
+    await hass.async_block_till_done()
+
+    freezer.tick(timedelta(seconds=61))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.cycle").state == "off"
@@ -0,0 +1,181 @@
+"""Learned heating and cooling rates and set_preset_at."""
+
+from datetime import timedelta
+
+import pytest
+
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.simple_thermostat_a import DOMAIN, const
+from custom_components.simple_thermostat_a.learning import (
+    HOUR,
+    RateModel,
+    RateSampler,
+)
+
+# Degrees per hour: heater gain and passive drift of the simulated room
+HEAT = 4.0
+DRIFT = -1.0
+
+
+def _learned(model=None, heat=HEAT, drift=DRIFT, count=100):
+    model = model or RateModel()
+    for index in range(count):
+        on = (0.0, 1.0, 0.25, 0.75)[index % 4]
+        model.update(on, heat * on + drift)
+    return model
+
+
+def test_rate_model_converges():
+    """Exact samples at several on fractions give back the gain and the drift."""
+    model = _learned()
+    assert model.ready
+    assert model.heat == pytest.approx(HEAT, abs=1e-3)
+    assert model.drift == pytest.approx(DRIFT, abs=1e-3)
+    assert model.heating_rate == pytest.approx(HEAT + DRIFT, abs=1e-3)
+    assert model.cooling_rate == pytest.approx(-DRIFT, abs=1e-3)
+
+
+def test_rate_model_needs_on_and_off_samples():
+    """The rates stay unknown until both heater states were sampled enough."""
+    model = RateModel()
+    for _ in range(10):
+        model.update(1.0, 3.0)
+    assert not model.ready
+    assert model.heating_rate is None
+    assert model.time_to_reach(18.0, 20.0, 1) is None
+    # Already there needs no rates
+    assert model.time_to_reach(20.0, 20.0, 1) == 0.0
+
+
+def test_rate_model_follows_a_change():
+    """The forgetting factor lets the model follow a new season."""
+    model = _learned()
+    _learned(model, heat=2.0, drift=-3.0, count=400)
+    assert model.heat == pytest.approx(2.0, abs=1e-2)
+    assert model.drift == pytest.approx(-3.0, abs=1e-2)
+
+
+def test_rate_model_restore():
+    model = _learned()
+    restored = RateModel()
+    restored.restore(model.as_dict())
+    assert restored.as_dict() == model.as_dict()
+    assert restored.heating_rate == model.heating_rate
+    # A fresh model restored from nothing knows nothing
+    restored.restore({})
+    assert not restored.ready
+    assert restored.heat == 0.0
+
+
+def test_rate_model_time_to_reach():
+    model = _learned()
+    # 3 degrees per hour with the heater on
+    assert model.time_to_reach(18.0, 21.0, 1) == pytest.approx(HOUR, rel=1e-3)
+    # 1 degree per hour lost with the heater off
+    assert model.time_to_reach(21.0, 19.0, 0) == pytest.approx(2 * HOUR, rel=1e-3)
+    # Never reached that way
+    assert model.time_to_reach(21.0, 19.0, 1) is None
+
+
+def test_rate_sampler():
+    """A sample spans min_interval to max_interval and accounts the heater on-time."""
+    sampler = RateSampler(min_interval=600, max_interval=2 * HOUR)
+    assert sampler.reading(0, 20.0) is None
+    sampler.heater(300, True)
+    # Too short
+    assert sampler.reading(500, 20.5) is None
+    on, rate = sampler.reading(900, 21.0)
+    assert on == pytest.approx(600 / 900)
+    assert rate == pytest.approx(4.0)
+    # A gap longer than max_interval starts over
+    assert sampler.reading(900 + 2 * HOUR + 1, 25.0) is None
+    on, rate = sampler.reading(900 + 2 * HOUR + 1 + 900, 25.5)
+    assert on == 1.0
+    assert rate == pytest.approx(2.0)
+
+
+def test_rate_sampler_reset():
+    """reset drops the sample in progress: the next reading only starts one."""
+    sampler = RateSampler(min_interval=600)
+    sampler.reading(0, 20.0)
+    sampler.reset()
+    assert sampler.reading(900, 15.0) is None
+    on, rate = sampler.reading(1800, 16.0)
+    assert on == 0.0
+    assert rate == pytest.approx(4.0)
+
+
+THERMOSTAT = {
+    "name": "study",
+    "heater": "input_boolean.study",
+    "target_sensor": "sensor.study",
+    "preheat": True,
+    "comfort_temp": 21,
+    "target_temp": 18,
+}
+
+
+async def _async_set_preset_at(hass, at):
+    await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_SET_PRESET_AT,
+        {"entity_id": "climate.study", "preset_mode": "comfort", "at": at},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+
+async def _async_run_until(hass, freezer, when):
+    freezer.move_to(when)
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def test_set_preset_at_preheats(hass, setup_thermostats, freezer):
+    """With learned rates the preset starts early enough to reach its target at `at`."""
+    entities = await setup_thermostats(THERMOSTAT, sensor_temp="18.0")
+    _learned(entities["climate.study"]._rates)
+    at = dt_util.utcnow() + timedelta(hours=3)
+    await _async_set_preset_at(hass, at)
+    state = hass.states.get("climate.study")
+    assert state.attributes["scheduled_preset"] == "comfort"
+    assert state.attributes["heating_rate"] == 3.0
+
+    # 3 degrees at 3 degrees per hour: one hour ahead
+    await _async_run_until(hass, freezer, at - timedelta(hours=1, minutes=2))
+    state = hass.states.get("climate.study")
+    assert state.attributes["preset_mode"] == "none"
+    assert hass.states.get("input_boolean.study").state == "off"
+
+    await _async_run_until(hass, freezer, at - timedelta(minutes=59))
+    state = hass.states.get("climate.study")
+    assert state.attributes["preset_mode"] == "comfort"
+    assert state.attributes["temperature"] == 21
+    assert "scheduled_preset" not in state.attributes
+    assert hass.states.get("input_boolean.study").state == "on"
+
+
+async def test_set_preset_at_without_rates(hass, setup_thermostats, freezer):
+    """Until the rates are learned, the preset starts at `at`."""
+    await setup_thermostats(THERMOSTAT, sensor_temp="18.0")
+    at = dt_util.utcnow() + timedelta(hours=1)
+    await _async_set_preset_at(hass, at)
+
+    await _async_run_until(hass, freezer, at - timedelta(minutes=2))
+    assert hass.states.get("climate.study").attributes["preset_mode"] == "none"
+
+    await _async_run_until(hass, freezer, at + timedelta(minutes=1))
+    assert hass.states.get("climate.study").attributes["preset_mode"] == "comfort"
+    assert hass.states.get("input_boolean.study").state == "on"
+
+
+async def test_scheduled_preset_does_not_outlive_hass(hass, setup_thermostats):
+    """A preset still scheduled when Home Assistant stops leaves no timer behind."""
+    await setup_thermostats(THERMOSTAT, sensor_temp="18.0")
+    await _async_set_preset_at(hass, dt_util.utcnow() + timedelta(hours=1))
+    # Still running: the stop of Home Assistant cancels it
+    assert hass.data[DOMAIN][const.DATA_PREHEAT_SCHEDULER]._unsub is not None
+    await hass.async_stop()
@@ -0,0 +1,68 @@
+"""Precomputed preset table."""
+
+import pytest
+from homeassistant.components.climate import ATTR_PRESET_MODE, ATTR_PRESET_MODES
+
+from custom_components.simple_thermostat_a.presets import PresetTable
+
+
+def test_table_is_ordered_and_read_only():
+    presets = PresetTable("none", {"away": 16, "eco": 18})
+    assert presets.modes == ("none", "away", "eco")
+    assert "none" in presets
+    assert "eco" in presets
+    assert "boost" not in presets
+    with pytest.raises(TypeError):
+        presets.temps["away"] = 10
+
+
+def test_replace_builds_a_new_table_only_on_change():
+    presets = PresetTable("none", {"away": 16, "eco": 18})
+    # Same temperature, unknown preset: the same table
+    assert presets.replace({"away": 16, "boost": 25}) is presets
+    changed = presets.replace({"eco": 17})
+    assert changed is not presets
+    assert changed.modes == presets.modes
+    assert dict(changed.temps) == {"away": 16, "eco": 17}
+    assert dict(presets.temps) == {"away": 16, "eco": 18}
+    assert changed == PresetTable("none", {"away": 16, "eco": 17})
+    assert changed != presets
+
+
+THERMOSTAT = {
+    "name": "table",
+    "heater": "input_boolean.table",
+    "target_sensor": "sensor.table",
+    "away_temp": 16,
+    "eco_temp": 16,
+}
+
+
+async def test_presets_sharing_a_temperature(hass, setup_thermostats):
+    """Each preset keeps its own mode, even at the temperature of another."""
+    entities = await setup_thermostats(THERMOSTAT)
+    state = hass.states.get("climate.table")
+    assert state.attributes[ATTR_PRESET_MODES] == ["none", "away", "eco"]
+    for mode in ("eco", "away"):
+        await hass.services.async_call(
+            "climate",
+            "set_preset_mode",
+            {"entity_id": "climate.table", "preset_mode": mode},
+            blocking=True,
+        )
+        state = hass.states.get("climate.table")
+        assert state.attributes[ATTR_PRESET_MODE] == mode
+        assert state.attributes["temperature"] == 16
+
+    # A target set in a preset becomes the temperature of that preset only
+    presets = entities["climate.table"]._presets
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.table", "temperature": 15},
+        blocking=True,
+    )
+    entity = entities["climate.table"]
+    assert entity._presets is not presets
+    assert dict(entity._presets.temps) == {"away": 15, "eco": 16}
+    assert hass.states.get("climate.table").attributes[ATTR_PRESET_MODE] == "away"
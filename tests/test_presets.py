@@ -0,0 +1,178 @@
+"""Preset temperatures persisted in the PresetStore."""
+
+from datetime import timedelta
+
+from homeassistant.core import State
+from homeassistant.helpers import entity_registry as er
+from homeassistant.setup import async_setup_component
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import (
+    async_fire_time_changed,
+    mock_restore_cache,
+)
+
+from custom_components.simple_thermostat_a import DOMAIN, const
+
+THERMOSTAT = {
+    "name": "study",
+    "unique_id": "study_unique",
+    "heater": "input_boolean.study",
+    "target_sensor": "sensor.study",
+    "away_temp": 16,
+    "eco_temp": 18,
+}
+
+
+def _stored(hass_storage):
+    return hass_storage.get(const.PRESET_STORAGE_KEY, {}).get("data")
+
+
+async def _async_flush(hass, freezer):
+    freezer.tick(timedelta(seconds=const.PRESET_SAVE_DELAY + 1))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def test_changes_are_written_together(
+    hass, setup_thermostats, freezer, hass_storage
+):
+    """Changes of several thermostats end in one delayed write, keyed by unique_id."""
+    await setup_thermostats(
+        THERMOSTAT,
+        {
+            **THERMOSTAT,
+            "name": "lounge",
+            "unique_id": "lounge_unique",
+            "heater": "input_boolean.lounge",
+            "target_sensor": "sensor.lounge",
+        },
+    )
+    await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_BULK_SET_PRESETS,
+        {"entity_id": "all", "away_temp": 14},
+        blocking=True,
+    )
+    await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_SET_PRESET_TEMP,
+        {"entity_id": "climate.study", "eco_temp": 17},
+        blocking=True,
+    )
+    # Not written before PRESET_SAVE_DELAY
+    assert _stored(hass_storage) is None
+
+    await _async_flush(hass, freezer)
+    stored = _stored(hass_storage)
+    assert stored["study_unique"]["temps"] == {"away": 14, "eco": 17}
+    assert stored["lounge_unique"]["temps"] == {"away": 14, "eco": 18}
+
+
+async def test_presets_without_unique_id_are_stored_by_name(
+    hass, freezer, hass_storage
+):
+    """A thermostat of a list without unique_id is stored under its name."""
+    hass.states.async_set("sensor.study", "20.0")
+    assert await async_setup_component(hass, "homeassistant", {})
+    assert await async_setup_component(
+        hass, "input_boolean", {"input_boolean": {"study": {}}}
+    )
+    assert await async_setup_component(
+        hass,
+        "climate",
+        {
+            "climate": {
+                "platform": DOMAIN,
+                "initial_hvac_mode": "heat",
+                "thermostats": [
+                    {
+                        "name": "study",
+                        "heater": "input_boolean.study",
+                        "target_sensor": "sensor.study",
+                        "away_temp": 16,
+                    }
+                ],
+            }
+        },
+    )
+    await hass.async_block_till_done()
+    await hass.services.async_call(
+        DOMAIN,
+        const.SERVICE_SET_PRESET_TEMP,
+        {"entity_id": "climate.study", "away_temp": 15},
+        blocking=True,
+    )
+    await _async_flush(hass, freezer)
+    assert _stored(hass_storage)["study"]["temps"] == {"away": 15}
+
+
+async def test_presets_are_restored(hass, setup_thermostats, hass_storage):
+    """The stored temperatures win over the configured ones."""
+    hass_storage[const.PRESET_STORAGE_KEY] = {
+        "version": const.PRESET_STORAGE_VERSION,
+        "key": const.PRESET_STORAGE_KEY,
+        "data": {
+            "study_unique": {"temps": {"away": 12, "eco": 17}, "saved_target_temp": 19}
+        },
+    }
+    await setup_thermostats(THERMOSTAT)
+    await hass.services.async_call(
+        "climate",
+        "set_preset_mode",
+        {"entity_id": "climate.study", "preset_mode": "away"},
+        blocking=True,
+    )
+    assert hass.states.get("climate.study").attributes["temperature"] == 12
+
+
+async def test_presets_survive_a_rename(hass, setup_thermostats, hass_storage):
+    """A renamed entity keeps the presets stored under its unique_id."""
+    hass_storage[const.PRESET_STORAGE_KEY] = {
+        "version": const.PRESET_STORAGE_VERSION,
+        "key": const.PRESET_STORAGE_KEY,
+        "data": {
+            "study_unique": {"temps": {"away": 12, "eco": 17}, "saved_target_temp": 19}
+        },
+    }
+    er.async_get(hass).async_get_or_create(
+        "climate", DOMAIN, "study_unique", suggested_object_id="renamed"
+    )
+    await setup_thermostats(THERMOSTAT)
+    assert hass.states.get("climate.study") is None
+    await hass.services.async_call(
+        "climate",
+        "set_preset_mode",
+        {"entity_id": "climate.renamed", "preset_mode": "eco"},
+        blocking=True,
+    )
+    assert hass.states.get("climate.renamed").attributes["temperature"] == 17
+
+
+async def test_legacy_attributes_are_migrated(
+    hass, setup_thermostats, freezer, hass_storage
+):
+    """Without a stored entry, the temperatures come from the restored attributes."""
+    mock_restore_cache(
+        hass,
+        [
+            State(
+                "climate.study",
+                "heat",
+                {
+                    "temperature": 15,
+                    "preset_mode": "away",
+                    "away_temp": 15,
+                    "eco_temp": 17.5,
+                },
+            )
+        ],
+    )
+    await setup_thermostats(THERMOSTAT)
+    state = hass.states.get("climate.study")
+    assert state.attributes["preset_mode"] == "away"
+    assert state.attributes["temperature"] == 15
+    assert "away_temp" not in state.attributes
+
+    await _async_flush(hass, freezer)
+    assert _stored(hass_storage)["study_unique"]["temps"] == {"away": 15, "eco": 17.5}
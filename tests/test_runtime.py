@@ -0,0 +1,109 @@
+"""Heater runtime, cycles and duty cycle."""
+
+from datetime import timedelta
+
+import pytest
+
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.simple_thermostat_a.runtime import DutyWindow, RuntimeCounter
+
+
+def test_duty_window_buckets():
+    """On-time is split over the buckets and the partial newest bucket counts."""
+    window = DutyWindow(4, 10)
+    window.add(0, 15)
+    assert window.values == [10.0, 5.0, 0.0, 0.0]
+    assert window.duty(15) == pytest.approx(15 / 35)
+
+
+def test_duty_window_wraps_around():
+    """Buckets leaving the window are dropped as the window moves on."""
+    window = DutyWindow(4, 10)
+    window.add(0, 15)
+    # Bucket 0 left the window, bucket 1 is still in it
+    assert window.duty(45) == pytest.approx(5 / 35)
+    assert window.values == [0.0, 5.0, 0.0, 0.0]
+    # Reused slots start from zero
+    window.add(45, 50)
+    assert window.values == [5.0, 5.0, 0.0, 0.0]
+    # Long after, nothing is left
+    assert window.duty(500) == 0.0
+    assert window.total == 0.0
+
+
+def test_duty_window_longer_span_is_clipped():
+    """A span longer than the window only counts its last part."""
+    window = DutyWindow(4, 10)
+    window.add(0, 100)
+    assert window.total == 40.0
+    assert window.duty(100) == 1.0
+
+
+def test_duty_window_restore():
+    window = DutyWindow(4, 10)
+    window.add(0, 15)
+    restored = DutyWindow(4, 10)
+    restored.restore(window.as_dict())
+    assert restored.total == 15.0
+    assert restored.duty(15) == window.duty(15)
+    # Saved with another bucket count: ignored
+    other = DutyWindow(6, 10)
+    other.restore(window.as_dict())
+    assert other.current is None
+    assert other.total == 0.0
+
+
+def test_runtime_counter():
+    """Total on-time and off to on transitions; the first known state is no cycle."""
+    counter = RuntimeCounter()
+    counter.update(0, True)
+    assert counter.cycles == 0
+    counter.update(100, False)
+    counter.update(200, True)
+    counter.update(500, False)
+    counter.update(600, True)
+    total_on, cycles, hour, day = counter.snapshot(700)
+    assert total_on == 500
+    assert cycles == 2
+    assert hour == pytest.approx(500 / (3600 - 60 + 40))
+    assert day == pytest.approx(500 / (86400 - 3600 + 700))
+
+    restored = RuntimeCounter()
+    restored.restore(counter.as_dict())
+    restored.update(700, True)
+    assert restored.snapshot(700) == (total_on, cycles, hour, day)
+
+
+async def test_runtime_attributes(hass, setup_thermostats, freezer):
+    """The attributes follow the heater, refreshed every runtime_stats_interval."""
+    await setup_thermostats(
+        {
+            "name": "runtime",
+            "heater": "input_boolean.runtime",
+            "target_sensor": "sensor.runtime",
+            "runtime_stats": True,
+            "runtime_stats_interval": 60,
+        },
+        sensor_temp="18.0",
+    )
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.runtime", "temperature": 21},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.runtime").state == "on"
+
+    freezer.tick(timedelta(minutes=30))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+    attributes = hass.states.get("climate.runtime").attributes
+    assert attributes["heater_runtime_hours"] == 0.5
+    assert attributes["heater_cycles"] == 1
+    assert 50 <= attributes["duty_cycle_hour"] <= 51
+    assert attributes["duty_cycle_day"] > 0
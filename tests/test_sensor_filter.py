@@ -0,0 +1,140 @@
+"""Conditioning of the sensor readings."""
+
+from datetime import timedelta
+
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.simple_thermostat_a.sensor_filter import (
+    FILTER_EMA,
+    FILTER_MEDIAN,
+    SensorFilter,
+)
+
+
+def test_median_drops_spikes():
+    """The rolling median ignores a lone outlier and forgets the oldest readings."""
+    sensor_filter = SensorFilter(FILTER_MEDIAN, window=3)
+    assert sensor_filter.add(20.0, 0) == 20.0
+    # Even count: mean of the two middle readings
+    assert sensor_filter.add(21.0, 1) == 20.5
+    assert sensor_filter.add(35.0, 2) == 21.0
+    assert sensor_filter.add(21.0, 3) == 21.0
+    # 20 left the window: 35, 21, 22
+    assert sensor_filter.add(22.0, 4) == 22.0
+    # 35 left the window: 21, 22, 20
+    assert sensor_filter.add(20.0, 5) == 21.0
+
+
+def test_ema_smooths_the_readings():
+    sensor_filter = SensorFilter(FILTER_EMA, alpha=0.5)
+    assert sensor_filter.add(20.0, 0) == 20.0
+    assert sensor_filter.add(22.0, 1) == 21.0
+    assert sensor_filter.add(22.0, 2) == 21.5
+
+
+def test_deadband_without_min_interval():
+    """Changes smaller than the deadband, from the last accepted reading, are dropped."""
+    sensor_filter = SensorFilter(deadband=0.5)
+    assert sensor_filter.add(20.0, 0) == 20.0
+    assert sensor_filter.add(20.3, 1) is None
+    # Still compared with 20.0, not with the dropped 20.3
+    assert sensor_filter.add(20.4, 2) is None
+    assert sensor_filter.add(20.5, 3) == 20.5
+    assert sensor_filter.add(19.9, 4) == 19.9
+
+
+def test_filter_feeds_the_deadband():
+    """The deadband applies to the conditioned value, not to the raw reading."""
+    sensor_filter = SensorFilter(FILTER_MEDIAN, window=3, deadband=0.5)
+    assert sensor_filter.add(20.0, 0) == 20.0
+    # Median 22.5, then 20.0 again
+    assert sensor_filter.add(25.0, 1) == 22.5
+    assert sensor_filter.add(20.0, 2) == 20.0
+
+
+def test_min_interval_holds_the_latest_reading():
+    sensor_filter = SensorFilter(min_interval=10)
+    assert sensor_filter.add(19.0, 0) == 19.0
+    assert sensor_filter.add(18.5, 1) is None
+    assert sensor_filter.add(18.0, 2) is None
+    assert sensor_filter.wait(2) == 8
+    assert sensor_filter.release(10) == 18.0
+    assert sensor_filter.release(11) is None
+
+
+def test_deadband_drops_the_held_reading():
+    sensor_filter = SensorFilter(min_interval=10, deadband=0.2)
+    assert sensor_filter.add(19.0, 0) == 19.0
+    assert sensor_filter.add(18.0, 1) is None
+    # Back near the accepted reading: nothing left to deliver
+    assert sensor_filter.add(19.1, 2) is None
+    assert sensor_filter.release(10) is None
+
+
+async def test_held_reading_is_applied_when_the_interval_ends(
+    hass, setup_thermostats, freezer
+):
+    """A sensor reporting only on change is not left on a stale value."""
+    await setup_thermostats(
+        {
+            "name": "filtered",
+            "heater": "input_boolean.filtered",
+            "target_sensor": "sensor.filtered",
+            "sensor_min_interval": 30,
+        },
+        sensor_temp="21.0",
+    )
+    freezer.tick(timedelta(seconds=31))
+    hass.states.async_set("sensor.filtered", "20.5")
+    await hass.async_block_till_done()
+    hass.states.async_set("sensor.filtered", "18.0")
+    await hass.async_block_till_done()
+    assert hass.states.get("climate.filtered").attributes["current_temperature"] == 20.5
+    assert hass.states.get("input_boolean.filtered").state == "off"
+
+    freezer.tick(timedelta(seconds=31))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+    assert hass.states.get("climate.filtered").attributes["current_temperature"] == 18.0
+    assert hass.states.get("input_boolean.filtered").state == "on"
+
+
+async def test_median_spike_does_not_switch_the_heater(hass, setup_thermostats):
+    """A lone faulty reading is filtered out before the control pass."""
+    await setup_thermostats(
+        {
+            "name": "median",
+            "heater": "input_boolean.median",
+            "target_sensor": "sensor.median",
+            "sensor_filter": "median",
+            "sensor_median_window": 3,
+        },
+    )
+    for temp in ("20.1", "5.0", "20.0"):
+        hass.states.async_set("sensor.median", temp)
+        await hass.async_block_till_done()
+        assert hass.states.get("input_boolean.median").state == "off"
+    assert hass.states.get("climate.median").attributes["current_temperature"] == 20.0
+
+
+async def test_deadband_keeps_the_current_temperature(hass, setup_thermostats):
+    """Readings within sensor_deadband of the applied one are not applied."""
+    await setup_thermostats(
+        {
+            "name": "deadband",
+            "heater": "input_boolean.deadband",
+            "target_sensor": "sensor.deadband",
+            "sensor_deadband": 0.5,
+        },
+    )
+    hass.states.async_set("sensor.deadband", "19.6")
+    await hass.async_block_till_done()
+    assert hass.states.get("climate.deadband").attributes["current_temperature"] == 20.0
+    assert hass.states.get("input_boolean.deadband").state == "off"
+
+    hass.states.async_set("sensor.deadband", "19.5")
+    await hass.async_block_till_done()
+    assert hass.states.get("climate.deadband").attributes["current_temperature"] == 19.5
+    assert hass.states.get("input_boolean.deadband").state == "on"
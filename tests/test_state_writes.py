@@ -0,0 +1,108 @@
+"""Suppressed and throttled state writes."""
+
+from datetime import timedelta
+
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.simple_thermostat_a.climate import SimpleThermostatA
+
+
+async def _async_run(hass, freezer, seconds):
+    freezer.tick(timedelta(seconds=seconds))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def test_unrecorded_attribute_is_written_after_the_interval(
+    hass, setup_thermostats, freezer
+):
+    """A change of an attribute kept out of the recorder waits for state_write_interval."""
+    assert "heater_runtime_hours" in SimpleThermostatA._unrecorded_attributes
+    await setup_thermostats(
+        {
+            "name": "throttled",
+            "heater": "input_boolean.throttled",
+            "target_sensor": "sensor.throttled",
+            "runtime_stats": True,
+            "runtime_stats_interval": 60,
+            "state_write_interval": 300,
+        },
+        sensor_temp="18.0",
+    )
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.throttled", "temperature": 21},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    state = hass.states.get("climate.throttled")
+    assert state.attributes["hvac_action"] == "heating"
+    assert state.attributes["heater_runtime_hours"] == 0.0
+    written = state.last_updated
+
+    # The runtime attributes change at each tick, but are not written yet
+    for _ in range(4):
+        await _async_run(hass, freezer, 60)
+        assert hass.states.get("climate.throttled").last_updated == written
+
+    # Once the interval has elapsed, the latest value is written
+    await _async_run(hass, freezer, 61)
+    state = hass.states.get("climate.throttled")
+    assert state.last_updated != written
+    assert state.attributes["heater_runtime_hours"] > 0
+    assert state.attributes["suppressed_writes"] >= 4
+
+
+async def test_target_change_is_written_at_once(hass, setup_thermostats):
+    """A change of the target is never held back by state_write_interval."""
+    await setup_thermostats(
+        {
+            "name": "throttled",
+            "heater": "input_boolean.throttled",
+            "target_sensor": "sensor.throttled",
+            "state_write_interval": 300,
+        },
+    )
+    for temperature in (21, 22):
+        await hass.services.async_call(
+            "climate",
+            "set_temperature",
+            {"entity_id": "climate.throttled", "temperature": temperature},
+            blocking=True,
+        )
+        await hass.async_block_till_done()
+        state = hass.states.get("climate.throttled")
+        assert state.attributes["temperature"] == temperature
+
+
+async def test_unobservable_changes_are_not_written(hass, setup_thermostats):
+    """Readings below the precision and attribute-only heater updates are dropped."""
+    entities = await setup_thermostats(
+        {
+            "name": "quiet",
+            "heater": "input_boolean.quiet",
+            "target_sensor": "sensor.quiet",
+            "precision": 0.1,
+        },
+    )
+    entity = entities["climate.quiet"]
+    written = hass.states.get("climate.quiet").last_updated
+    suppressed = entity._suppressed_writes
+
+    for temp in ("20.01", "20.04"):
+        hass.states.async_set("sensor.quiet", temp)
+        await hass.async_block_till_done()
+    hass.states.async_set("input_boolean.quiet", "off", {"power": 0.4})
+    await hass.async_block_till_done()
+    assert hass.states.get("climate.quiet").last_updated == written
+    assert entity._suppressed_writes == suppressed + 3
+
+    hass.states.async_set("sensor.quiet", "20.2")
+    await hass.async_block_till_done()
+    state = hass.states.get("climate.quiet")
+    assert state.last_updated != written
+    assert state.attributes["current_temperature"] == 20.2
+    assert state.attributes["suppressed_writes"] == suppressed + 3
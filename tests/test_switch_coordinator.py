@@ -0,0 +1,69 @@
+"""Batched heater switch calls."""
+
+from homeassistant.core import Context
+
+from custom_components.simple_thermostat_a import DOMAIN, const
+
+
+async def test_heater_call_keeps_the_context(hass, setup_thermostats):
+    """The switch call caused by a service call carries its context."""
+    await setup_thermostats(
+        {
+            "name": "first",
+            "unique_id": "first",
+            "heater": "input_boolean.first",
+            "target_sensor": "sensor.first",
+        },
+        {
+            "name": "second",
+            "unique_id": "second",
+            "heater": "input_boolean.second",
+            "target_sensor": "sensor.second",
+        },
+    )
+    first = Context()
+    second = Context()
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.first", "temperature": 22},
+        blocking=True,
+        context=first,
+    )
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.second", "temperature": 22},
+        blocking=True,
+        context=second,
+    )
+    await hass.async_block_till_done()
+
+    assert hass.states.get("input_boolean.first").state == "on"
+    assert hass.states.get("input_boolean.first").context.id == first.id
+    assert hass.states.get("input_boolean.second").state == "on"
+    assert hass.states.get("input_boolean.second").context.id == second.id
+
+
+async def test_batch_window_follows_the_thermostats(hass, setup_thermostats):
+    """The window of a platform entry is dropped with its thermostats."""
+    entities = await setup_thermostats(
+        {
+            "name": "wide",
+            "unique_id": "wide",
+            "heater": "input_boolean.wide",
+            "target_sensor": "sensor.wide",
+            "switch_batch_window": 0.5,
+        },
+        {
+            "name": "narrow",
+            "unique_id": "narrow",
+            "heater": "input_boolean.narrow",
+            "target_sensor": "sensor.narrow",
+        },
+    )
+    coordinator = hass.data[DOMAIN][const.DATA_SWITCH_COORDINATOR]
+    assert coordinator.window == 0.5
+
+    await entities["climate.wide"].async_remove()
+    assert coordinator.window == 0
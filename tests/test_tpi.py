@@ -0,0 +1,154 @@
+"""Time proportional (TPI) control."""
+
+from datetime import timedelta
+
+import pytest
+
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.simple_thermostat_a.core import ThermostatState, tpi_on_time
+
+CYCLE = 600
+
+
+def _state(cur_temp, target_temp=20.0, ac_mode=False, min_cycle=0):
+    state = ThermostatState(ac_mode, min_cycle=min_cycle)
+    state.hvac_off = False
+    state.cur_temp = cur_temp
+    state.target_temp = target_temp
+    return state
+
+
+@pytest.mark.parametrize(
+    ("cur_temp", "fraction"),
+    [(19.0, 0.6), (19.5, 0.3), (20.0, 0.0), (21.0, 0.0), (17.0, 1.0)],
+)
+def test_tpi_on_time_is_proportional(cur_temp, fraction):
+    """The share is coef_int per degree below the target, clamped to [0, 1]."""
+    share, on_time = tpi_on_time(_state(cur_temp), CYCLE, 0.6)
+    assert share == pytest.approx(fraction)
+    assert on_time == pytest.approx(fraction * CYCLE)
+
+
+def test_tpi_on_time_outdoor_and_ac_mode():
+    """The outdoor term adds to the share; in AC mode the signs flip."""
+    share, _ = tpi_on_time(_state(19.0), CYCLE, 0.6, 0.01, outdoor_temp=0.0)
+    assert share == pytest.approx(0.8)
+    share, on_time = tpi_on_time(_state(21.0, ac_mode=True), CYCLE, 0.6)
+    assert share == pytest.approx(0.6)
+    assert on_time == pytest.approx(360)
+
+
+def test_tpi_on_time_rounds_to_min_cycle():
+    """Pulses shorter than min_cycle, on or off, become none or min_cycle."""
+    # 36 s on: under half of min_cycle
+    assert tpi_on_time(_state(19.9, min_cycle=120), CYCLE, 0.6)[1] == 0.0
+    # 72 s on: rounded up to min_cycle
+    assert tpi_on_time(_state(19.8, min_cycle=120), CYCLE, 0.6)[1] == 120
+    # 528 s on, 72 s off: the off pulse is rounded up to min_cycle
+    assert tpi_on_time(_state(18.53, min_cycle=120), CYCLE, 0.6)[1] == pytest.approx(
+        480
+    )
+    # 564 s on, 36 s off: on for the whole cycle
+    assert tpi_on_time(_state(18.43, min_cycle=120), CYCLE, 0.6)[1] == CYCLE
+
+
+def test_tpi_on_time_off_or_unknown():
+    """Nothing is turned on while off or without a reading."""
+    state = _state(18.0)
+    state.hvac_off = True
+    assert tpi_on_time(state, CYCLE, 0.6) == (0.0, 0.0)
+    assert tpi_on_time(_state(None), CYCLE, 0.6) == (0.0, 0.0)
+
+
+THERMOSTAT = {
+    "name": "tpi",
+    "heater": "input_boolean.tpi",
+    "target_sensor": "sensor.tpi",
+    "control_mode": "tpi",
+    "tpi_cycle": CYCLE,
+    "tpi_coef_ext": 0,
+}
+
+
+async def _async_run(hass, freezer, seconds):
+    freezer.tick(timedelta(seconds=seconds))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def _async_start_cycle(hass):
+    # 1 degree below the target: on for 60 % of the cycle
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.tpi", "temperature": 20},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+
+async def test_tpi_cycles_the_heater(hass, setup_thermostats, freezer):
+    """The heater is on for its share of each cycle, then off until the next one."""
+    await setup_thermostats({**THERMOSTAT, "target_temp": 15}, sensor_temp="19.0")
+    await _async_start_cycle(hass)
+    assert hass.states.get("input_boolean.tpi").state == "on"
+    assert hass.states.get("climate.tpi").attributes["on_percent"] == 60
+
+    await _async_run(hass, freezer, 359)
+    assert hass.states.get("input_boolean.tpi").state == "on"
+    await _async_run(hass, freezer, 2)
+    assert hass.states.get("input_boolean.tpi").state == "off"
+
+    # A reading waits for the next cycle
+    hass.states.async_set("sensor.tpi", "19.5")
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.tpi").state == "off"
+
+    await _async_run(hass, freezer, CYCLE - 361)
+    assert hass.states.get("input_boolean.tpi").state == "on"
+    assert hass.states.get("climate.tpi").attributes["on_percent"] == 30
+    await _async_run(hass, freezer, 181)
+    assert hass.states.get("input_boolean.tpi").state == "off"
+
+
+async def test_tpi_off_stops_the_cycle(hass, setup_thermostats, freezer):
+    """Turning the thermostat off drops the cycle timers and the heater stays off."""
+    entities = await setup_thermostats(
+        {**THERMOSTAT, "target_temp": 15}, sensor_temp="19.0"
+    )
+    entity = entities["climate.tpi"]
+    await _async_start_cycle(hass)
+    assert hass.states.get("input_boolean.tpi").state == "on"
+
+    await hass.services.async_call(
+        "climate",
+        "set_hvac_mode",
+        {"entity_id": "climate.tpi", "hvac_mode": "off"},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.tpi").state == "off"
+    assert entity._tpi_cycle_unsub is None
+    assert entity._tpi_off_unsub is None
+
+    # Readings do not start a cycle either
+    hass.states.async_set("sensor.tpi", "18.0")
+    await hass.async_block_till_done()
+    assert entity._tpi_cycle_unsub is None
+    for _ in range(3):
+        await _async_run(hass, freezer, CYCLE)
+        assert hass.states.get("input_boolean.tpi").state == "off"
+
+    # Back on, a new cycle starts at once
+    await hass.services.async_call(
+        "climate",
+        "set_hvac_mode",
+        {"entity_id": "climate.tpi", "hvac_mode": "heat"},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.tpi").state == "on"
+    assert entity._tpi_cycle_unsub is not None
@@ -0,0 +1,183 @@
+"""Open window detection."""
+
+from datetime import timedelta
+
+import pytest
+from homeassistant.components.climate import ATTR_PRESET_MODE
+from homeassistant.setup import async_setup_component
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.simple_thermostat_a import DOMAIN
+from custom_components.simple_thermostat_a.window import (
+    REBASE,
+    SlopeWindow,
+    WindowDetector,
+)
+
+WINDOW = {
+    "platform": DOMAIN,
+    "name": "window",
+    "heater": "input_boolean.window",
+    "target_sensor": "sensor.window",
+    "window_drop": 3,
+    "window_preset": "away",
+}
+
+
+async def test_window_preset_needs_its_temperature(hass):
+    """A window_preset without a temperature is rejected at setup."""
+    hass.states.async_set("sensor.window", "20.0")
+    assert await async_setup_component(hass, "climate", {"climate": [WINDOW]})
+    await hass.async_block_till_done()
+    assert hass.states.get("climate.window") is None
+
+
+async def test_window_preset_with_its_temperature(hass):
+    """A window_preset with a temperature is accepted."""
+    hass.states.async_set("sensor.window", "20.0")
+    assert await async_setup_component(
+        hass, "climate", {"climate": [{**WINDOW, "away_temp": 12}]}
+    )
+    await hass.async_block_till_done()
+    assert hass.states.get("climate.window") is not None
+
+
+def test_slope_of_a_line():
+    slope = SlopeWindow(600)
+    assert slope.slope() is None
+    slope.add(0, 20.0)
+    assert slope.slope() is None
+    for now in range(60, 361, 60):
+        slope.add(now, 20.0 - now / 600)
+    assert slope.slope() == pytest.approx(-1 / 600)
+    assert slope.span == 360
+    assert slope.newest == pytest.approx(19.4)
+
+
+def test_slope_forgets_expired_readings():
+    """Only the readings of the last `length` seconds count."""
+    slope = SlopeWindow(600)
+    # Falling first, then rising for longer than the window
+    for now in range(0, 601, 60):
+        slope.add(now, 20.0 - now / 600)
+    for now in range(660, 1321, 60):
+        slope.add(now, 19.0 + (now - 600) / 300)
+    assert len(slope) == 11
+    assert slope.span == 600
+    assert slope.slope() == pytest.approx(1 / 300)
+
+
+def test_slope_stays_exact_across_rebases():
+    slope = SlopeWindow(60)
+    end = 3 * REBASE * 60
+    for now in range(0, end + 1, 5):
+        slope.add(1e6 + now, 20.0 + now / 1000)
+    assert slope.slope() == pytest.approx(1 / 1000, rel=1e-9)
+    slope.clear()
+    assert len(slope) == 0
+    assert slope.newest is None
+
+
+def test_detector_opens_and_closes_with_hysteresis():
+    # Open below -3/h, closed again above -1.5/h
+    detector = WindowDetector(600, 3)
+    changes = [detector.add(now, 20.0 - now / 600) for now in range(0, 301, 60)]
+    # Not trusted before half of the window is covered
+    assert changes == [False] * 5 + [True]
+    assert detector.is_open
+    assert detector.slope() == pytest.approx(-6)
+
+    # Falling at 2/h: still open
+    detector.reset()
+    assert not detector.is_open
+    detector.is_open = True
+    assert not detector.add(0, 20.0)
+    assert not detector.add(300, 20.0 - 2 / 12)
+    assert detector.is_open
+    # Falling at 1/h: closed
+    detector.reset()
+    detector.is_open = True
+    assert detector.add(0, 20.0) is False
+    assert detector.add(300, 20.0 - 1 / 12)
+    assert not detector.is_open
+
+
+def test_detector_hold_closes_a_window_without_readings():
+    """A temperature that stopped falling closes the window."""
+    detector = WindowDetector(600, 3)
+    assert not detector.hold(0)
+    for now in range(0, 301, 60):
+        detector.add(now, 20.0 - now / 600)
+    assert detector.is_open
+    changed = [detector.hold(now) for now in range(450, 1201, 150)]
+    assert changed.count(True) == 1
+    assert not detector.is_open
+
+
+THERMOSTAT = {
+    "name": "window",
+    "heater": "input_boolean.window",
+    "target_sensor": "sensor.window",
+    "window_drop": 3,
+    "window_preset": "away",
+    "away_temp": 12,
+}
+
+
+async def _async_tick(hass, freezer, seconds):
+    freezer.tick(timedelta(seconds=seconds))
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+
+async def _async_fall(hass, freezer, minutes):
+    """Report a temperature falling 12 degrees per hour, one reading a minute."""
+    temp = float(hass.states.get("sensor.window").state)
+    for _ in range(minutes):
+        await _async_tick(hass, freezer, 60)
+        temp -= 0.2
+        hass.states.async_set("sensor.window", f"{temp:.1f}")
+        await hass.async_block_till_done()
+
+
+async def test_window_opens_and_closes(hass, setup_thermostats, freezer):
+    """A falling temperature applies window_preset until it stops falling."""
+    await setup_thermostats(THERMOSTAT)
+    await _async_fall(hass, freezer, 6)
+    state = hass.states.get("climate.window")
+    assert state.attributes["window_open"] is True
+    assert state.attributes[ATTR_PRESET_MODE] == "away"
+    assert state.attributes["temperature"] == 12
+
+    # No more readings: the held newest reading flattens the slope
+    for _ in range(8):
+        await _async_tick(hass, freezer, 150)
+    state = hass.states.get("climate.window")
+    assert state.attributes["window_open"] is False
+    assert state.attributes[ATTR_PRESET_MODE] == "none"
+    assert state.attributes["temperature"] == 20
+
+
+async def test_window_suspends_heating_until_timeout(hass, setup_thermostats, freezer):
+    """Without window_preset the heater is off while open, until window_timeout."""
+    config = {**THERMOSTAT, "window_timeout": "00:10:00"}
+    del config["window_preset"]
+    await setup_thermostats(config)
+    await hass.services.async_call(
+        "climate",
+        "set_temperature",
+        {"entity_id": "climate.window", "temperature": 25},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    assert hass.states.get("input_boolean.window").state == "on"
+
+    await _async_fall(hass, freezer, 6)
+    assert hass.states.get("climate.window").attributes["window_open"] is True
+    assert hass.states.get("input_boolean.window").state == "off"
+
+    # Still falling, but open for too long
+    await _async_fall(hass, freezer, 10)
+    assert hass.states.get("climate.window").attributes["window_open"] is False
+    assert hass.states.get("input_boolean.window").state == "on"
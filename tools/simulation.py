@@ -0,0 +1,354 @@
+# Offline simulation of the Simple Thermostat A control logic.
+#
+# Replays a recorded temperature series, or drives a first-order thermal model,
+# through the hysteresis / min_cycle_duration / keep_alive rules of the
+# thermostat for a whole grid of parameters at once. Each configuration is a
+# lane of NumPy arrays, so thousands of them are evaluated in one pass.
+#
+# This script is tooling, kept out of the integration: it needs NumPy (and
+# pandas for Parquet files) and only imports the dependency-free decision core.
+#
+#   python tools/simulation.py history.csv \
+#       --entity sensor.study_temperature --target 20 \
+#       --cold-tolerance 0.1:0.5:5 --hot-tolerance 0.1:0.5:5 \
+#       --min-cycle 0:600:5 --keep-alive 0,300
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from custom_components.simple_thermostat_a.core import (  # noqa: E402  pylint: disable=wrong-import-position
+    TURN_ON,
+    ThermostatState,
+    decide,
+)
+
+
+class ParameterGrid:
+    """Cartesian product of thermostat parameters, flattened to one lane per configuration."""
+
+    def __init__(self, cold_tolerance, hot_tolerance, min_cycle=(0,), keep_alive=(0,)):
+        columns = np.array(
+            list(
+                itertools.product(cold_tolerance, hot_tolerance, min_cycle, keep_alive)
+            ),
+            dtype=float,
+        ).reshape(-1, 4)
+        self.cold_tolerance = columns[:, 0]
+        self.hot_tolerance = columns[:, 1]
+        # Seconds, 0 disables the option like in the thermostat
+        self.min_cycle = columns[:, 2]
+        self.keep_alive = columns[:, 3]
+
+    def __len__(self):
+        return len(self.cold_tolerance)
+
+    def rows(self):
+        """Return the configurations as dicts, in lane order."""
+        return [
+            {
+                "cold_tolerance": float(cold),
+                "hot_tolerance": float(hot),
+                "min_cycle_duration": float(cycle),
+                "keep_alive": float(alive),
+            }
+            for cold, hot, cycle, alive in zip(
+                self.cold_tolerance, self.hot_tolerance, self.min_cycle, self.keep_alive
+            )
+        ]
+
+
+class ThermalModel:
+    """First-order room model: dT/dt = (outside - T) / time_constant + heat_rate * on."""
+
+    def __init__(
+        self,
+        initial=19.0,
+        outside=5.0,
+        time_constant=3 * 3600,
+        heat_rate=0.002,
+        noise=0.0,
+        seed=0,
+    ):
+        self.initial = initial
+        self.outside = outside
+        # Seconds
+        self.time_constant = time_constant
+        # Degrees per second with the heater on (negative for cooling units)
+        self.heat_rate = heat_rate
+        self.noise = noise
+        self.seed = seed
+
+
+def load_history(path, entity_id=None):
+    """Load a recorder history export as (seconds, temperatures) arrays.
+
+    CSV files use the columns of the history export of Home Assistant
+    (entity_id, state, last_changed). Parquet files need the same columns and
+    pandas. Samples that are not numbers (unavailable, unknown) are dropped.
+    """
+    if str(path).endswith(".parquet"):
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        frame = pd.read_parquet(path)
+        if entity_id is not None:
+            frame = frame[frame["entity_id"] == entity_id]
+        states = pd.to_numeric(frame["state"], errors="coerce")
+        times = pd.to_datetime(frame["last_changed"], utc=True)
+        keep = states.notna().to_numpy()
+        seconds = (times.astype("int64").to_numpy() / 1e9)[keep]
+        temps = states.to_numpy(dtype=float)[keep]
+    else:
+        seconds = []
+        temps = []
+        with open(path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                if entity_id is not None and row.get("entity_id") != entity_id:
+                    continue
+                try:
+                    temp = float(row["state"])
+                except ValueError:
+                    continue
+                if not np.isfinite(temp):
+                    continue
+                stamp = row["last_changed"].replace("Z", "+00:00")
+                seconds.append(datetime.fromisoformat(stamp).timestamp())
+                temps.append(temp)
+        seconds = np.asarray(seconds, dtype=float)
+        temps = np.asarray(temps, dtype=float)
+
+    order = np.argsort(seconds, kind="stable")
+    return seconds[order], temps[order]
+
+
+def resample(seconds, temps, step):
+    """Hold each sample until the next one, on a grid of `step` seconds."""
+    grid = np.arange(seconds[0], seconds[-1] + step, step)
+    index = np.searchsorted(seconds, grid, side="right") - 1
+    return grid, temps[index]
+
+
+def simulate(
+    grid,
+    target,
+    step=10.0,
+    duration=None,
+    series=None,
+    model=None,
+    ac_mode=False,
+    comfort_band=0.5,
+):
+    """Run every configuration of grid and return the metrics per configuration.
+
+    Either series, a (seconds, temperatures) pair replayed as recorded (the
+    heater does not act on it), or model, a ThermalModel closing the loop, must
+    be given. The control rules are evaluated every `step` seconds, which is
+    also the resolution of the min_cycle_duration deadline.
+
+    The result maps each metric to an array with one value per configuration:
+    switches (heater transitions), service_calls (transitions and keep-alive
+    calls), runtime (seconds with the heater on), violation (seconds outside
+    target +/- comfort_band) and mean_error (mean absolute deviation).
+    """
+    if (series is None) == (model is None):
+        raise ValueError("Give either a recorded series or a thermal model")
+
+    lanes = len(grid)
+    if series is not None:
+        times, recorded = resample(*series, step)
+        steps = len(times)
+    else:
+        steps = int((duration or 86400) // step)
+        rng = np.random.default_rng(model.seed)
+        temp = np.full(lanes, float(model.initial))
+
+    cold = grid.cold_tolerance
+    hot = grid.hot_tolerance
+    min_cycle = grid.min_cycle
+    keep_alive = grid.keep_alive
+    # Keep-alive ticks of a lane are due when now crosses its next deadline
+    next_keep_alive = np.where(keep_alive > 0, keep_alive, np.inf)
+
+    active = np.zeros(lanes, dtype=bool)
+    # The thermostat starts with the heater off and may switch right away
+    last_change = np.full(lanes, -np.inf)
+    switches = np.zeros(lanes, dtype=np.int64)
+    service_calls = np.zeros(lanes, dtype=np.int64)
+    runtime = np.zeros(lanes)
+    violation = np.zeros(lanes)
+    error = np.zeros(lanes)
+
+    for n in range(steps):
+        now = n * step
+        if series is not None:
+            current = recorded[n]
+        else:
+            current = temp
+            if model.noise:
+                current = temp + rng.normal(0.0, model.noise, lanes)
+
+        too_cold = target >= current + cold
+        too_hot = current >= target + hot
+        if ac_mode:
+            need_switch = np.where(active, too_cold, too_hot)
+        else:
+            need_switch = np.where(active, too_hot, too_cold)
+        ticking = now >= next_keep_alive
+        next_keep_alive = np.where(
+            ticking, next_keep_alive + keep_alive, next_keep_alive
+        )
+        # min_cycle_duration blocks switching, except on keep-alive ticks
+        allowed = (now - last_change >= min_cycle) | ticking
+        switching = need_switch & allowed
+
+        active ^= switching
+        last_change = np.where(switching, now, last_change)
+        switches += switching
+
+        # A keep-alive tick re-sends the current command unless it just switched
+        service_calls += switching | ticking
+
+        runtime += active * step
+        deviation = np.abs(current - target)
+        violation += (deviation > comfort_band) * step
+        error += deviation
+
+        if model is not None:
+            temp = temp + step * (
+                (model.outside - temp) / model.time_constant + model.heat_rate * active
+            )
+
+    return {
+        "switches": switches,
+        "service_calls": service_calls,
+        "runtime": runtime,
+        "violation": violation,
+        "mean_error": error / max(steps, 1),
+    }
+
+
+def replay(config, target, series, step=10.0, ac_mode=False):
+    """Replay series through the decision core for one configuration.
+
+    Reference for simulate(): same rules, one decide() call per step.
+    config is a row of ParameterGrid.rows(). Return the number of switches
+    and of service calls.
+    """
+    times, recorded = resample(*series, step)
+    state = ThermostatState(
+        ac_mode,
+        config["cold_tolerance"],
+        config["hot_tolerance"],
+        config["min_cycle_duration"],
+    )
+    state.hvac_off = False
+    state.target_temp = target
+    state.heater_on = False
+    state.heater_last_changed = -np.inf
+    keep_alive = config["keep_alive"]
+    next_keep_alive = keep_alive if keep_alive > 0 else np.inf
+    switches = service_calls = 0
+    for n, current in enumerate(recorded):
+        now = n * step
+        ticking = now >= next_keep_alive
+        if ticking:
+            next_keep_alive += keep_alive
+        state.cur_temp = current
+        action = decide(state, now, keep_alive=ticking).action
+        if action is not None:
+            service_calls += 1
+            if (action == TURN_ON) != state.heater_on:
+                switches += 1
+                state.heater_on = action == TURN_ON
+                state.heater_last_changed = now
+    return switches, service_calls
+
+
+def _values(text):
+    """Parse `a,b,c` or `start:stop:count` into a list of floats."""
+    if ":" in text:
+        start, stop, count = text.split(":")
+        return list(np.linspace(float(start), float(stop), int(count)))
+    return [float(value) for value in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Simulate Simple Thermostat A over a parameter grid."
+    )
+    parser.add_argument(
+        "history",
+        nargs="?",
+        help="CSV or Parquet export of the sensor history, thermal model if omitted",
+    )
+    parser.add_argument("--entity", help="sensor entity_id to keep from the export")
+    parser.add_argument("--target", type=float, default=20.0)
+    parser.add_argument("--ac-mode", action="store_true")
+    parser.add_argument("--cold-tolerance", type=_values, default=[0.3])
+    parser.add_argument("--hot-tolerance", type=_values, default=[0.3])
+    parser.add_argument("--min-cycle", type=_values, default=[0], help="seconds")
+    parser.add_argument("--keep-alive", type=_values, default=[0], help="seconds")
+    parser.add_argument(
+        "--step", type=float, default=10.0, help="seconds between evaluations"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=86400,
+        help="seconds simulated by the thermal model",
+    )
+    parser.add_argument("--comfort-band", type=float, default=0.5)
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="number of configurations printed, 0 for all",
+    )
+    args = parser.parse_args(argv)
+
+    grid = ParameterGrid(
+        args.cold_tolerance, args.hot_tolerance, args.min_cycle, args.keep_alive
+    )
+    options = {
+        "step": args.step,
+        "ac_mode": args.ac_mode,
+        "comfort_band": args.comfort_band,
+    }
+    if args.history:
+        result = simulate(
+            grid, args.target, series=load_history(args.history, args.entity), **options
+        )
+    else:
+        # A cooling unit works against a hot day
+        model = (
+            ThermalModel(outside=30.0, heat_rate=-0.002)
+            if args.ac_mode
+            else ThermalModel()
+        )
+        result = simulate(
+            grid, args.target, duration=args.duration, model=model, **options
+        )
+
+    # Fewest comfort violations first, then fewest switches
+    order = np.lexsort((result["switches"], result["violation"]))
+    if args.top:
+        order = order[: args.top]
+    rows = grid.rows()
+    report = [
+        {**rows[lane], **{name: float(values[lane]) for name, values in result.items()}}
+        for lane in order
+    ]
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()